@@ -0,0 +1,10 @@
+"""
+推荐系统性能基准测试与离线评估
+
+- synthetic_data: 可复现的 STUDENT / EDUCATION_PLAN / CHOOSE 合成数据生成器
+- standin_db: 基于 sqlite3 的本地替身数据库，替换 utils.query.query，不需要 MySQL
+- run: 命令行入口，输出各阶段耗时、峰值内存以及 precision@k / recall@k
+
+用法:
+    python -m benchmark.run --students 2000 --courses 300 --density 0.05
+"""
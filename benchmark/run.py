@@ -0,0 +1,303 @@
+"""
+推荐系统基准测试与离线评估命令行入口
+
+在合成数据上分别运行 DynamicCourseRecommender 和 recommed_module.recommedCoursePerson，输出：
+- 各阶段耗时：加载(load)、相似度(similarity)、评分预测(prediction)、候选筛选与排序(ranking)
+- 峰值内存（tracemalloc，单独一轮测量，不影响耗时统计）
+- 留出选课记录上的 precision@k / recall@k
+
+用法:
+    python -m benchmark.run --students 2000 --courses 300 --density 0.05
+    python -m benchmark.run --students 500 --courses 118 --legacy-users 10 --output report.json
+"""
+import argparse
+import contextlib
+import json
+import os
+import time
+import tracemalloc
+
+import numpy as np
+
+import utils.dynamic_recommend as dynamic_recommend
+from utils import recommed_module
+from utils.recommend_pipeline import course_pipeline
+from utils.data_version import bump_data_version
+from benchmark.synthetic_data import generate_dataset, split_holdout
+from benchmark.standin_db import StandInDatabase
+
+
+class StageTimer:
+    """
+    累计各阶段耗时（秒）
+    """
+
+    def __init__(self):
+        self.totals = {}
+
+    def add(self, stage, seconds):
+        self.totals[stage] = self.totals.get(stage, 0.0) + seconds
+
+    def wrap(self, stage, func):
+        """返回记录 func 耗时的包装函数"""
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add(stage, time.perf_counter() - start)
+        return timed
+
+
+@contextlib.contextmanager
+def _quiet():
+    """屏蔽推荐器的调试输出"""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def _ranking_metrics(recommended, relevant, k):
+    """
+    计算单个学生的 precision@k 和 recall@k
+
+    参数:
+        recommended: list, 推荐的课程编号（按得分从高到低）
+        relevant: set, 留出的课程编号
+        k: int, 截断位置
+    """
+    hits = len(set(recommended[:k]) & relevant)
+    return hits / k, hits / len(relevant)
+
+
+def _summarize(samples):
+    """单个学生耗时的均值和95分位（毫秒）"""
+    if not samples:
+        return {'mean_ms': 0.0, 'p95_ms': 0.0}
+    samples = np.asarray(samples) * 1000
+    return {'mean_ms': float(samples.mean()), 'p95_ms': float(np.percentile(samples, 95))}
+
+
+def benchmark_dynamic(database, eval_students, heldout, k):
+    """
+    基准测试 DynamicCourseRecommender
+
+    参数:
+        database: StandInDatabase, 已装载训练数据的替身数据库
+        eval_students: list, 参与评估的学生编号
+        heldout: dict, 学生编号 -> 留出的课程编号集合
+        k: int, 推荐数量及 precision@k / recall@k 的截断位置
+
+    返回:
+        dict: 报告
+    """
+    recommender = dynamic_recommend.DynamicCourseRecommender()
+    timer = StageTimer()
+    # 相似度、评分预测的耗时通过包装实例方法统计；推荐流水线各阶段的耗时另见 pipeline_stages
+    recommender._pearson_correlation_row = timer.wrap('similarity', recommender._pearson_correlation_row)
+    for name in ('_predict_course_scores', '_predict_course_scores_item_based', '_predict_course_scores_als'):
+        setattr(recommender, name, timer.wrap('prediction', getattr(recommender, name)))
+
+    with database.installed(), _quiet():
+        # 阶段1: 加载（强制重建模型快照）
+        bump_data_version()
+        start = time.perf_counter()
+        snapshot = recommender._get_model_snapshot()
+        load_seconds = time.perf_counter() - start
+
+        per_stage = {'similarity': [], 'prediction': [], 'ranking': []}
+        precisions, recalls = [], []
+        course_pipeline.reset_stats()
+        for stu_no in eval_students:
+            before = dict(timer.totals)
+            start = time.perf_counter()
+            course_list, id_to_course_no = recommender.recommend_courses(stu_no, top_n=k)
+            total = time.perf_counter() - start
+
+            similarity = timer.totals.get('similarity', 0.0) - before.get('similarity', 0.0)
+            prediction = timer.totals.get('prediction', 0.0) - before.get('prediction', 0.0)
+            per_stage['similarity'].append(similarity)
+            per_stage['prediction'].append(prediction)
+            per_stage['ranking'].append(total - similarity - prediction)
+
+            recommended = [id_to_course_no[course_id][0] for course_id, _ in course_list]
+            precision, recall = _ranking_metrics(recommended, heldout[stu_no], k)
+            precisions.append(precision)
+            recalls.append(recall)
+        pipeline_stages = course_pipeline.stats()
+
+        # 峰值内存：重建快照并为第一个学生推荐一次
+        tracemalloc.start()
+        bump_data_version()
+        recommender._get_model_snapshot()
+        load_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.reset_peak()
+        if eval_students:
+            recommender.recommend_courses(eval_students[0], top_n=k)
+        recommend_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    score_matrix = snapshot.score_matrix
+    return {
+        'engine': f'DynamicCourseRecommender (mode={dynamic_recommend.RECOMMEND_MODE}, '
+                  f'sparse={dynamic_recommend.SPARSE_SCORE_MATRIX})',
+        'students_evaluated': len(eval_students),
+        'load_ms': load_seconds * 1000,
+        'stages': {stage: _summarize(samples) for stage, samples in per_stage.items()},
+        'pipeline_stages': pipeline_stages,
+        'peak_memory_mb': {'load': load_peak / 2 ** 20, 'recommend': recommend_peak / 2 ** 20},
+        'score_matrix_mb': (score_matrix.nbytes if hasattr(score_matrix, 'nbytes') else 0) / 2 ** 20,
+        f'precision@{k}': float(np.mean(precisions)) if precisions else 0.0,
+        f'recall@{k}': float(np.mean(recalls)) if recalls else 0.0,
+    }
+
+
+def _load_legacy_matrix():
+    """
+    加载旧版推荐（recommed_module）使用的学生-课程评价矩阵（map_student_course.get_matrix，需在 database.installed() 中调用）
+
+    返回:
+        tuple: (评价矩阵, 学号到行号的映射, 按列排列的课程编号列表)
+    """
+    from utils import map_student_course
+    id_to_student, id_to_course, stu_no_to_id = map_student_course.get_map_student()
+    id_to_course_no = map_student_course.get_map_course_no()
+    matrix = map_student_course.get_matrix(id_to_student, id_to_course_no)
+    course_nos = [id_to_course_no[idx] for idx in range(len(id_to_course_no))]
+    return matrix, stu_no_to_id, course_nos
+
+
+def benchmark_legacy(database, eval_students, heldout, k):
+    """
+    基准测试 recommed_module.recommedCoursePerson（SVD）
+
+    参数、返回值同 benchmark_dynamic
+    """
+    timer = StageTimer()
+    # 截断SVD特征（getSvdFeatures，按数据版本缓存）计为相似度阶段，未评分课程的批量打分计为评分预测阶段
+    original_features = recommed_module.getSvdFeatures
+    original_score = recommed_module.scoreUnratedItems
+    recommed_module.getSvdFeatures = timer.wrap('similarity', original_features)
+    recommed_module.scoreUnratedItems = timer.wrap('prediction', original_score)
+    try:
+        with database.installed(), _quiet():
+            start = time.perf_counter()
+            matrix, stu_no_to_id, course_nos = _load_legacy_matrix()
+            load_seconds = time.perf_counter() - start
+
+            per_stage = {'similarity': [], 'prediction': [], 'ranking': []}
+            precisions, recalls = [], []
+            for stu_no in eval_students:
+                before = dict(timer.totals)
+                start = time.perf_counter()
+                result = recommed_module.recommedCoursePerson(matrix, stu_no_to_id[stu_no], N=k)
+                total = time.perf_counter() - start
+
+                similarity = timer.totals.get('similarity', 0.0) - before.get('similarity', 0.0)
+                prediction = timer.totals.get('prediction', 0.0) - before.get('prediction', 0.0)
+                per_stage['similarity'].append(similarity)
+                per_stage['prediction'].append(prediction)
+                per_stage['ranking'].append(total - similarity - prediction)
+
+                recommended = [course_nos[int(item)] for item, _ in result[0]] if result else []
+                precision, recall = _ranking_metrics(recommended, heldout[stu_no], k)
+                precisions.append(precision)
+                recalls.append(recall)
+
+            tracemalloc.start()
+            _load_legacy_matrix()
+            load_peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.reset_peak()
+            if eval_students:
+                recommed_module.recommedCoursePerson(matrix, stu_no_to_id[eval_students[0]], N=k)
+            recommend_peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+    finally:
+        recommed_module.getSvdFeatures = original_features
+        recommed_module.scoreUnratedItems = original_score
+
+    return {
+        'engine': 'recommed_module.recommedCoursePerson (SVD)',
+        'students_evaluated': len(eval_students),
+        'load_ms': load_seconds * 1000,
+        'stages': {stage: _summarize(samples) for stage, samples in per_stage.items()},
+        'peak_memory_mb': {'load': load_peak / 2 ** 20, 'recommend': recommend_peak / 2 ** 20},
+        'score_matrix_mb': matrix.nbytes / 2 ** 20,
+        f'precision@{k}': float(np.mean(precisions)) if precisions else 0.0,
+        f'recall@{k}': float(np.mean(recalls)) if recalls else 0.0,
+    }
+
+
+def run_benchmark(num_students, num_courses, density, seed=0, k=10, eval_users=100, legacy_users=5):
+    """
+    生成合成数据、留出部分选课记录，并对两套推荐系统进行基准测试
+
+    参数:
+        num_students, num_courses, density, seed: 合成数据参数
+        k: int, 推荐数量及评估截断位置
+        eval_users: int, DynamicCourseRecommender 评估的学生数
+        legacy_users: int, recommedCoursePerson 评估的学生数（0表示跳过）
+
+    返回:
+        dict: 完整报告
+    """
+    start = time.perf_counter()
+    dataset = generate_dataset(num_students, num_courses, density, seed)
+    train, heldout = split_holdout(dataset, seed=seed)
+    database = StandInDatabase(train)
+    setup_seconds = time.perf_counter() - start
+
+    rng = np.random.default_rng(seed)
+    candidates = sorted(heldout)
+    eval_students = sorted(rng.choice(candidates, size=min(eval_users, len(candidates)), replace=False).tolist())
+
+    report = {
+        'dataset': {
+            'students': num_students, 'courses': num_courses, 'density': density, 'seed': seed,
+            'enrollments': len(dataset.choose), 'heldout_students': len(heldout),
+            'setup_ms': setup_seconds * 1000,
+        },
+        'results': [benchmark_dynamic(database, eval_students, heldout, k)],
+    }
+    if legacy_users > 0:
+        report['results'].append(benchmark_legacy(database, eval_students[:legacy_users], heldout, k))
+    return report
+
+
+def print_report(report, k):
+    """以表格形式输出报告"""
+    dataset = report['dataset']
+    print(f"数据集: {dataset['students']} 个学生, {dataset['courses']} 门课程, 密度 {dataset['density']}, "
+          f"{dataset['enrollments']} 条选课记录, 种子 {dataset['seed']}")
+    for result in report['results']:
+        print(f"\n== {result['engine']} ({result['students_evaluated']} 个学生)")
+        print(f"  load        {result['load_ms']:10.1f} ms")
+        for stage, summary in result['stages'].items():
+            print(f"  {stage:<11} {summary['mean_ms']:10.2f} ms/学生 (p95 {summary['p95_ms']:.2f} ms)")
+        for stage, stats in result.get('pipeline_stages', {}).items():
+            if stats['calls']:
+                print(f"    {stage:<20} {stats['avg_ms']:8.2f} ms/次  课程数 {stats['avg_in']:.1f} -> {stats['avg_out']:.1f}")
+        print(f"  峰值内存    加载 {result['peak_memory_mb']['load']:.1f} MB, "
+              f"推荐 {result['peak_memory_mb']['recommend']:.1f} MB, 评分矩阵 {result['score_matrix_mb']:.1f} MB")
+        print(f"  precision@{k} {result[f'precision@{k}']:.4f}   recall@{k} {result[f'recall@{k}']:.4f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='推荐系统基准测试与离线评估')
+    parser.add_argument('--students', type=int, default=1000, help='学生数')
+    parser.add_argument('--courses', type=int, default=200, help='课程数')
+    parser.add_argument('--density', type=float, default=0.05, help='选课密度（0-1）')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子')
+    parser.add_argument('--k', type=int, default=10, help='推荐数量及 precision@k / recall@k 的 k')
+    parser.add_argument('--users', type=int, default=100, help='DynamicCourseRecommender 评估的学生数')
+    parser.add_argument('--legacy-users', type=int, default=5, help='recommedCoursePerson 评估的学生数（0表示跳过）')
+    parser.add_argument('--output', help='将报告保存为JSON文件（便于比较不同版本）')
+    args = parser.parse_args()
+
+    report = run_benchmark(
+        args.students, args.courses, args.density, args.seed, args.k, args.users, args.legacy_users
+    )
+    print_report(report, args.k)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n报告已保存到 {args.output}")
@@ -0,0 +1,97 @@
+"""
+本地替身数据库
+用内存中的 sqlite3 数据库承载合成数据，并在上下文中替换 utils.query.query / stream（以及各模块导入的同名函数），
+推荐系统的查询不需要修改即可在没有 MySQL 的环境中运行。
+
+只建立推荐系统读取的列；pymysql 风格的 %s 占位符会转换为 sqlite 的 ? 占位符。
+"""
+import sqlite3
+import sys
+from contextlib import contextmanager
+
+import utils.query
+
+CREATE_TABLE_SQLS = (
+    "CREATE TABLE STUDENT (STU_NO TEXT PRIMARY KEY, NAME TEXT, MAJOR TEXT, AD_YEAR TEXT)",
+    "CREATE TABLE EDUCATION_PLAN (CO_NO TEXT PRIMARY KEY, CO_NAME TEXT, CLASSIFICATION TEXT, MAJOR TEXT, "
+    "START_TIME TEXT, END_TIME TEXT, CLASS_TIME TEXT, MAX_STUDENTS INTEGER)",
+    "CREATE TABLE CHOOSE (STU_NO TEXT, CO_NO TEXT, GRADE REAL, COMMENT TEXT, PRIMARY KEY (STU_NO, CO_NO))",
+)
+
+
+class StandInDatabase:
+    """
+    基于 sqlite3 的替身数据库
+
+    属性:
+        connection: sqlite3.Connection, 内存数据库连接
+        query_count: int, 执行过的查询次数
+    """
+
+    def __init__(self, dataset=None):
+        self.connection = sqlite3.connect(':memory:', check_same_thread=False)
+        for sql in CREATE_TABLE_SQLS:
+            self.connection.execute(sql)
+        self.query_count = 0
+        if dataset is not None:
+            self.load(dataset)
+
+    def load(self, dataset):
+        """
+        清空三张表并写入数据集
+        """
+        with self.connection:
+            for table in ('STUDENT', 'EDUCATION_PLAN', 'CHOOSE'):
+                self.connection.execute(f"DELETE FROM {table}")
+            self.connection.executemany("INSERT INTO STUDENT VALUES (?, ?, ?, ?)", dataset.students)
+            self.connection.executemany(
+                "INSERT INTO EDUCATION_PLAN (CO_NO, CO_NAME, CLASSIFICATION, MAJOR) VALUES (?, ?, ?, ?)", dataset.courses
+            )
+            self.connection.executemany("INSERT INTO CHOOSE VALUES (?, ?, ?, ?)", dataset.choose)
+
+    def query(self, sql, params=None):
+        """
+        与 utils.query.query 接口一致：执行查询并返回全部结果行（元组的元组）
+        """
+        self.query_count += 1
+        if params is None:
+            cursor = self.connection.execute(sql)
+        else:
+            cursor = self.connection.execute(sql.replace('%s', '?'), tuple(params))
+        return tuple(cursor.fetchall())
+
+    def stream(self, sql, params=None, batch_size=5000, batches=False):
+        """
+        与 utils.query.stream 接口一致：逐行（batches=True 时逐批）产出查询结果
+        """
+        self.query_count += 1
+        if params is None:
+            cursor = self.connection.execute(sql)
+        else:
+            cursor = self.connection.execute(sql.replace('%s', '?'), tuple(params))
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            if batches:
+                yield rows
+            else:
+                yield from rows
+
+    @contextmanager
+    def installed(self):
+        """
+        在上下文中用本数据库替换 utils.query.query / stream 以及所有 utils 模块中导入的同名函数
+        """
+        patched = []
+        for attr in ('query', 'stream'):
+            original = getattr(utils.query, attr)
+            for name, module in list(sys.modules.items()):
+                if name.startswith('utils') and getattr(module, attr, None) is original:
+                    setattr(module, attr, getattr(self, attr))
+                    patched.append((module, attr, original))
+        try:
+            yield self
+        finally:
+            for module, attr, original in patched:
+                setattr(module, attr, original)
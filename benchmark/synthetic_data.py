@@ -0,0 +1,134 @@
+"""
+合成选课数据生成器
+按学生数、课程数和选课密度生成 STUDENT / EDUCATION_PLAN / CHOOSE 三张表的数据，相同参数和种子生成的数据完全相同。
+
+为了让离线评估指标有意义，数据带有隐含的兴趣结构：每门课程属于一个方向，每个学生对各方向有不同的偏好，
+学生更倾向于选择偏好方向的课程，并在这些课程上取得更高的成绩、给出更高的评价。
+"""
+from collections import namedtuple
+
+import numpy as np
+
+# 合成数据集，每个字段都是行元组列表，列与推荐系统查询的列一致：
+# students: (STU_NO, NAME, MAJOR, AD_YEAR)
+# courses: (CO_NO, CO_NAME, CLASSIFICATION, MAJOR)
+# choose: (STU_NO, CO_NO, GRADE, COMMENT)
+SyntheticDataset = namedtuple('SyntheticDataset', ['students', 'courses', 'choose'])
+
+MAJORS = ['软件工程', '计算机科学与技术', '数据科学与大数据技术', '网络工程', '信息安全', '物联网工程']
+DIRECTIONS = ['人工智能', '软件开发', '数据分析', '网络通信', '系统架构', '信息安全', '嵌入式', '图形图像']
+AD_YEARS = ['2019', '2020', '2021', '2022']
+
+# 课程类别的比例：必修 / 专业选修 / 文化素质教育选修
+CLASSIFICATION_WEIGHTS = (0.3, 0.5, 0.2)
+
+# 没有成绩（课程进行中）、没有评价的选课记录比例
+MISSING_GRADE_RATE = 0.15
+MISSING_COMMENT_RATE = 0.2
+
+
+def generate_dataset(num_students, num_courses, density, seed=0, num_majors=4):
+    """
+    生成合成数据集
+
+    参数:
+        num_students: int, 学生数
+        num_courses: int, 课程数
+        density: float, 选课密度（平均每个学生选修的课程比例，0-1）
+        seed: int, 随机种子
+        num_majors: int, 专业数量（最多 len(MAJORS) 个）
+
+    返回:
+        SyntheticDataset: 合成数据集
+    """
+    rng = np.random.default_rng(seed)
+    majors = MAJORS[:max(1, min(num_majors, len(MAJORS)))]
+    num_directions = len(DIRECTIONS)
+
+    # 步骤1: 课程：方向、类别、所属专业（约1/4为全校通用课程，MAJOR为空）
+    course_directions = rng.integers(num_directions, size=num_courses)
+    classification_kind = rng.choice(3, size=num_courses, p=CLASSIFICATION_WEIGHTS)
+    course_majors = rng.integers(-1, len(majors), size=num_courses)
+    courses = []
+    for j in range(num_courses):
+        direction = DIRECTIONS[course_directions[j]]
+        if classification_kind[j] == 0:
+            classification = '必修'
+        elif classification_kind[j] == 1:
+            classification = f'专业选修-{direction}'
+        else:
+            classification = '文化素质教育选修'
+        major = majors[course_majors[j]] if course_majors[j] >= 0 else ''
+        courses.append((f'C{j:05d}', f'{direction}课程{j}', classification, major))
+
+    # 步骤2: 学生：专业、年级，以及对各方向的偏好（Dirichlet 分布，偏好集中在少数方向）
+    student_majors = rng.integers(len(majors), size=num_students)
+    student_years = rng.integers(len(AD_YEARS), size=num_students)
+    preferences = rng.dirichlet(np.full(num_directions, 0.5), size=num_students)
+    students = [
+        (f'S{i:06d}', f'学生{i}', majors[student_majors[i]], AD_YEARS[student_years[i]])
+        for i in range(num_students)
+    ]
+
+    # 步骤3: 选课：选课概率与学生对课程方向的偏好成正比，平均密度为 density
+    affinity = preferences[:, course_directions] * num_directions  # 平均值为1
+    enrolled = rng.random((num_students, num_courses)) < np.minimum(density * affinity, 1.0)
+    stu_ids, course_ids = np.nonzero(enrolled)
+    affinity = affinity[stu_ids, course_ids]
+
+    # 步骤4: 成绩、评价：偏好越高，成绩和评价越高
+    grades = np.clip(rng.normal(68 + 8 * affinity, 10), 0, 100).round(1)
+    comments = np.clip(np.rint(1.5 + 1.2 * affinity + rng.normal(0, 1, len(affinity))), 0, 5).astype(int)
+    missing_grade = rng.random(len(affinity)) < MISSING_GRADE_RATE
+    missing_comment = rng.random(len(affinity)) < MISSING_COMMENT_RATE
+
+    choose = [
+        (
+            students[stu_id][0],
+            courses[course_id][0],
+            None if missing_grade[n] else float(grades[n]),
+            None if missing_comment[n] else str(comments[n]),
+        )
+        for n, (stu_id, course_id) in enumerate(zip(stu_ids.tolist(), course_ids.tolist()))
+    ]
+    return SyntheticDataset(students, courses, choose)
+
+
+def split_holdout(dataset, fraction=0.2, min_enrollments=5, seed=0):
+    """
+    留出部分选课记录用于离线评估
+
+    只留出专业选修课程的选课记录（推荐系统只推荐这类课程），
+    并且只对选课数不少于 min_enrollments 的学生留出，避免把学生变成冷启动用户。
+
+    参数:
+        dataset: SyntheticDataset, 完整数据集
+        fraction: float, 每个学生留出的专业选修课程比例（至少留出1门）
+        min_enrollments: int, 参与评估的学生最少选课数
+        seed: int, 随机种子
+
+    返回:
+        tuple: (训练数据集, 留出记录 dict: 学生编号 -> 课程编号集合)
+    """
+    rng = np.random.default_rng(seed)
+    elective_courses = {
+        co_no for co_no, _, classification, _ in dataset.courses if classification.startswith('专业选修')
+    }
+
+    rows_by_student = {}
+    for row in dataset.choose:
+        rows_by_student.setdefault(row[0], []).append(row)
+
+    heldout = {}
+    for stu_no, rows in rows_by_student.items():
+        if len(rows) < min_enrollments:
+            continue
+        electives = [row[1] for row in rows if row[1] in elective_courses]
+        # 至少保留一门专业选修课程在训练数据中
+        if len(electives) < 2:
+            continue
+        count = min(len(electives) - 1, max(1, int(round(len(electives) * fraction))))
+        heldout[stu_no] = set(rng.choice(electives, size=count, replace=False).tolist())
+
+    train_choose = [row for row in dataset.choose if row[1] not in heldout.get(row[0], ())]
+    return SyntheticDataset(dataset.students, dataset.courses, train_choose), heldout
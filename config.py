@@ -11,5 +11,55 @@ class Config:
 config = {
     'default': Config,
     'MYSQL_PASSWORD': 'Yr040719.',
-    'DATABASE_NAME': 'studenttrainplan'
+    'DATABASE_NAME': 'studenttrainplan',
+    # 推荐系统评分矩阵是否使用稀疏存储（学生和课程数量很大时开启）
+    'RECOMMEND_SPARSE_MATRIX': False,
+    # 推荐模式：'user' 基于学生相似度；'item' 基于课程相似邻居（需先运行 python -m utils.item_recommend 生成模型）；
+    # 'als' 基于ALS矩阵分解（需先运行 python -m utils.als_recommend 训练模型）
+    'RECOMMEND_MODE': 'user',
+    # 相似学生查找：'exact' 精确比较所有学生；'lsh' 先用 LSH 近似最近邻索引筛选候选（学生很多时使用）
+    'RECOMMEND_SIMILAR_STUDENT_SEARCH': 'exact',
+    # LSH 索引参数：哈希表越多、签名位数越少、探针越多，召回率越高，查询越慢
+    'RECOMMEND_LSH_TABLES': 16,
+    'RECOMMEND_LSH_BITS': 9,
+    'RECOMMEND_LSH_PROBES': 3,
+    # 每个推荐模型快照最多缓存的学生相似度整行数（LRU，每行占 学生数×8 字节）
+    'RECOMMEND_SIMILARITY_ROW_CACHE_SIZE': 256,
+    # 是否由后台线程刷新推荐模型（数据变化时增量更新，并定时从数据库完整重建），请求只读取已构建好的模型
+    'RECOMMEND_BACKGROUND_REFRESH': False,
+    # 后台刷新线程定时完整重建的间隔（秒）
+    'RECOMMEND_REFRESH_INTERVAL': 300,
+    # 是否通过内存映射的快照文件（model/recommend_snapshot.bin）在多个工作进程之间共享推荐模型，
+    # 进程启动或重建模型时映射文件，不再查询数据库
+    'RECOMMEND_SNAPSHOT_FILE': False,
+    # 推荐模型快照的最长有效期（秒）：快照文件过期后由下一个需要模型的进程从数据库重建并重新写入；
+    # 未开启后台刷新时，进程内的模型从数据库加载超过该时间后也完整重建（用于发现其他进程写入、直接修改数据库等变化）
+    'RECOMMEND_SNAPSHOT_MAX_AGE': 600,
+    # 后台刷新线程把本进程的增量变化写回快照文件的最短间隔（秒）；未开启后台刷新时只有从数据库完整重建的模型写回文件
+    'RECOMMEND_SNAPSHOT_WRITE_INTERVAL': 60,
+    # 推荐结果缓存最多保存的学生数（按学生缓存 /getRecommedData 的结果，学生自己选课变化时删除）
+    'RECOMMEND_RESULT_CACHE_SIZE': 10000,
+    # 推荐结果缓存的最长有效期（秒）
+    'RECOMMEND_RESULT_CACHE_TTL': 600,
+    # 默认关闭的推荐流水线阶段（见 utils/recommend_pipeline.py），例如 ['drop_time_conflicts']
+    'RECOMMEND_PIPELINE_DISABLED_STAGES': [],
+    # 数据库连接池（见 utils/db_pool.py）：第一次使用时建立的连接数、同时存在的连接数上限
+    'MYSQL_POOL_MIN_SIZE': 1,
+    'MYSQL_POOL_MAX_SIZE': 10,
+    # 连接都被占用时等待空闲连接的最长秒数
+    'MYSQL_POOL_TIMEOUT': 10,
+    # 连接的最长使用秒数，超过后关闭并重新建立（应小于 MySQL 的 wait_timeout）
+    'MYSQL_POOL_MAX_LIFETIME': 3600,
+    # 空闲超过该秒数的连接借出前先 ping 检查（0 表示每次借出都检查）
+    'MYSQL_POOL_HEALTH_CHECK_IDLE': 30,
+    # query.bulk_insert / bulk_update 每批写入的行数（每批合并为一条多行语句或一次 executemany）
+    'MYSQL_BULK_CHUNK_SIZE': 1000,
+    # query.stream 流式查询每次从服务器读取的行数
+    'MYSQL_STREAM_BATCH_SIZE': 5000,
+    # 慢查询阈值（秒），超过的语句打印到控制台并记录在 /api/query_stats 中
+    'MYSQL_SLOW_QUERY_SECONDS': 0.5,
+    # 是否为慢查询附带 EXPLAIN 执行计划（多执行一次 EXPLAIN 语句）
+    'MYSQL_SLOW_QUERY_EXPLAIN': False,
+    # 单个请求的查询次数达到该值时打印一行日志（用于发现循环中逐条查询的路由，0 表示每个请求都打印）
+    'MYSQL_REQUEST_QUERY_WARN': 50
 }
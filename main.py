@@ -1,6 +1,12 @@
 from flask import Flask, render_template, request, flash,  jsonify, redirect, url_for, session
 from utils import query, map_student_course, recommed_module, broadcast
-from utils.dynamic_recommend import DynamicCourseRecommender, to_bar_json, regular_data
+from utils.data_version import bump_data_version
+from utils.dynamic_recommend import DynamicCourseRecommender, build_recommend_json, get_model_version
+from utils.result_cache import recommend_result_cache
+from utils.query_stats import query_stats
+from utils.recommend_pipeline import get_pipeline_stats, set_stage_enabled
+from utils.batch_recommend import get_precomputed_recommendations
+from utils.model_refresher import start_model_refresher, get_model_refresher_status
 from utils.course_selection import (
     get_available_elective_courses, 
     get_student_chosen_courses,
@@ -13,12 +19,48 @@ import time
 from datetime import datetime, date
 import os
 from openai import OpenAI
+from config import config
 
 # 创建flask对象
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'gsolvit'
 
 
+# 推荐模型由后台线程刷新，/getRecommedData 请求不再承担加载和构建开销
+if config.get('RECOMMEND_BACKGROUND_REFRESH', False):
+    start_model_refresher()
+
+
+@app.before_request
+def begin_query_stats():
+    """
+    开始统计本次请求的数据库查询（按路由函数名汇总）
+    """
+    query_stats.begin_request(request.endpoint or request.path)
+
+
+@app.after_request
+def add_query_stats_headers(response):
+    """
+    在响应头中写入本次请求到目前为止的查询次数和数据库耗时（Server-Timing 可在浏览器开发者工具中查看）
+    """
+    current = query_stats.current_request()
+    if current is not None:
+        db_ms = current['seconds'] * 1000
+        response.headers['X-DB-Query-Count'] = str(current['queries'])
+        response.headers['X-DB-Time'] = '%.1f' % db_ms
+        response.headers['Server-Timing'] = 'db;dur=%.1f;desc="%d queries"' % (db_ms, current['queries'])
+    return response
+
+
+@app.teardown_request
+def end_query_stats(error=None):
+    """
+    结束本次请求的查询统计（流式响应在内容发送完之后才结束），查询次数过多时打印日志
+    """
+    query_stats.end_request()
+
+
 @app.route('/index', methods=['GET', 'POST'])
 def index():
     return render_template('index.html')
@@ -51,6 +93,7 @@ def managerAdd():
             sql="INSERT INTO STUDENT VALUES ('%s','%s','%s','%s','%s','%s','%s','%s')" % (name,sex,stu_no,college,major,ad_year,password,stu_no)
             #print(sql)
             query.update(sql)
+            bump_data_version()
             return redirect(url_for('manager'))
     else:
         return u'页面不存在'
@@ -70,6 +113,7 @@ def managerDelete():
             sql="DELETE FROM STUDENT WHERE STU_NO='%s'" % stu_no
             #print(sql)
             query.update(sql)
+            bump_data_version()
             return redirect(url_for('manager'))
     else:
         return u'页面不存在'
@@ -106,6 +150,7 @@ def managerEdit():
             sql="UPDATE STUDENT SET NAME='%s',SEX='%s',COLLEGE='%s',MAJOR='%s',AD_YEAR='%s',PASSWORD='%s',ID='%s' WHERE STU_NO='%s'" % (name, sex, college, major, ad_year, password, stu_no, stu_no)
             #print(sql)
             query.update(sql)
+            bump_data_version()
             return redirect(url_for('manager'))
     else:
         return u'页面不存在'
@@ -323,11 +368,70 @@ def api_get_topic_replies():
 def recommed():
     return render_template('recommed.html')
 
+
+def _compute_recommend_json(stu_no):
+    """
+    计算学生的推荐结果（/getRecommedData 的响应内容）
+
+    参数:
+        stu_no: str, 学生编号
+
+    返回:
+        dict: {"course": ECharts dataset, "person": ECharts dataset}
+    """
+    # 优先使用批量推荐任务预先计算好的结果（该学生选课记录没有变化时才可用）
+    precomputed = get_precomputed_recommendations(stu_no)
+    if precomputed is not None:
+        return precomputed
+    
+    # 创建推荐器实例（实例很轻量，评分矩阵和相似度缓存来自共享的模型快照）
+    recommender = DynamicCourseRecommender()
+    
+    # 获取推荐结果
+    topNCourse, topNStudent, id2Course, id2Student = recommender.get_recommendations(
+        stu_no, 
+        top_n_courses=20, 
+        top_n_students=20
+    )
+    
+    print(f"推荐结果 - 课程数量: {len(topNCourse)}, 学生数量: {len(topNStudent)}")
+    print(f"课程推荐示例: {topNCourse[:3] if topNCourse else '无'}")
+    print(f"学生推荐示例: {topNStudent[:3] if topNStudent else '无'}")
+    
+    # 转换为前端图表需要的JSON格式（课程评分归一化到1-5，学生相似度归一化到0-1）
+    coursePersonJson = build_recommend_json(topNCourse, topNStudent, id2Course, id2Student)
+    
+    # 如果数据为空，返回空数据但保持格式（只有列名）
+    if len(coursePersonJson['course']['source']) <= 1:
+        print("警告: 课程推荐数据为空，可能原因：1. 数据库中没有足够的选课数据 2. 该学生已选完所有课程")
+    if len(coursePersonJson['person']['source']) <= 1:
+        print("警告: 相似学生推荐数据为空")
+    
+    return coursePersonJson
+
+
+def _cached_json_response(cached):
+    """
+    由缓存的推荐结果生成响应：带 ETag/Last-Modified，浏览器每次都带条件请求重新验证，
+    结果没有变化时返回304
+
+    参数:
+        cached: CachedResult, 缓存的推荐结果
+    """
+    response = app.response_class(cached.body, mimetype='application/json')
+    response.set_etag(cached.etag)
+    response.last_modified = cached.created_at
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
 @app.route("/getRecommedData", methods=['GET','POST'])
 def getRecommedData():
     """
     使用动态推荐系统获取课程推荐和相似学生推荐
-    每次调用都会重新加载最新数据，确保推荐结果动态更新
+    推荐基于进程内共享的模型快照，选课/评分等数据变化后快照自动重建，确保推荐结果动态更新
+    结果按学生缓存（学生自己的选课记录变化后重新计算），响应带 ETag/Last-Modified，结果没有变化时条件请求返回304
     """
     stu_no = session.get('stu_id')
     
@@ -335,54 +439,14 @@ def getRecommedData():
         return jsonify({"error": "用户未登录"}), 401
     
     try:
-        # 创建推荐器实例（每次调用都创建新实例，确保使用最新数据）
-        recommender = DynamicCourseRecommender()
-        
-        # 获取推荐结果
-        topNCourse, topNStudent, id2Course, id2Student = recommender.get_recommendations(
-            stu_no, 
-            top_n_courses=20, 
-            top_n_students=20
-        )
-        
-        print(f"推荐结果 - 课程数量: {len(topNCourse)}, 学生数量: {len(topNStudent)}")
-        print(f"课程推荐示例: {topNCourse[:3] if topNCourse else '无'}")
-        print(f"学生推荐示例: {topNStudent[:3] if topNStudent else '无'}")
-        
-        # 转换为前端图表需要的JSON格式
-        courseJson = to_bar_json(topNCourse, id2Course)
-        personJson = to_bar_json(topNStudent, id2Student)
-        
-        print(f"转换后的课程JSON: {courseJson}")
-        print(f"转换后的学生JSON: {personJson}")
-        
-        # 如果数据为空，返回空数据但保持格式
-        if not courseJson['source'] or len(courseJson['source']) <= 1:  # 只有列名
-            print("警告: 课程推荐数据为空，可能原因：1. 数据库中没有足够的选课数据 2. 该学生已选完所有课程")
-            # 至少保留列名
-            if len(courseJson['source']) == 0:
-                courseJson['source'] = [["amount", "product"]]
-        
-        if not personJson['source'] or len(personJson['source']) <= 1:  # 只有列名
-            print("警告: 相似学生推荐数据为空")
-            if len(personJson['source']) == 0:
-                personJson['source'] = [["amount", "product"]]
-        
-        # 归一化数据：课程评分归一化到1-5，学生相似度归一化到0-1
-        if len(courseJson['source']) > 1:  # 有数据才归一化
-            courseJson = regular_data(courseJson, 1, 5)
-            print(f"归一化后的课程JSON: {courseJson}")
-        if len(personJson['source']) > 1:  # 有数据才归一化
-            personJson = regular_data(personJson, 0, 1)
-            print(f"归一化后的学生JSON: {personJson}")
-        
-        coursePersonJson = {}
-        coursePersonJson['course'] = courseJson
-        coursePersonJson['person'] = personJson
-        
-        print(f"最终返回的JSON: {coursePersonJson}")
-        
-        return jsonify(coursePersonJson)
+        # 直接返回缓存的结果（学生自己的选课记录变化时缓存会被删除，直到模型包含这次变化）
+        cached = recommend_result_cache.get(stu_no)
+        if cached is None:
+            model_version = get_model_version()
+            coursePersonJson = _compute_recommend_json(stu_no)
+            body = json.dumps(coursePersonJson, ensure_ascii=False).encode('utf-8')
+            cached = recommend_result_cache.put(stu_no, model_version, body)
+        return _cached_json_response(cached)
     
     except Exception as e:
         print(f"新推荐系统错误: {str(e)}")
@@ -448,6 +512,61 @@ def getRecommedData():
             traceback.print_exc()
             return jsonify({"error": f"推荐系统错误: 新系统错误={str(e)}, 旧系统错误={str(e2)}"}), 500
 
+@app.route('/api/recommend_model_status', methods=['GET'])
+def recommend_model_status():
+    """
+    API: 推荐模型后台刷新状态（管理员）：最近一次构建的时间、耗时、错误，用于对过期模型报警；
+    另附推荐结果缓存的命中统计和推荐流水线各阶段的耗时、候选课程数
+    """
+    if session.get('stu_id') != 'admin':
+        return jsonify({"success": False, "message": "没有权限"}), 403
+    status = get_model_refresher_status()
+    status['result_cache'] = recommend_result_cache.stats()
+    status['pipeline'] = get_pipeline_stats()
+    return jsonify(status)
+
+
+@app.route('/api/recommend_pipeline_stage', methods=['POST'])
+def recommend_pipeline_stage():
+    """
+    API: 开启/关闭推荐流水线的某个阶段（管理员），例如负载高时关闭代价较大的阶段
+    请求体: {"stage": 阶段名称, "enabled": true/false}
+    """
+    if session.get('stu_id') != 'admin':
+        return jsonify({"success": False, "message": "没有权限"}), 403
+    
+    data = request.get_json()
+    if not data or 'stage' not in data:
+        return jsonify({"success": False, "message": "请求数据格式错误"}), 400
+    
+    if not set_stage_enabled(data['stage'], bool(data.get('enabled', True))):
+        return jsonify({"success": False, "message": f"推荐流水线中没有阶段 {data['stage']}"}), 404
+    # 阶段开关会改变推荐结果，清空已缓存的结果
+    recommend_result_cache.clear()
+    return jsonify({"success": True, "pipeline": get_pipeline_stats()})
+
+
+@app.route('/api/query_stats', methods=['GET'])
+def api_query_stats():
+    """
+    API: 数据库查询统计（管理员）：按 SQL 指纹汇总的次数、耗时、行数和路由，以及最近的慢查询
+    参数: top（可选）返回总耗时最多的前 top 个指纹，默认 20
+    """
+    if session.get('stu_id') != 'admin':
+        return jsonify({"success": False, "message": "没有权限"}), 403
+    return jsonify(query_stats.stats(top=request.args.get('top', 20, type=int)))
+
+
+@app.route('/api/db_pool_status', methods=['GET'])
+def db_pool_status():
+    """
+    API: 数据库连接池统计（管理员）：当前连接数、借出/等待/超时次数，等待或超时增多说明 MYSQL_POOL_MAX_SIZE 偏小
+    """
+    if session.get('stu_id') != 'admin':
+        return jsonify({"success": False, "message": "没有权限"}), 403
+    return jsonify(query.get_pool_stats())
+
+
 @app.route('/personal_information', methods=['GET', 'POST'])
 @app.route('/personal_information/<section>', methods=['GET', 'POST'])
 def personal_information(section=None):
@@ -500,10 +619,11 @@ def submit_train_place():
     train_plan = twoData['tree']
     scores = twoData['scores']
 
-    # 更新数据库
+    # 更新数据库（计划树和评分在同一个事务中提交，任一步失败则全部回滚）
     stu_id = session.get('stu_id')
-    query.updateDatabase(stu_id, train_plan)
-    query.updateScore(stu_id, scores)
+    with query.transaction():
+        query.updateDatabase(stu_id, train_plan)
+        query.updateScore(stu_id, scores)
 
     # 重新获取最新的计划树数据（包含最新的分数和状态）
     # 这样可以确保前端展示的数据与数据库完全一致
@@ -1202,10 +1322,12 @@ def api_get_student_status():
 
 
 @app.route('/api/get_learning_statistics', methods=['GET'])
+@query.transactional
 def api_get_learning_statistics():
     """
     API: 获取学生学习统计数据
     包括：本学期课程数、已修学分、未完成课程数、课程进度概览
+    （所有查询共用一个数据库连接和一致的快照）
     """
     stu_no = session.get('stu_id')
     if not stu_no:
@@ -1319,6 +1441,7 @@ def api_update_personal_info():
         print(f"[DEBUG] 执行SQL: {sql}")
         
         query.update(sql)
+        bump_data_version()  # 姓名/专业变化会影响推荐模型快照
         
         print(f"[DEBUG] 更新成功 - 学号: {stu_no}")
         return jsonify({"success": True, "message": "个人信息更新成功"})
@@ -46,6 +46,7 @@ def seed_student_progress():
             # cursor.execute(f"DELETE FROM CHOOSE WHERE STU_NO = '{stu_id}'")
             
             print("Updating CHOOSE table...")
+            rows = []
             for co_no, co_100 in all_courses:
                 try:
                     idx = int(co_100) - 1 # CO_100 从 1 开始
@@ -53,14 +54,17 @@ def seed_student_progress():
                         # 插入或更新选课记录
                         # 随机分数 60-100
                         grade = random.randint(60, 100)
-                        # 使用 INSERT IGNORE 或 REPLACE
-                        insert_sql = f"""
-                        REPLACE INTO CHOOSE (AD_YEAR, MAJOR, STU_NO, CO_NO, GRADE, COMMENT)
-                        VALUES ('2016', '软件工程', '{stu_id}', '{co_no}', {grade}, '5')
-                        """
-                        cursor.execute(insert_sql)
+                        rows.append(('2016', '软件工程', stu_id, co_no, grade, '5'))
                 except Exception as e:
                     print(f"Error processing course {co_no}: {e}")
+
+            # 使用 REPLACE 批量写入（pymysql 会把所有行合并为一条多行 REPLACE 语句）
+            insert_sql = """
+            REPLACE INTO CHOOSE (AD_YEAR, MAJOR, STU_NO, CO_NO, GRADE, COMMENT)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            """
+            if rows:
+                cursor.executemany(insert_sql, rows)
                     
             conn.commit()
             print("Successfully updated CHOOSE table.")
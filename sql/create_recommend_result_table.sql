@@ -0,0 +1,8 @@
+-- 创建批量推荐结果表（utils/batch_recommend.py 首次运行时也会自动创建）
+CREATE TABLE IF NOT EXISTS RECOMMEND_RESULT (
+    STU_NO VARCHAR(255) NOT NULL,
+    RESULT_JSON MEDIUMTEXT NOT NULL,
+    STATE_HASH CHAR(32) NOT NULL,
+    CREATED_AT DATETIME NOT NULL,
+    PRIMARY KEY (STU_NO)
+)ENGINE=INNODB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
@@ -0,0 +1,50 @@
+"""
+测试公共夹具
+
+推荐系统的测试使用 benchmark 中的合成数据集和 sqlite 替身数据库（见 benchmark/standin_db.py），不需要 MySQL。
+
+用法:
+    python -m pytest -q tests
+"""
+import functools
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from benchmark.standin_db import StandInDatabase
+from benchmark.synthetic_data import generate_dataset
+from utils import dynamic_recommend
+from utils import snapshot_store
+from utils.data_version import bump_data_version
+
+
+@pytest.fixture
+def dataset():
+    """小规模合成数据集：120 个学生，30 门课程"""
+    return generate_dataset(120, 30, 0.15, seed=7)
+
+
+@pytest.fixture
+def standin_db(dataset):
+    """
+    用替身数据库替换 utils.query.query / stream，每个测试从空的模型快照开始
+    """
+    db = StandInDatabase(dataset)
+    with db.installed():
+        dynamic_recommend._model_snapshot = None
+        bump_data_version()
+        yield db
+    dynamic_recommend._model_snapshot = None
+
+
+@pytest.fixture
+def snapshot_file(tmp_path, monkeypatch):
+    """开启推荐模型快照文件，写入临时目录，返回文件路径"""
+    path = str(tmp_path / 'recommend_snapshot.bin')
+    monkeypatch.setattr(dynamic_recommend, 'SNAPSHOT_FILE', True)
+    for name in ('save_snapshot', 'snapshot_generation', 'load_fresh_snapshot'):
+        monkeypatch.setattr(dynamic_recommend, name, functools.partial(getattr(snapshot_store, name), path=path))
+    return path
@@ -0,0 +1,116 @@
+"""
+测试用的 pymysql 风格连接
+
+用 sqlite3 文件数据库模拟 MySQL 连接：多个连接共享同一个数据库文件，未提交的修改只有本连接能看到，
+server_status 与 pymysql 一样报告是否有未结束的事务（SERVER_STATUS_IN_TRANS）。
+只支持测试中用到的 DB-API 接口，SQL 中的 %s 占位符转换为 ?。
+"""
+import sqlite3
+
+from utils.db_pool import SERVER_STATUS_IN_TRANS
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self._connection = connection
+        self._cursor = connection.db.cursor()
+        self.rowcount = -1
+        self.lastrowid = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def execute(self, sql, params=None):
+        self._connection.statements.append(sql)
+        self._cursor.execute(sql.replace('%s', '?'), tuple(params or ()))
+        self.rowcount = self._cursor.rowcount
+        self.lastrowid = self._cursor.lastrowid
+        return self.rowcount
+
+    def executemany(self, sql, rows):
+        self._connection.statements.append(sql)
+        self._cursor.executemany(sql.replace('%s', '?'), [tuple(row) for row in rows])
+        self.rowcount = self._cursor.rowcount
+        return self.rowcount
+
+    def fetchall(self):
+        return tuple(self._cursor.fetchall())
+
+    def fetchmany(self, size):
+        return tuple(self._cursor.fetchmany(size))
+
+    def close(self):
+        self._cursor.close()
+
+
+class FakeConnection:
+    """
+    属性:
+        statements: list, 执行过的SQL语句
+        commits, rollbacks: int, 提交、回滚次数
+        alive: bool, 设为False模拟连接断开（ping、rollback 失败）
+    """
+
+    def __init__(self, path):
+        self.db = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self.statements = []
+        self.commits = 0
+        self.rollbacks = 0
+        self.alive = True
+        self.closed = False
+
+    @property
+    def server_status(self):
+        return SERVER_STATUS_IN_TRANS if self.db.in_transaction else 0
+
+    def cursor(self, cursor_class=None):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+        self.db.commit()
+
+    def rollback(self):
+        if not self.alive:
+            raise OSError('连接已断开')
+        self.rollbacks += 1
+        self.db.rollback()
+
+    def ping(self, reconnect=True):
+        if not self.alive:
+            raise OSError('连接已断开')
+
+    def close(self):
+        self.closed = True
+        self.db.close()
+
+
+class FakeServer:
+    """
+    共享同一个数据库文件的连接工厂（传给 ConnectionPool 作为 connect 参数）
+
+    属性:
+        connections: list, 建立过的所有连接
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.connections = []
+
+    def __call__(self):
+        connection = FakeConnection(self.path)
+        self.connections.append(connection)
+        return connection
+
+    def execute(self, sql, params=()):
+        """在一个独立的连接上执行语句并提交，返回全部结果行（用于准备数据和检查已提交的数据）"""
+        db = sqlite3.connect(self.path)
+        try:
+            rows = db.execute(sql, params).fetchall()
+            db.commit()
+            return rows
+        finally:
+            db.close()
@@ -0,0 +1,149 @@
+"""
+ALS 矩阵分解模型：批量求解与逐行正规方程一致、按编号对齐、保存加载，以及推荐器 'als' 模式与回退
+"""
+import numpy as np
+import pytest
+
+from utils import als_recommend, dynamic_recommend
+from utils.als_recommend import ALSFactorModel, train_als
+from utils.dynamic_recommend import DynamicCourseRecommender
+from utils.id_maps import CourseTable, StudentTable
+from utils.sparse_matrix import CSRScoreMatrix
+
+
+def _random_matrix(seed, num_students=45, num_courses=12):
+    rng = np.random.default_rng(seed)
+    scores = rng.choice([-0.5, 1.0, 2.5, 3.0, 4.5], size=(num_students, num_courses))
+    return scores * (rng.random((num_students, num_courses)) < 0.4)
+
+
+def _to_sparse(matrix):
+    rows, cols = np.nonzero(matrix)
+    return CSRScoreMatrix.from_coo(rows, cols, matrix[rows, cols], matrix.shape)
+
+
+@pytest.mark.parametrize('sparse', [False, True])
+def test_factor_updates_match_per_row_normal_equations(sparse, monkeypatch):
+    # 分块大小不整除学生数，覆盖最后一个不完整的块
+    monkeypatch.setattr(als_recommend, 'ROW_CHUNK_SIZE', 17)
+    dense = _random_matrix(0)
+    matrix = _to_sparse(dense) if sparse else dense
+    rng = np.random.default_rng(1)
+    course_factors = rng.normal(size=(dense.shape[1], 4))
+    regularization = 0.1
+
+    student_factors = als_recommend._update_student_factors(matrix, course_factors, regularization)
+    for student_id in range(dense.shape[0]):
+        rated = dense[student_id] > 0
+        gram = course_factors[rated].T @ course_factors[rated] + regularization * max(rated.sum(), 1) * np.eye(4)
+        expected = np.linalg.solve(gram, course_factors[rated].T @ dense[student_id, rated])
+        np.testing.assert_allclose(student_factors[student_id], expected, atol=1e-10)
+
+    updated_courses = als_recommend._update_course_factors(matrix, student_factors, regularization)
+    for course_id in range(dense.shape[1]):
+        rated = dense[:, course_id] > 0
+        gram = student_factors[rated].T @ student_factors[rated] + regularization * max(rated.sum(), 1) * np.eye(4)
+        expected = np.linalg.solve(gram, student_factors[rated].T @ dense[rated, course_id])
+        np.testing.assert_allclose(updated_courses[course_id], expected, atol=1e-10)
+
+
+def _student_table(stu_nos):
+    return StudentTable(stu_nos, [None] * len(stu_nos), ['软件工程'] * len(stu_nos))
+
+
+def _course_table(num_courses):
+    return CourseTable([f'C{j:03d}' for j in range(num_courses)], [None] * num_courses,
+                       ['专业选修'] * num_courses, [''] * num_courses)
+
+
+def test_training_reduces_error():
+    matrix = _random_matrix(2)
+    table = _student_table([f'S{i:03d}' for i in range(matrix.shape[0])])
+    courses = _course_table(matrix.shape[1])
+
+    one_round = train_als(matrix, table, courses, factors=4, iterations=1)
+    trained = train_als(matrix, table, courses, factors=4, iterations=10)
+
+    def rmse(model):
+        return als_recommend._training_rmse(matrix, model.student_factors, model.course_factors)
+    assert rmse(trained) < rmse(one_round)
+    assert list(trained.stu_nos) == [table[i][0] for i in range(len(table))]
+
+
+def test_align_follows_keys_not_positions():
+    rng = np.random.default_rng(3)
+    model_stu_nos = ['S005', 'S001', 'S999', 'S003']   # S999 已经不存在
+    student_factors = rng.normal(size=(4, 3))
+    model = ALSFactorModel(model_stu_nos, ['C000'], student_factors, rng.normal(size=(1, 3)))
+    table = _student_table([f'S{i:03d}' for i in range(6)])   # S000、S002、S004 是训练之后新增的学生
+
+    aligned, known, _, _ = model.align(table, _course_table(1))
+
+    np.testing.assert_array_equal(known, [False, True, False, True, False, True])
+    for row, stu_no in enumerate(model_stu_nos):
+        student_id = table.lookup([stu_no])[0]
+        if student_id >= 0:
+            np.testing.assert_array_equal(aligned[student_id], student_factors[row])
+    assert not aligned[~known].any()
+
+
+def test_save_and_load_round_trip(tmp_path):
+    rng = np.random.default_rng(4)
+    model = ALSFactorModel(['S1', 'S2'], ['C1', 'C2', 'C3'], rng.normal(size=(2, 3)), rng.normal(size=(3, 3)))
+    path = str(tmp_path / 'als.npz')
+    model.save(path)
+
+    loaded = ALSFactorModel.load(path)
+
+    np.testing.assert_array_equal(loaded.stu_nos, model.stu_nos)
+    np.testing.assert_array_equal(loaded.course_nos, model.course_nos)
+    np.testing.assert_array_equal(loaded.student_factors, model.student_factors)
+    np.testing.assert_array_equal(loaded.course_factors, model.course_factors)
+    assert loaded.trained_at == model.trained_at
+    assert ALSFactorModel.load(str(tmp_path / 'missing.npz')) is None
+
+
+@pytest.fixture
+def als_snapshot(standin_db, monkeypatch):
+    """在替身数据库的快照上训练 ALS 模型，并让推荐器使用 'als' 模式"""
+    recommender = DynamicCourseRecommender()
+    snapshot = recommender._get_model_snapshot()
+    model = train_als(snapshot.score_matrix, snapshot.id_to_stu_no, snapshot.id_to_course_no,
+                      factors=5, iterations=5)
+    monkeypatch.setattr(dynamic_recommend, 'get_als_model', lambda: model)
+    monkeypatch.setattr(dynamic_recommend, 'RECOMMEND_MODE', 'als')
+    return snapshot, model
+
+
+def _active_students(snapshot, count=5):
+    """选课最多的几个学生（不走冷启动推荐）"""
+    course_counts = np.asarray((snapshot.score_matrix > 0).sum(axis=1)).ravel()
+    return np.argsort(-course_counts, kind='stable')[:count].tolist()
+
+
+def test_als_mode_ranks_by_factor_product(als_snapshot):
+    snapshot, model = als_snapshot
+    recommender = DynamicCourseRecommender()
+
+    for student_id in _active_students(snapshot):
+        courses, _ = recommender.recommend_courses(snapshot.id_to_stu_no[student_id][0])
+        assert courses
+        expected = [float(model.course_factors[course_id] @ model.student_factors[student_id])
+                    for course_id, _ in courses]
+        np.testing.assert_allclose([score for _, score in courses], expected, atol=1e-10)
+        assert expected == sorted(expected, reverse=True)
+
+
+def test_student_missing_from_model_falls_back_to_user_mode(als_snapshot, monkeypatch):
+    snapshot, model = als_snapshot
+    student_id = _active_students(snapshot, 1)[0]
+    stu_no = snapshot.id_to_stu_no[student_id][0]
+    keep = model.stu_nos != stu_no
+    partial = ALSFactorModel(model.stu_nos[keep], model.course_nos, model.student_factors[keep], model.course_factors)
+    monkeypatch.setattr(dynamic_recommend, 'get_als_model', lambda: partial)
+
+    als_courses, _ = DynamicCourseRecommender().recommend_courses(stu_no)
+    monkeypatch.setattr(dynamic_recommend, 'RECOMMEND_MODE', 'user')
+    user_courses, _ = DynamicCourseRecommender().recommend_courses(stu_no)
+
+    assert als_courses == user_courses
@@ -0,0 +1,41 @@
+"""
+批量推荐：多进程分片计算的结果与单进程一致，工作进程只使用主进程共享的评分矩阵
+"""
+import functools
+import os
+
+from utils import batch_recommend
+from utils import dynamic_recommend
+from utils import snapshot_store
+from utils.dynamic_recommend import DynamicCourseRecommender
+
+
+def _only_in_process(pid, method):
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        assert os.getpid() == pid, f'工作进程不应调用 {method.__name__}'
+        return method(*args, **kwargs)
+    return wrapper
+
+
+def test_single_process_keeps_row_cache_small(standin_db, monkeypatch):
+    monkeypatch.setattr(batch_recommend, 'SHARD_SIZE', 25)
+    results = batch_recommend.compute_batch_recommendations()
+
+    assert len(results) == len(dynamic_recommend._model_snapshot.id_to_stu_no)
+    assert len(dynamic_recommend._model_snapshot.student_similarity_row_cache) == 0
+
+
+def test_parallel_workers_use_shared_matrix_with_snapshot_file(standin_db, snapshot_file, monkeypatch):
+    monkeypatch.setattr(batch_recommend, 'SHARD_SIZE', 25)
+    expected = batch_recommend.compute_batch_recommendations()
+    generation = snapshot_store.snapshot_generation(snapshot_file)
+
+    # 工作进程（fork 继承这里的替换）既不能从数据库重建，也不能重新映射快照文件
+    for name in ('_load_student_course_data', '_map_snapshot_file'):
+        monkeypatch.setattr(DynamicCourseRecommender, name,
+                            _only_in_process(os.getpid(), getattr(DynamicCourseRecommender, name)))
+    results = batch_recommend.compute_batch_recommendations_parallel(processes=2)
+
+    assert results == expected
+    assert snapshot_store.snapshot_generation(snapshot_file) == generation
@@ -0,0 +1,178 @@
+"""
+数据库连接池（ConnectionPool）：连接复用、数量上限与等待超时、健康检查、最长使用时间、归还时的回滚
+"""
+import os
+import threading
+
+import pytest
+
+from fake_mysql import FakeServer
+from utils.db_pool import ConnectionPool, PoolTimeoutError
+
+
+@pytest.fixture
+def server(tmp_path):
+    server = FakeServer(str(tmp_path / 'pool.db'))
+    server.execute("CREATE TABLE T (ID INTEGER PRIMARY KEY, NAME TEXT)")
+    return server
+
+
+def _pool(server, **kwargs):
+    options = dict(min_size=1, max_size=3, timeout=0.2, max_lifetime=3600, health_check_idle=3600)
+    options.update(kwargs)
+    return ConnectionPool(server, **options)
+
+
+def test_statements_reuse_one_connection(server):
+    pool = _pool(server)
+
+    for _ in range(50):
+        with pool.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT COUNT(*) FROM T")
+
+    # 原来每条语句新建一个连接；连接池中顺序执行的语句共用一个连接
+    assert len(server.connections) == 1
+    stats = pool.stats()
+    assert stats['checkouts'] == 50 and stats['created'] == 1 and stats['in_use'] == 0
+
+
+def test_min_size_connections_created_on_first_use(server):
+    pool = _pool(server, min_size=2)
+    assert server.connections == []
+
+    with pool.connection():
+        pass
+
+    assert pool.stats()['size'] == 2
+
+
+def test_invalid_sizes_rejected(server):
+    with pytest.raises(ValueError):
+        ConnectionPool(server, min_size=3, max_size=2)
+
+
+def test_waits_for_release_then_times_out(server):
+    pool = _pool(server)
+    held = [pool.acquire() for _ in range(3)]
+
+    with pytest.raises(PoolTimeoutError):
+        pool.acquire()
+
+    threading.Timer(0.05, pool.release, args=(held[0],)).start()
+    assert pool.acquire() is held[0]
+
+    stats = pool.stats()
+    assert stats['waits'] == 2 and stats['timeouts'] == 1 and stats['size'] == 3
+
+
+def test_concurrent_use_stays_within_max_size(server):
+    pool = _pool(server, timeout=5)
+
+    def work():
+        for _ in range(100):
+            with pool.connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(server.connections) <= 3
+    assert pool.stats()['in_use'] == 0
+
+
+def test_failed_health_check_replaces_connection(server):
+    pool = _pool(server, health_check_idle=0)
+    with pool.connection() as first:
+        pass
+    first_fake = server.connections[0]
+    first_fake.alive = False
+
+    with pool.connection() as conn:
+        assert conn is not first
+
+    assert first_fake.closed
+    assert pool.stats()['health_check_failures'] == 1
+
+
+def test_expired_connections_are_closed(server):
+    pool = _pool(server, max_lifetime=0)
+
+    with pool.connection():
+        pass
+
+    # 预先建立的连接在借出时已过期，新建的连接在归还时过期
+    assert len(server.connections) == 2 and all(conn.closed for conn in server.connections)
+    assert pool.stats()['expired'] == 2 and pool.stats()['size'] == 0
+
+
+def test_connection_error_discards_but_sql_error_keeps(server):
+    pool = _pool(server)
+
+    with pytest.raises(OSError):
+        with pool.connection():
+            server.connections[0].alive = False
+            raise OSError('连接已断开')
+    assert pool.stats()['discarded'] == 1
+
+    with pytest.raises(ValueError):
+        with pool.connection():
+            raise ValueError('SQL 错误')
+    assert pool.stats()['discarded'] == 1 and pool.stats()['idle'] == 1
+
+
+def test_release_rolls_back_only_open_transactions(server):
+    pool = _pool(server)
+
+    # 已经提交的连接直接放回池中，不再发送 ROLLBACK
+    with pool.connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("INSERT INTO T (NAME) VALUES (%s)", ('a',))
+        conn.commit()
+    fake = server.connections[0]
+    assert fake.rollbacks == 0
+
+    # 没有提交的事务在归还时回滚，下一个使用者看不到
+    with pool.connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("INSERT INTO T (NAME) VALUES (%s)", ('b',))
+    assert fake.rollbacks == 1
+    assert server.execute("SELECT NAME FROM T") == [('a',)]
+
+    # 使用中抛出异常时一定回滚
+    with pytest.raises(ValueError):
+        with pool.connection():
+            raise ValueError
+    assert fake.rollbacks == 2
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='需要 os.fork')
+def test_child_process_does_not_reuse_parent_connections(server):
+    pool = _pool(server)
+    with pool.connection():
+        pass
+
+    pid = os.fork()
+    if pid == 0:
+        with pool.connection():
+            pass
+        os._exit(0 if len(server.connections) == 2 else 1)
+    _, status = os.waitpid(pid, 0)
+
+    assert status == 0
+    assert len(server.connections) == 1 and not server.connections[0].closed
+
+
+def test_close_releases_idle_connections(server):
+    pool = _pool(server, min_size=2)
+    with pool.connection():
+        pass
+
+    pool.close()
+
+    assert all(conn.closed for conn in server.connections)
+    assert pool.stats()['idle'] == 0
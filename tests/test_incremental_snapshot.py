@@ -0,0 +1,114 @@
+"""
+模型快照的增量更新：选课、退课、评分变化后增量更新的评分矩阵和缓存的相似度整行与从数据库完整重建的结果一致
+"""
+import random
+
+import numpy as np
+import pytest
+
+from utils import dynamic_recommend
+from utils.data_version import publish_choose_change
+from utils.dynamic_recommend import DynamicCourseRecommender
+
+
+def _dense(matrix):
+    return matrix if isinstance(matrix, np.ndarray) else matrix.to_dense()
+
+
+def _change_choose(db, rnd, students, courses):
+    """随机选课、退课或修改成绩/评价，并发布对应的选课变化事件"""
+    stu_no, co_no = rnd.choice(students)[0], rnd.choice(courses)[0]
+    exists = db.connection.execute(
+        "SELECT 1 FROM CHOOSE WHERE STU_NO = ? AND CO_NO = ?", (stu_no, co_no)
+    ).fetchone()
+    with db.connection:
+        if exists and rnd.random() < 0.5:
+            db.connection.execute("DELETE FROM CHOOSE WHERE STU_NO = ? AND CO_NO = ?", (stu_no, co_no))
+            publish_choose_change(stu_no, co_no, removed=True)
+            return
+        grade, comment = rnd.choice([None, 65, 95]), rnd.choice([None, '4'])
+        db.connection.execute("INSERT OR REPLACE INTO CHOOSE VALUES (?, ?, ?, ?)", (stu_no, co_no, grade, comment))
+    publish_choose_change(stu_no, co_no, grade, comment)
+
+
+@pytest.mark.parametrize('sparse', [False, True])
+def test_incremental_updates_match_full_rebuild(standin_db, dataset, monkeypatch, sparse):
+    monkeypatch.setattr(dynamic_recommend, 'SPARSE_SCORE_MATRIX', sparse)
+    rnd = random.Random(0)
+    recommender = DynamicCourseRecommender()
+    for student in dataset.students[:10]:
+        recommender.get_recommendations(student[0])
+
+    for _ in range(40):
+        _change_choose(standin_db, rnd, dataset.students, dataset.courses)
+        recommender = DynamicCourseRecommender()
+        recommender.get_recommendations(rnd.choice(dataset.students)[0])
+        snapshot = dynamic_recommend._model_snapshot
+        assert snapshot.source == 'incremental'
+
+        expected = _dense(DynamicCourseRecommender()._load_student_course_data()[2])
+        np.testing.assert_array_equal(_dense(snapshot.score_matrix), expected)
+        # 沿用到新快照的相似度整行与用完整重建的矩阵重新计算的结果一致
+        cached_ids = list(snapshot.student_similarity_row_cache._rows)
+        assert cached_ids
+        for student_id in cached_ids:
+            np.testing.assert_allclose(
+                recommender._get_student_similarity_row(student_id, snapshot.score_matrix),
+                recommender._pearson_correlation_row(student_id, expected),
+                atol=1e-12,
+            )
+
+
+def _select_course(db, stu_no, co_no, grade):
+    with db.connection:
+        db.connection.execute("INSERT OR REPLACE INTO CHOOSE VALUES (?, ?, ?, NULL)", (stu_no, co_no, grade))
+    publish_choose_change(stu_no, co_no, grade)
+
+
+def test_dense_update_writes_cells_without_copying(standin_db, dataset):
+    stu_no, co_no = dataset.students[0][0], dataset.courses[0][0]
+    recommender = DynamicCourseRecommender()
+    recommender.get_recommendations(stu_no)
+    matrix = dynamic_recommend._model_snapshot.score_matrix
+
+    for grade in (65, 95):
+        _select_course(standin_db, stu_no, co_no, grade)
+        recommender.get_recommendations(stu_no)
+        snapshot = dynamic_recommend._model_snapshot
+        assert snapshot.source == 'incremental' and snapshot.score_matrix is matrix
+
+    expected = _dense(DynamicCourseRecommender()._load_student_course_data()[2])
+    np.testing.assert_array_equal(matrix, expected)
+
+
+def test_read_only_dense_matrix_copied_once(standin_db, dataset):
+    stu_no, co_no = dataset.students[0][0], dataset.courses[0][0]
+    recommender = DynamicCourseRecommender()
+    recommender.get_recommendations(stu_no)
+    # 相当于映射自快照文件的只读矩阵
+    matrix = dynamic_recommend._model_snapshot.score_matrix
+    matrix.flags.writeable = False
+
+    _select_course(standin_db, stu_no, co_no, 65)
+    recommender.get_recommendations(stu_no)
+    copied = dynamic_recommend._model_snapshot.score_matrix
+    assert copied is not matrix and copied.flags.writeable
+
+    _select_course(standin_db, stu_no, co_no, 95)
+    recommender.get_recommendations(stu_no)
+    assert dynamic_recommend._model_snapshot.score_matrix is copied
+
+
+def test_background_refresh_copies_dense_matrix(standin_db, dataset, monkeypatch):
+    stu_no, co_no = dataset.students[0][0], dataset.courses[0][0]
+    recommender = DynamicCourseRecommender()
+    recommender.get_recommendations(stu_no)
+    old_snapshot = dynamic_recommend._model_snapshot
+    old_values = old_snapshot.score_matrix.copy()
+
+    monkeypatch.setattr(dynamic_recommend, '_background_refresh', True)
+    _select_course(standin_db, stu_no, co_no, 95)
+    new_snapshot = recommender._refresh_model_snapshot()
+
+    assert new_snapshot.score_matrix is not old_snapshot.score_matrix
+    np.testing.assert_array_equal(old_snapshot.score_matrix, old_values)
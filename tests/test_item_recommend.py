@@ -0,0 +1,120 @@
+"""
+课程相似邻居模型：余弦相似度、top-K 邻居、按课程编号对齐，以及查表打分与逐对加权求和一致
+"""
+import numpy as np
+import pytest
+
+from utils.id_maps import CourseTable
+from utils.item_recommend import (
+    CourseNeighborModel, build_course_neighbor_model, compute_course_similarity, score_courses
+)
+from utils.sparse_matrix import CSRScoreMatrix
+
+
+def _random_matrix(seed, num_students=40, num_courses=10):
+    rng = np.random.default_rng(seed)
+    scores = rng.choice([-0.5, 1.0, 2.5, 3.0, 4.5], size=(num_students, num_courses))
+    return scores * (rng.random((num_students, num_courses)) < 0.4)
+
+
+def _course_table(co_nos):
+    return CourseTable(co_nos, [None] * len(co_nos), ['专业选修'] * len(co_nos), [''] * len(co_nos))
+
+
+@pytest.mark.parametrize('sparse', [False, True])
+def test_similarity_matches_pairwise_cosine(sparse):
+    dense = _random_matrix(0)
+    dense[:, 3] = 0   # 没有人选的课程与所有课程的相似度为0
+    rows, cols = np.nonzero(dense)
+    matrix = CSRScoreMatrix.from_coo(rows, cols, dense[rows, cols], dense.shape) if sparse else dense
+
+    similarity = compute_course_similarity(matrix)
+
+    for i in range(dense.shape[1]):
+        for j in range(dense.shape[1]):
+            norm = np.linalg.norm(dense[:, i]) * np.linalg.norm(dense[:, j])
+            expected = 0.0 if i == j or norm == 0 else dense[:, i] @ dense[:, j] / norm
+            assert similarity[i, j] == pytest.approx(expected, abs=1e-12)
+
+
+def test_neighbors_are_top_k_by_similarity():
+    dense = _random_matrix(1)
+    model = build_course_neighbor_model(dense, _course_table([f'C{j:03d}' for j in range(10)]), top_k=4)
+    similarity = compute_course_similarity(dense)
+
+    for course_id in range(10):
+        neighbor_ids = model.neighbor_ids[course_id]
+        assert course_id not in neighbor_ids
+        expected = np.sort(np.delete(similarity[course_id], course_id))[::-1][:4]
+        np.testing.assert_allclose(similarity[course_id, neighbor_ids], expected, atol=1e-12)
+        np.testing.assert_allclose(model.neighbor_sims[course_id], np.maximum(expected, 0.0), atol=1e-12)
+
+
+def test_align_follows_keys_not_positions():
+    model_co_nos = ['C004', 'C001', 'C999', 'C002']   # C999 已经不存在
+    neighbor_ids = np.array([[1, 2], [3, 0], [0, 1], [2, 1]], dtype=np.int32)
+    neighbor_sims = np.array([[0.9, 0.8], [0.7, 0.6], [0.5, 0.4], [0.3, 0.2]])
+    model = CourseNeighborModel(model_co_nos, neighbor_ids, neighbor_sims)
+    table = _course_table([f'C{j:03d}' for j in range(6)])   # C000、C003、C005 是建模之后新增的课程
+
+    aligned_ids, aligned_sims = model.align(table)
+
+    assert aligned_ids.shape == aligned_sims.shape == (6, 2)
+    # C004 的邻居 C001、C999：C999 已经不存在，ID 置为0、相似度置为0
+    np.testing.assert_array_equal(aligned_ids[4], [1, 0])
+    np.testing.assert_array_equal(aligned_sims[4], [0.9, 0.0])
+    # C001 的邻居 C002、C004
+    np.testing.assert_array_equal(aligned_ids[1], [2, 4])
+    np.testing.assert_array_equal(aligned_sims[1], [0.7, 0.6])
+    # C002 的邻居 C999、C001
+    np.testing.assert_array_equal(aligned_ids[2], [0, 1])
+    np.testing.assert_array_equal(aligned_sims[2], [0.0, 0.2])
+    # 模型中没有的课程没有邻居
+    for course_id in (0, 3, 5):
+        assert not aligned_sims[course_id].any()
+
+
+def test_align_empty_model():
+    model = CourseNeighborModel([], np.zeros((0, 3), dtype=np.int32), np.zeros((0, 3)))
+
+    aligned_ids, aligned_sims = model.align(_course_table(['C000', 'C001']))
+
+    assert aligned_ids.shape == (2, 3) and not aligned_sims.any()
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_score_courses_matches_pairwise_sum(seed):
+    rng = np.random.default_rng(seed)
+    num_courses, top_k = 12, 4
+    neighbor_ids = np.array([rng.choice(np.delete(np.arange(num_courses), c), top_k, replace=False)
+                             for c in range(num_courses)])
+    neighbor_sims = rng.random((num_courses, top_k)) * (rng.random((num_courses, top_k)) < 0.8)
+    student_vector = rng.choice([0, 0, -0.5, 1.5, 3.0], size=num_courses)
+    course_ids = np.nonzero(student_vector == 0)[0]
+
+    weighted_sum, similarity_sum = score_courses(neighbor_ids, neighbor_sims, student_vector, course_ids)
+
+    for position, course_id in enumerate(course_ids):
+        expected_weighted = expected_similarity = 0.0
+        for rated_id in np.nonzero(student_vector > 0)[0]:
+            for neighbor_id, similarity in zip(neighbor_ids[rated_id], neighbor_sims[rated_id]):
+                if neighbor_id == course_id:
+                    expected_weighted += similarity * student_vector[rated_id]
+                    expected_similarity += similarity
+        assert weighted_sum[position] == pytest.approx(expected_weighted, abs=1e-12)
+        assert similarity_sum[position] == pytest.approx(expected_similarity, abs=1e-12)
+
+
+def test_save_and_load_round_trip(tmp_path):
+    dense = _random_matrix(2)
+    model = build_course_neighbor_model(dense, _course_table([f'C{j:03d}' for j in range(10)]), top_k=3)
+    path = str(tmp_path / 'course_neighbors.npz')
+    model.save(path)
+
+    loaded = CourseNeighborModel.load(path)
+
+    np.testing.assert_array_equal(loaded.course_nos, model.course_nos)
+    np.testing.assert_array_equal(loaded.neighbor_ids, model.neighbor_ids)
+    np.testing.assert_array_equal(loaded.neighbor_sims, model.neighbor_sims)
+    assert loaded.built_at == model.built_at
+    assert CourseNeighborModel.load(str(tmp_path / 'missing.npz')) is None
@@ -0,0 +1,60 @@
+"""
+进程内共享的推荐模型快照：按数据版本复用，超过最长有效期后从数据库完整重建
+"""
+import numpy as np
+
+from utils import dynamic_recommend
+from utils.dynamic_recommend import DynamicCourseRecommender
+
+
+def _student_row(snapshot, stu_no):
+    student_id = snapshot.stu_no_to_id[stu_no]
+    matrix = snapshot.score_matrix
+    return matrix[student_id] if isinstance(matrix, np.ndarray) else matrix.row(student_id)
+
+
+def _delete_choices_directly(db, stu_no):
+    """直接修改数据库（相当于其他进程写入），不通知数据版本"""
+    with db.connection:
+        db.connection.execute("DELETE FROM CHOOSE WHERE STU_NO = ?", (stu_no,))
+
+
+def test_snapshot_reused_within_max_age(standin_db, dataset):
+    stu_no = dataset.students[0][0]
+    recommender = DynamicCourseRecommender()
+    recommender.get_recommendations(stu_no)
+    snapshot = dynamic_recommend._model_snapshot
+
+    _delete_choices_directly(standin_db, stu_no)
+    recommender.get_recommendations(stu_no)
+
+    assert dynamic_recommend._model_snapshot is snapshot
+    assert np.any(_student_row(snapshot, stu_no))
+
+
+def test_snapshot_rebuilt_after_max_age(standin_db, dataset):
+    stu_no = dataset.students[0][0]
+    recommender = DynamicCourseRecommender()
+    recommender.get_recommendations(stu_no)
+    snapshot = dynamic_recommend._model_snapshot
+
+    _delete_choices_directly(standin_db, stu_no)
+    snapshot.built_at -= dynamic_recommend.SNAPSHOT_MAX_AGE + 1
+    recommender.get_recommendations(stu_no)
+
+    rebuilt = dynamic_recommend._model_snapshot
+    assert rebuilt is not snapshot and rebuilt.source == 'database'
+    assert not np.any(_student_row(rebuilt, stu_no))
+
+
+def test_background_refresh_leaves_expiry_to_refresher(standin_db, dataset, monkeypatch):
+    stu_no = dataset.students[0][0]
+    recommender = DynamicCourseRecommender()
+    recommender.get_recommendations(stu_no)
+    snapshot = dynamic_recommend._model_snapshot
+
+    monkeypatch.setattr(dynamic_recommend, '_background_refresh', True)
+    snapshot.built_at -= dynamic_recommend.SNAPSHOT_MAX_AGE + 1
+    recommender.get_recommendations(stu_no)
+
+    assert dynamic_recommend._model_snapshot is snapshot
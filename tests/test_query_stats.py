@@ -0,0 +1,125 @@
+"""
+查询统计（utils.query_stats）：SQL 指纹的归一化和每个请求的查询次数（响应头 X-DB-Query-Count）
+"""
+import threading
+
+import pytest
+
+from fake_mysql import FakeServer
+from utils import query
+from utils.db_pool import ConnectionPool
+from utils.query_stats import QueryStats, fingerprint
+
+
+@pytest.mark.parametrize('sql, expected', [
+    # 字符串中的转义引号（反斜杠和重复引号）不会提前结束字面量
+    (r"SELECT * FROM STUDENT WHERE STU_NAME='O\'Brien'", "SELECT * FROM STUDENT WHERE STU_NAME=?"),
+    ("SELECT * FROM STUDENT WHERE STU_NAME='O''Brien' AND CLASS=\"a\\\"b\"",
+     "SELECT * FROM STUDENT WHERE STU_NAME=? AND CLASS=?"),
+    # 字符串中像注释、数字的内容不影响指纹
+    ("SELECT * FROM COURSE WHERE CO_NAME='C# -- 1 /* x */'", "SELECT * FROM COURSE WHERE CO_NAME=?"),
+    # 注释
+    ("SELECT /* 推荐 */ CO_NO FROM CHOOSE -- 行尾注释\nWHERE STU_NO=%s", "SELECT CO_NO FROM CHOOSE WHERE STU_NO=?"),
+    ("SELECT CO_NO FROM CHOOSE # 行尾注释\nWHERE STU_NO=%s", "SELECT CO_NO FROM CHOOSE WHERE STU_NO=?"),
+    # 占位符和数字
+    ("UPDATE CHOOSE SET GRADE=%(grade)s WHERE STU_NO=%(stu_no)s AND CO_NO=%s",
+     "UPDATE CHOOSE SET GRADE=? WHERE STU_NO=? AND CO_NO=?"),
+    ("SELECT * FROM CHOOSE WHERE GRADE > 59.5 LIMIT 10", "SELECT * FROM CHOOSE WHERE GRADE > ? LIMIT ?"),
+    # 标识符中的数字不替换
+    ("SELECT CO_NO FROM CHOOSE_2024", "SELECT CO_NO FROM CHOOSE_2024"),
+    # 空白合并，去掉末尾分号
+    ("  SELECT\tCO_NO\n\n FROM   COURSE ;  ", "SELECT CO_NO FROM COURSE"),
+])
+def test_fingerprint_normalises_literals(sql, expected):
+    assert fingerprint(sql) == expected
+
+
+def test_fingerprint_collapses_in_lists():
+    expected = "SELECT * FROM CHOOSE WHERE STU_NO IN (?+) AND CO_NO IN (?+)"
+    assert fingerprint("SELECT * FROM CHOOSE WHERE STU_NO IN (%s) AND CO_NO IN (%s, %s)") == expected
+    assert fingerprint("SELECT * FROM CHOOSE WHERE STU_NO in ( '1', 'it''s',3 ) AND CO_NO IN(%(a)s,%(b)s)") \
+        == "SELECT * FROM CHOOSE WHERE STU_NO IN (?+) AND CO_NO IN (?+)"
+    # 不同长度的 IN 列表汇总到同一个指纹
+    assert len({fingerprint("SELECT 1 FROM T WHERE ID IN (%s)" % ', '.join(['%s'] * n)) for n in range(1, 20)}) == 1
+    # 子查询不是字面量列表，保持原样
+    assert fingerprint("SELECT * FROM CHOOSE WHERE CO_NO IN (SELECT CO_NO FROM COURSE)") \
+        == "SELECT * FROM CHOOSE WHERE CO_NO IN (SELECT CO_NO FROM COURSE)"
+
+
+def test_record_aggregates_by_fingerprint_and_route():
+    stats = QueryStats(slow_seconds=10, request_warn=1000)
+    stats.begin_request('getRecommedData')
+    stats.record("SELECT * FROM CHOOSE WHERE STU_NO='1'", 0.01, 3)
+    stats.record("SELECT *  FROM CHOOSE\nWHERE STU_NO='2'", 0.02, 4)
+    stats.end_request()
+    stats.record("SELECT * FROM CHOOSE WHERE STU_NO=%s", 0.03, 5)
+
+    result = stats.stats()
+    assert result['queries'] == 3 and result['slow_queries'] == 0
+    [entry] = result['fingerprints']
+    assert entry['fingerprint'] == "SELECT * FROM CHOOSE WHERE STU_NO=?"
+    assert entry['count'] == 3 and entry['rows'] == 12
+    assert entry['routes'] == {'getRecommedData': 2, '-': 1}
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    server = FakeServer(str(tmp_path / 'query.db'))
+    server.execute("CREATE TABLE CHOOSE (STU_NO TEXT, CO_NO TEXT, GRADE REAL, PRIMARY KEY (STU_NO, CO_NO))")
+    monkeypatch.setattr(query, '_pool', ConnectionPool(server, min_size=1, max_size=4, timeout=0.5))
+    return server
+
+
+def _request_query_count(stats):
+    # 与 main.add_query_stats_headers 写入 X-DB-Query-Count 的取值相同
+    return str(stats.current_request()['queries'])
+
+
+def test_request_query_count_counts_statements_of_this_request(server, monkeypatch):
+    stats = QueryStats(slow_seconds=10, request_warn=1000)
+    monkeypatch.setattr(query, 'query_stats', stats)
+
+    stats.begin_request('select_course')
+    query.update("INSERT INTO CHOOSE VALUES (%s, %s, %s)", ('S1', 'C1', 90))
+    with query.transaction():
+        query.update("INSERT INTO CHOOSE VALUES (%s, %s, %s)", ('S1', 'C2', 80))
+        query.query("SELECT COUNT(*) FROM CHOOSE")
+    # 流式查询按一条语句计数
+    assert sum(1 for _ in query.stream("SELECT STU_NO, CO_NO FROM CHOOSE")) == 2
+
+    # 其他线程（没有请求上下文）的查询不计入当前请求
+    worker = threading.Thread(target=query.query, args=("SELECT COUNT(*) FROM CHOOSE",))
+    worker.start()
+    worker.join()
+
+    assert _request_query_count(stats) == '4'
+    request = stats.end_request()
+    assert request['route'] == 'select_course' and request['queries'] == 4
+    assert stats.current_request() is None
+
+    # 下一个请求从 0 开始计数
+    stats.begin_request('index')
+    assert _request_query_count(stats) == '0'
+    query.query("SELECT COUNT(*) FROM CHOOSE")
+    assert _request_query_count(stats) == '1'
+    stats.end_request()
+
+    result = stats.stats()
+    assert result['queries'] == 6
+    count_routes = {entry['fingerprint']: entry['routes'] for entry in result['fingerprints']}
+    assert count_routes["SELECT COUNT(*) FROM CHOOSE"] == {'select_course': 1, '-': 1, 'index': 1}
+
+
+def test_end_request_logs_queries_over_threshold(capsys):
+    stats = QueryStats(slow_seconds=10, request_warn=3)
+    stats.begin_request('few')
+    for _ in range(2):
+        stats.record("SELECT 1", 0.001, 1)
+    stats.end_request()
+    assert capsys.readouterr().out == ''
+
+    stats.begin_request('many')
+    for _ in range(3):
+        stats.record("SELECT 1", 0.001, 1)
+    assert stats.end_request()['queries'] == 3
+    assert '[数据库] many 查询 3 次' in capsys.readouterr().out
@@ -0,0 +1,90 @@
+"""
+SVD 课程/学生推荐（recommedCoursePerson）：截断分解得到的评分和学生相似度与完整 SVD（np.linalg.svd）的参考实现一致
+"""
+import numpy as np
+import pytest
+
+from utils import recommed_module
+from utils.recommed_module import cosSim, ecludSim, energyRank, recommedCoursePerson, svdMethod
+
+# 参考实现与原有的 svdMethod 使用 np.matrix
+pytestmark = pytest.mark.filterwarnings('ignore::PendingDeprecationWarning')
+
+
+def _random_ratings(seed, shape):
+    rng = np.random.default_rng(seed)
+    ratings = rng.integers(1, 6, size=shape) * (rng.random(shape) < 0.5)
+    ratings[0, 0] = 0   # 保证用户0至少有一门未评分的课程
+    return ratings.astype(float)
+
+
+def _reference(dataMat, user, simMeas):
+    """
+    完整 SVD 的参考实现：逐个未评分课程调用 svdMethod，
+    学生特征为 dataMat * V_k * Sigma_k^-1，逐对计算余弦相似度
+    """
+    matrix = np.asmatrix(dataMat)
+    U, Sigma, VT = np.linalg.svd(matrix)
+    unrated = np.nonzero(dataMat[user] == 0)[0]
+    item_scores = {int(item): svdMethod((U, Sigma, VT), matrix, simMeas, user, item) for item in unrated}
+
+    k = energyRank(Sigma)
+    userFeature = matrix * VT[:k].T * np.asmatrix(np.diag(1.0 / Sigma[:k]))
+    user_scores = {idx: cosSim(userFeature[user].T, userFeature[idx].T)
+                   for idx in range(len(dataMat)) if idx != user}
+    return item_scores, user_scores
+
+
+@pytest.mark.parametrize('shape', [(30, 8), (6, 15), (12, 12)])
+@pytest.mark.parametrize('simMeas', [ecludSim, cosSim])
+@pytest.mark.parametrize('seed', range(3))
+def test_matches_full_svd_reference(shape, simMeas, seed):
+    dataMat = _random_ratings(seed, shape)
+    expected_items, expected_users = _reference(dataMat, 0, simMeas)
+
+    recommedCourse, recommedPerson = recommedCoursePerson(dataMat, 0, N=max(shape), simMeas=simMeas)
+
+    assert dict(recommedCourse) == pytest.approx(expected_items, abs=1e-9)
+    assert dict(recommedPerson) == pytest.approx(expected_users, abs=1e-9)
+    scores = [score for _, score in recommedCourse]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_rank_deficient_matrix_matches_reference():
+    # 重复的学生、课程使矩阵秩亏（Gram 矩阵有接近0甚至略小于0的特征值）
+    rng = np.random.default_rng(11)
+    base = rng.integers(1, 6, size=(6, 4)) * (rng.random((6, 4)) < 0.6)
+    dataMat = np.hstack([base, base[:, :2]])
+    dataMat = np.vstack([dataMat, dataMat[:3]]).astype(float)
+    dataMat[0, 0] = 0
+    expected_items, expected_users = _reference(dataMat, 0, ecludSim)
+
+    recommedCourse, recommedPerson = recommedCoursePerson(dataMat, 0, N=10)
+
+    assert dict(recommedCourse) == pytest.approx(expected_items, abs=1e-8)
+    assert dict(recommedPerson) == pytest.approx(expected_users, abs=1e-8)
+
+
+def test_all_zero_matrix_keeps_no_singular_values():
+    dataMat = np.zeros((5, 4))
+    U_k, Sigma_k, V_k = recommed_module.truncatedSvd(dataMat)
+    assert len(Sigma_k) == 0 and U_k.shape == (5, 0) and V_k.shape == (4, 0)
+
+    recommedCourse, recommedPerson = recommedCoursePerson(dataMat, 0, N=4)
+
+    # 没有任何评分：所有课程评分为0，学生特征都是零向量，余弦相似度按0处理
+    assert sorted(recommedCourse) == [(item, 0.0) for item in range(4)]
+    assert all(score == 0.5 for _, score in recommedPerson)
+
+
+def test_features_cached_by_content():
+    dataMat = _random_ratings(7, (10, 6))
+    first = recommed_module.getSvdFeatures(dataMat)
+
+    assert recommed_module.getSvdFeatures(dataMat.copy())[0] is first[0]
+    dataMat[1, 1] = 5.0 - dataMat[1, 1]
+    assert recommed_module.getSvdFeatures(dataMat)[0] is not first[0]
+
+
+def test_fully_rated_user_has_no_recommendation():
+    assert recommedCoursePerson(np.ones((3, 3)), 1) is None
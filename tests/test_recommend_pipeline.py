@@ -0,0 +1,111 @@
+"""
+推荐流水线：重排阶段按快照上的课程容量、上课时间过滤，结果与直接查询数据库的检查一致；阶段开关与统计
+"""
+import pytest
+
+from utils import dynamic_recommend
+from utils import recommend_pipeline
+from utils.data_version import bump_data_version
+
+RERANKERS = ('drop_full_courses', 'drop_time_conflicts')
+
+
+@pytest.fixture
+def pipeline_stages():
+    """测试结束后恢复共享流水线的阶段开关"""
+    disabled = set(recommend_pipeline.course_pipeline.disabled)
+    yield recommend_pipeline.course_pipeline
+    for stage in recommend_pipeline.course_pipeline.stages:
+        recommend_pipeline.set_stage_enabled(stage.name, stage.name not in disabled)
+
+
+def _recommend(stu_no, disabled=()):
+    for name in RERANKERS:
+        recommend_pipeline.set_stage_enabled(name, name not in disabled)
+    ranked, course_table = dynamic_recommend.DynamicCourseRecommender().recommend_courses(stu_no, top_n=100)
+    return [(course_table[course_id][0], score) for course_id, score in ranked]
+
+
+def _full_courses(db):
+    """按数据库检查满员课程（与选课时的容量检查一致）"""
+    return {co_no for co_no, in db.connection.execute(
+        "SELECT e.CO_NO FROM EDUCATION_PLAN e WHERE e.MAX_STUDENTS > 0 "
+        "AND (SELECT COUNT(*) FROM CHOOSE c WHERE c.CO_NO = e.CO_NO) >= e.MAX_STUDENTS"
+    )}
+
+
+def _conflicting_courses(db, stu_no):
+    """按数据库检查与学生已选课程上课时间相同、起止日期重叠的课程"""
+    return {co_no for co_no, in db.connection.execute(
+        "SELECT DISTINCT e.CO_NO FROM EDUCATION_PLAN e "
+        "JOIN EDUCATION_PLAN chosen ON chosen.CLASS_TIME = e.CLASS_TIME "
+        "JOIN CHOOSE c ON c.CO_NO = chosen.CO_NO AND c.STU_NO = ? "
+        "WHERE e.CLASS_TIME NOT IN ('', '未定') "
+        "AND e.START_TIME <= chosen.END_TIME AND chosen.START_TIME <= e.END_TIME",
+        (stu_no,)
+    )}
+
+
+def _plan_schedule(db, stu_no, co_nos):
+    """
+    按推荐结果中的课程安排容量和上课时间：
+    第1门满员，第2门还差1人，第3门与已选课程同一时间且日期重叠，第4门同一时间但日期不重叠
+    """
+    full, almost_full, clash, later = co_nos[:4]
+    chosen = db.connection.execute("SELECT CO_NO FROM CHOOSE WHERE STU_NO = ?", (stu_no,)).fetchone()[0]
+    with db.connection:
+        db.connection.execute(
+            "UPDATE EDUCATION_PLAN SET MAX_STUDENTS = (SELECT COUNT(*) FROM CHOOSE WHERE CO_NO = ?) WHERE CO_NO = ?",
+            (full, full))
+        db.connection.execute(
+            "UPDATE EDUCATION_PLAN SET MAX_STUDENTS = (SELECT COUNT(*) FROM CHOOSE WHERE CO_NO = ?) + 1 "
+            "WHERE CO_NO = ?", (almost_full, almost_full))
+        db.connection.execute(
+            "UPDATE EDUCATION_PLAN SET CLASS_TIME = '周一08:30-10:00', START_TIME = '2026-09-01', "
+            "END_TIME = '2027-01-10' WHERE CO_NO IN (?, ?)", (clash, chosen))
+        db.connection.execute(
+            "UPDATE EDUCATION_PLAN SET CLASS_TIME = '周一08:30-10:00', START_TIME = '2027-03-01', "
+            "END_TIME = '2027-06-30' WHERE CO_NO = ?", (later,))
+    bump_data_version()
+    return full, almost_full, clash, later
+
+
+def test_rerankers_match_database_checks(standin_db, dataset, pipeline_stages):
+    stu_no = dataset.students[5][0]
+    unfiltered = _recommend(stu_no, disabled=RERANKERS)
+    assert len(unfiltered) >= 4
+    full, almost_full, clash, later = _plan_schedule(standin_db, stu_no, [co_no for co_no, _ in unfiltered])
+
+    unfiltered = _recommend(stu_no, disabled=RERANKERS)
+    filtered = _recommend(stu_no)
+
+    dropped = _full_courses(standin_db) | _conflicting_courses(standin_db, stu_no)
+    assert {full, clash} <= dropped and not {almost_full, later} & dropped
+    assert filtered == [item for item in unfiltered if item[0] not in dropped]
+
+
+def test_disabled_stage_is_skipped(standin_db, dataset, pipeline_stages):
+    stu_no = dataset.students[5][0]
+    ranked = _recommend(stu_no, disabled=RERANKERS)
+    full, _, clash, _ = _plan_schedule(standin_db, stu_no, [co_no for co_no, _ in ranked])
+
+    co_nos = [co_no for co_no, _ in _recommend(stu_no, disabled=('drop_full_courses',))]
+    assert full in co_nos and clash not in co_nos
+    co_nos = [co_no for co_no, _ in _recommend(stu_no, disabled=('drop_time_conflicts',))]
+    assert full not in co_nos and clash in co_nos
+
+    assert not recommend_pipeline.set_stage_enabled('no_such_stage', False)
+
+
+def test_stage_stats(standin_db, dataset, pipeline_stages):
+    pipeline_stages.reset_stats()
+    stu_no = dataset.students[5][0]
+    _recommend(stu_no, disabled=('drop_time_conflicts',))
+
+    stats = recommend_pipeline.get_pipeline_stats()
+    assert stats['unrated_electives']['calls'] == 1
+    assert stats['drop_full_courses']['calls'] == 1
+    assert stats['drop_time_conflicts']['calls'] == 0
+    assert not stats['drop_time_conflicts']['enabled']
+    assert stats['drop_full_courses']['avg_out'] <= stats['drop_full_courses']['avg_in']
+    assert sum(values['calls'] for values in stats.values() if values['kind'] == 'scorer') >= 1
@@ -0,0 +1,96 @@
+"""
+推荐结果缓存：按学生失效、落后的模型不缓存、LRU 与过期时间
+"""
+import hashlib
+import time
+
+from utils.data_version import bump_data_version, get_data_version, publish_choose_change
+from utils.result_cache import RecommendResultCache
+
+
+def test_put_and_get():
+    cache = RecommendResultCache(max_entries=4, ttl=60)
+    entry = cache.put('S1', get_data_version(), b'{"data": []}')
+
+    assert cache.get('S1') is entry
+    assert entry.etag == hashlib.md5(b'{"data": []}').hexdigest()
+    assert cache.get('S2') is None
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+
+def test_other_students_changes_keep_entries():
+    cache = RecommendResultCache(max_entries=4, ttl=60)
+    version = get_data_version()
+    cache.put('S1', version, b'1')
+    cache.put('S2', version, b'2')
+
+    publish_choose_change('S9', 'C1')
+
+    assert cache.get('S1') is not None and cache.get('S2') is not None
+
+
+def test_own_change_evicts_until_model_includes_it():
+    cache = RecommendResultCache(max_entries=4, ttl=60)
+    old_version = get_data_version()
+    cache.put('S1', old_version, b'old')
+    cache.put('S2', old_version, b'2')
+
+    change_version = publish_choose_change('S1', 'C1')
+    assert cache.get('S1') is None and cache.get('S2') is not None
+
+    # 后台刷新还没有把这次选课并入模型：用旧模型算出的结果不保存
+    cache.put('S1', old_version, b'stale')
+    assert cache.get('S1') is None
+
+    cache.put('S1', change_version, b'new')
+    assert cache.get('S1').body == b'new'
+
+
+def test_unattributable_change_clears_all():
+    cache = RecommendResultCache(max_entries=4, ttl=60)
+    old_version = get_data_version()
+    cache.put('S1', old_version, b'1')
+
+    new_version = bump_data_version()
+    assert cache.get('S1') is None
+
+    cache.put('S1', old_version, b'stale')
+    assert cache.get('S1') is None
+    cache.put('S1', new_version, b'fresh')
+    assert cache.get('S1').body == b'fresh'
+
+
+def test_lru_eviction():
+    cache = RecommendResultCache(max_entries=2, ttl=60)
+    version = get_data_version()
+    cache.put('S1', version, b'1')
+    cache.put('S2', version, b'2')
+    cache.get('S1')
+    cache.put('S3', version, b'3')
+
+    assert cache.get('S2') is None
+    assert cache.get('S1') is not None and cache.get('S3') is not None
+    assert cache.stats()['entries'] == 2
+
+
+def test_entries_expire_after_ttl():
+    cache = RecommendResultCache(max_entries=2, ttl=0.05)
+    cache.put('S1', get_data_version(), b'1')
+    time.sleep(0.1)
+
+    assert cache.get('S1') is None
+
+
+def test_evict_and_clear():
+    cache = RecommendResultCache(max_entries=4, ttl=60)
+    version = get_data_version()
+    cache.put('S1', version, b'1')
+    cache.put('S2', version, b'2')
+
+    cache.evict('S1')
+    assert cache.get('S1') is None and cache.get('S2') is not None
+    cache.clear()
+    assert cache.get('S2') is None
+    # 清空之后仍然可以继续缓存当前模型的结果
+    cache.put('S2', version, b'2')
+    assert cache.get('S2') is not None
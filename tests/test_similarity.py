@@ -0,0 +1,56 @@
+"""
+向量化皮尔逊相似度（_pearson_correlation_row）与逐对计算（_pearson_correlation）的一致性
+"""
+import numpy as np
+import pytest
+
+from utils.dynamic_recommend import DynamicCourseRecommender
+
+# 评分取值：0 表示未选，包含负分和重复分数（方差为0的情况）
+SCORE_VALUES = [0, 0, 0, -0.8, 1.5, 2.0, 2.5, 3.0, 3.0, 4.2, 5.0]
+
+
+@pytest.fixture
+def recommender():
+    return DynamicCourseRecommender()
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_row_matches_pairwise(recommender, seed):
+    rng = np.random.default_rng(seed)
+    num_students, num_courses = rng.integers(2, 40), rng.integers(1, 30)
+    matrix = rng.choice(SCORE_VALUES, size=(num_students, num_courses))
+
+    for student_id in range(num_students):
+        row = recommender._pearson_correlation_row(student_id, matrix)
+        expected = [recommender._pearson_correlation(matrix[student_id], matrix[other])
+                    for other in range(num_students)]
+        np.testing.assert_allclose(row, expected, rtol=0, atol=1e-12)
+
+
+def test_co_rated_and_zero_variance_rules(recommender):
+    matrix = np.array([
+        [4.0, 3.0, 5.0, 0.0],
+        [2.0, 0.0, 0.0, 0.0],   # 与学生0只有1门共同课程 -> 0.1
+        [0.0, 0.0, 0.0, 5.0],   # 没有共同课程 -> 0
+        [3.0, 3.0, 3.0, 0.0],   # 共同课程评分方差为0 -> 0
+        [1.0, 2.0, 0.0, 4.0],   # 2门共同课程，正常计算
+    ])
+    row = recommender._pearson_correlation_row(0, matrix)
+
+    assert row[1] == 0.1
+    assert row[2] == 0.0
+    assert row[3] == 0.0
+    assert row[4] == pytest.approx(recommender._pearson_correlation(matrix[0], matrix[4]))
+    assert row[4] == pytest.approx(-1.0)
+
+
+def test_candidate_ids_match_full_row(recommender):
+    rng = np.random.default_rng(3)
+    matrix = rng.choice(SCORE_VALUES, size=(50, 20))
+    candidate_ids = np.array([1, 7, 8, 20, 49])
+
+    full_row = recommender._pearson_correlation_row(5, matrix)
+    partial = recommender._pearson_correlation_row(5, matrix, candidate_ids)
+
+    np.testing.assert_allclose(partial, full_row[candidate_ids], rtol=0, atol=1e-12)
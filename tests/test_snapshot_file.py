@@ -0,0 +1,171 @@
+"""
+多个工作进程通过快照文件共享推荐模型：选课变化不在请求路径上写回文件，也不会引起其他进程从数据库重建
+
+测试中轮流把每个“工作进程”的状态（进程内快照、数据版本和事件日志）安装到模块上，模拟多个进程。
+"""
+import time
+from collections import deque
+
+import numpy as np
+import pytest
+
+from utils import data_version
+from utils import dynamic_recommend
+from utils import model_refresher
+from utils import snapshot_store
+from utils.dynamic_recommend import DynamicCourseRecommender
+
+_PROCESS_STATE = (
+    (data_version, '_data_version'), (data_version, '_data_changed_at'), (data_version, '_change_events'),
+    (dynamic_recommend, '_model_snapshot'),
+)
+
+
+def _dense(matrix):
+    return matrix if isinstance(matrix, np.ndarray) else matrix.to_dense()
+
+
+class _Worker:
+    """一个模拟的工作进程"""
+
+    active = None
+
+    def __init__(self, name):
+        self.name = name
+        self.state = {
+            '_data_version': 0, '_data_changed_at': 0.0,
+            '_change_events': deque(maxlen=data_version.MAX_CHANGE_EVENTS), '_model_snapshot': None,
+        }
+
+    def activate(self):
+        if _Worker.active is self:
+            return self
+        if _Worker.active is not None:
+            _Worker.active.state = {name: getattr(module, name) for module, name in _PROCESS_STATE}
+        for module, name in _PROCESS_STATE:
+            setattr(module, name, self.state[name])
+        _Worker.active = self
+        return self
+
+    def snapshot(self):
+        """处理一个推荐请求，返回请求使用的快照"""
+        self.activate()
+        return DynamicCourseRecommender()._get_model_snapshot()
+
+
+@pytest.fixture
+def workers(standin_db, snapshot_file, monkeypatch):
+    for module, name in _PROCESS_STATE:
+        monkeypatch.setattr(module, name, getattr(module, name))
+    monkeypatch.setattr(_Worker, 'active', None)
+    loads = []
+    load_data = DynamicCourseRecommender._load_student_course_data
+
+    def counted_load(self):
+        loads.append(_Worker.active.name)
+        return load_data(self)
+    monkeypatch.setattr(DynamicCourseRecommender, '_load_student_course_data', counted_load)
+    return _Worker('A'), _Worker('B'), loads, lambda: _dense(load_data(DynamicCourseRecommender())[2])
+
+
+def _select(db, worker, stu_no, co_no, grade):
+    """工作进程处理一次选课（写数据库，并通知本进程的数据版本）"""
+    worker.activate()
+    with db.connection:
+        db.connection.execute("INSERT OR REPLACE INTO CHOOSE VALUES (?, ?, ?, NULL)", (stu_no, co_no, grade))
+    data_version.publish_choose_change(stu_no, co_no, grade)
+
+
+def test_database_load_is_shared_through_file(workers, snapshot_file):
+    worker_a, worker_b, loads, _ = workers
+
+    snapshot_a = worker_a.snapshot()
+    snapshot_b = worker_b.snapshot()
+
+    assert snapshot_a.source == 'database' and snapshot_a.file_generation == 1
+    assert snapshot_b.source == 'file' and snapshot_b.file_generation == 1
+    assert loads == ['A']
+    np.testing.assert_array_equal(_dense(snapshot_b.score_matrix), _dense(snapshot_a.score_matrix))
+
+
+def test_request_path_keeps_changes_in_memory(workers, standin_db, dataset, snapshot_file):
+    worker_a, worker_b, loads, truth = workers
+    worker_a.snapshot()
+    worker_b.snapshot()
+
+    _select(standin_db, worker_a, dataset.students[0][0], dataset.courses[0][0], 95)
+    snapshot_a = worker_a.snapshot()
+    snapshot_b = worker_b.snapshot()
+
+    assert snapshot_a.source == 'incremental' and snapshot_a.unsaved_changes
+    assert snapshot_store.snapshot_generation(snapshot_file) == 1
+    assert snapshot_b.file_generation == 1
+    np.testing.assert_array_equal(_dense(snapshot_a.score_matrix), truth())
+    assert loads == ['A']
+
+
+def test_write_back_is_mapped_by_other_workers(workers, standin_db, dataset, snapshot_file):
+    worker_a, worker_b, loads, truth = workers
+    worker_a.snapshot()
+    worker_b.snapshot()
+    _select(standin_db, worker_a, dataset.students[0][0], dataset.courses[0][0], 95)
+    worker_a.snapshot()
+
+    assert DynamicCourseRecommender()._write_back_snapshot_file()
+    snapshot_a = worker_a.snapshot()
+    snapshot_b = worker_b.snapshot()
+
+    assert not snapshot_a.unsaved_changes and snapshot_a.file_generation == 2
+    assert snapshot_b.source == 'file' and snapshot_b.file_generation == 2
+    np.testing.assert_array_equal(_dense(snapshot_b.score_matrix), truth())
+    assert loads == ['A']
+
+
+def test_conflicting_write_back_does_not_reload(workers, standin_db, dataset, snapshot_file):
+    worker_a, worker_b, loads, truth = workers
+    worker_a.snapshot()
+    worker_b.snapshot()
+    stu_no = dataset.students[0][0]
+    _select(standin_db, worker_b, stu_no, dataset.courses[0][0], 65)
+    worker_b.snapshot()
+    _select(standin_db, worker_a, stu_no, dataset.courses[1][0], 95)
+    worker_a.snapshot()
+    assert DynamicCourseRecommender()._write_back_snapshot_file()
+
+    # B 还有没写回的变化：A 写入的文件不包含这些变化，B 继续使用自己的快照
+    snapshot_b = worker_b.snapshot()
+    assert snapshot_b.source == 'incremental' and snapshot_b.checked_generation == 2
+    assert not DynamicCourseRecommender()._write_back_snapshot_file()
+    assert snapshot_b.unsaved_changes and snapshot_store.snapshot_generation(snapshot_file) == 2
+    student_id = snapshot_b.stu_no_to_id[stu_no]
+    assert _dense(snapshot_b.score_matrix)[student_id, 0] == truth()[student_id, 0]
+    assert worker_b.snapshot() is snapshot_b
+    assert loads == ['A']
+
+    # 快照过期后 B 从数据库完整重建，写入的新文件包含两个进程的变化，A 随即映射
+    snapshot_b.built_at -= dynamic_recommend.SNAPSHOT_MAX_AGE + 1
+    snapshot_b = worker_b.snapshot()
+    assert snapshot_b.source == 'database' and snapshot_b.file_generation == 3
+    snapshot_a = worker_a.snapshot()
+    assert snapshot_a.source == 'file' and snapshot_a.file_generation == 3
+    np.testing.assert_array_equal(_dense(snapshot_a.score_matrix), truth())
+    assert loads == ['A', 'B']
+
+
+def test_refresher_throttles_write_back(workers, standin_db, dataset, snapshot_file, monkeypatch):
+    worker_a, _, _, _ = workers
+    worker_a.snapshot()
+    refresher = model_refresher.ModelRefresher(write_interval=60)
+    assert not refresher.write_back_due()
+
+    _select(standin_db, worker_a, dataset.students[0][0], dataset.courses[0][0], 95)
+    worker_a.snapshot()
+    assert refresher.write_back_due() and refresher.write_back()
+    assert refresher.write_backs == 1 and snapshot_store.snapshot_generation(snapshot_file) == 2
+
+    _select(standin_db, worker_a, dataset.students[0][0], dataset.courses[1][0], 95)
+    worker_a.snapshot()
+    assert not refresher.write_back_due()
+    refresher.last_write_back_at = time.time() - 61
+    assert refresher.write_back_due() and refresher.write_back()
+    assert snapshot_store.snapshot_generation(snapshot_file) == 3
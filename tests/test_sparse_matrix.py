@@ -0,0 +1,104 @@
+"""
+稀疏评分矩阵（CSRScoreMatrix）与稠密矩阵的一致性：矩阵读取、相似度、评分预测和完整的推荐结果
+"""
+import numpy as np
+import pytest
+
+from utils import dynamic_recommend
+from utils.data_version import bump_data_version
+from utils.dynamic_recommend import DynamicCourseRecommender
+from utils.sparse_matrix import CSRScoreMatrix
+
+SCORE_VALUES = [0, 0, 0, 0, -0.8, 1.5, 2.2, 3.4, 5.0]
+
+
+def _random_pair(seed):
+    rng = np.random.default_rng(seed)
+    dense = rng.choice(SCORE_VALUES, size=(rng.integers(1, 30), rng.integers(1, 20)))
+    rows, cols = np.nonzero(dense)
+    return dense, CSRScoreMatrix.from_coo(rows, cols, dense[rows, cols], dense.shape)
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_matrix_access_matches_dense(seed):
+    dense, sparse = _random_pair(seed)
+
+    np.testing.assert_array_equal(sparse.to_dense(), dense)
+    np.testing.assert_array_equal(sparse.positive_count(0), np.sum(dense > 0, axis=0))
+    np.testing.assert_array_equal(sparse.positive_count(1), np.sum(dense > 0, axis=1))
+    for row_id in range(dense.shape[0]):
+        np.testing.assert_array_equal(sparse.row(row_id), dense[row_id])
+    for col_id in range(dense.shape[1]):
+        np.testing.assert_array_equal(sparse.column(col_id), dense[:, col_id])
+    np.testing.assert_array_equal(sparse.row_block(0, dense.shape[0]), dense)
+
+
+def test_from_coo_keeps_last_duplicate_and_drops_zeros():
+    sparse = CSRScoreMatrix.from_coo([0, 1, 0, 1], [1, 0, 1, 2], [2.0, 3.0, 4.0, 0.0], (2, 3))
+
+    np.testing.assert_array_equal(sparse.to_dense(), [[0.0, 4.0, 0.0], [3.0, 0.0, 0.0]])
+    assert sparse.nnz == 2
+
+
+def test_with_cells_returns_new_matrix():
+    dense, sparse = _random_pair(42)
+    cells = [(0, 0, 2.0), (dense.shape[0] - 1, dense.shape[1] - 1, 0.0), (0, 0, 3.0)]
+
+    updated = sparse.with_cells(cells)
+
+    expected = dense.copy()
+    for row_id, col_id, score in cells:
+        expected[row_id, col_id] = score
+    np.testing.assert_array_equal(updated.to_dense(), expected)
+    np.testing.assert_array_equal(sparse.to_dense(), dense)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_similarity_and_prediction_match_dense(seed):
+    dense, sparse = _random_pair(seed)
+    recommender = DynamicCourseRecommender()
+    course_ids = list(range(dense.shape[1]))
+
+    for student_id in range(dense.shape[0]):
+        dense_row = recommender._pearson_correlation_row(student_id, dense)
+        sparse_row = recommender._pearson_correlation_row(student_id, sparse)
+        np.testing.assert_allclose(sparse_row, dense_row, rtol=0, atol=1e-12)
+
+        dense_scores = recommender._predict_course_scores(student_id, dense, course_ids, dense_row)
+        sparse_scores = recommender._predict_course_scores(student_id, sparse, course_ids, dense_row)
+        assert [course_id for course_id, _ in sparse_scores] == [course_id for course_id, _ in dense_scores]
+        np.testing.assert_allclose([score for _, score in sparse_scores],
+                                   [score for _, score in dense_scores], rtol=0, atol=1e-12)
+
+
+def _assert_same_ranking(actual, expected):
+    """两个 (ID, 分数) 排名的分数一致；ID 只允许在分数相同（并列）的位置不同"""
+    assert len(actual) == len(expected)
+    np.testing.assert_allclose([float(score) for _, score in actual],
+                               [float(score) for _, score in expected], rtol=0, atol=1e-9)
+    actual_scores = {int(key): float(score) for key, score in actual}
+    expected_scores = {int(key): float(score) for key, score in expected}
+    for key in actual_scores.keys() & expected_scores.keys():
+        assert actual_scores[key] == pytest.approx(expected_scores[key], abs=1e-9)
+    last_score = float(expected[-1][1]) if expected else None
+    for key in actual_scores.keys() ^ expected_scores.keys():
+        assert actual_scores.get(key, expected_scores.get(key)) == pytest.approx(last_score, abs=1e-9)
+
+
+def test_recommendations_match_dense(standin_db, dataset, monkeypatch):
+    stu_nos = [student[0] for student in dataset.students[:15]]
+
+    def recommend_all(sparse):
+        monkeypatch.setattr(dynamic_recommend, 'SPARSE_SCORE_MATRIX', sparse)
+        dynamic_recommend._model_snapshot = None
+        bump_data_version()
+        recommender = DynamicCourseRecommender()
+        return [recommender.get_recommendations(stu_no)[:2] for stu_no in stu_nos]
+
+    dense_results = recommend_all(False)
+    sparse_results = recommend_all(True)
+
+    assert isinstance(dynamic_recommend._model_snapshot.score_matrix, CSRScoreMatrix)
+    for (sparse_courses, sparse_students), (dense_courses, dense_students) in zip(sparse_results, dense_results):
+        _assert_same_ranking(sparse_courses, dense_courses)
+        _assert_same_ranking(sparse_students, dense_students)
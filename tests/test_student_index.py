@@ -0,0 +1,115 @@
+"""
+相似学生 LSH 索引（StudentLSHIndex）以及推荐器 'lsh' 查找方式与精确查找（'exact'）的对比
+"""
+import numpy as np
+import pytest
+
+from utils import dynamic_recommend
+from utils.data_version import bump_data_version
+from utils.dynamic_recommend import DynamicCourseRecommender
+from utils.sparse_matrix import CSRScoreMatrix
+from utils.student_index import StudentLSHIndex
+
+
+def _random_matrix(seed, num_students=200, num_courses=25):
+    rng = np.random.default_rng(seed)
+    scores = rng.integers(1, 6, size=(num_students, num_courses)).astype(float)
+    return scores * (rng.random((num_students, num_courses)) < 0.3)
+
+
+def test_query_returns_sorted_unique_candidates_without_target():
+    matrix = _random_matrix(0)
+    index = StudentLSHIndex(matrix)
+
+    for student_id in range(0, len(matrix), 13):
+        candidates = index.query(matrix, student_id)
+        assert student_id not in candidates
+        np.testing.assert_array_equal(candidates, np.unique(candidates))
+
+
+def test_identical_students_are_always_candidates():
+    matrix = _random_matrix(1)
+    matrix[50] = matrix[10]
+    matrix[51] = matrix[10] + 1.0 * (matrix[10] > 0)   # 评分整体平移，中心化后与学生10相同
+    index = StudentLSHIndex(matrix)
+
+    candidates = index.query(matrix, 10)
+
+    assert 50 in candidates and 51 in candidates
+
+
+def test_extra_candidates_are_always_returned():
+    matrix = _random_matrix(2)
+    index = StudentLSHIndex(matrix).with_extra_candidates([3, 150])
+
+    for student_id in (0, 77, 199):
+        candidates = index.query(matrix, student_id)
+        assert 3 in candidates and 150 in candidates
+
+
+def test_single_bit_with_probe_covers_all_students():
+    matrix = _random_matrix(3)
+    index = StudentLSHIndex(matrix, num_tables=1, num_bits=1, probes=1)
+
+    np.testing.assert_array_equal(index.query(matrix, 5), np.delete(np.arange(len(matrix)), 5))
+
+
+@pytest.mark.parametrize('sparse', [False, True])
+def test_candidate_similarities_match_exact_row(sparse):
+    matrix = _random_matrix(4)
+    if sparse:
+        rows, cols = np.nonzero(matrix)
+        matrix = CSRScoreMatrix.from_coo(rows, cols, matrix[rows, cols], matrix.shape)
+    recommender = DynamicCourseRecommender()
+    index = StudentLSHIndex(matrix)
+
+    for student_id in range(0, 200, 17):
+        candidates = index.query(matrix, student_id)
+        exact_row = recommender._pearson_correlation_row(student_id, matrix)
+        np.testing.assert_allclose(recommender._pearson_correlation_row(student_id, matrix, candidates),
+                                   exact_row[candidates], rtol=0, atol=1e-12)
+
+
+@pytest.fixture
+def lsh_search(monkeypatch):
+    monkeypatch.setattr(dynamic_recommend, 'SIMILAR_STUDENT_SEARCH', 'lsh')
+
+
+def test_lsh_neighbour_row_is_exact_on_candidates(standin_db, lsh_search):
+    recommender = DynamicCourseRecommender()
+    snapshot = recommender._get_model_snapshot()
+
+    for student_id in range(0, snapshot.score_matrix.shape[0], 11):
+        row = recommender._get_neighbor_similarity_row(snapshot, student_id)
+        candidates = recommender._get_student_index(snapshot).query(snapshot.score_matrix, student_id)
+        exact_row = recommender._pearson_correlation_row(student_id, snapshot.score_matrix)
+
+        np.testing.assert_allclose(row[candidates], exact_row[candidates], rtol=0, atol=1e-12)
+        assert not np.any(np.delete(row, candidates))
+
+    # 'lsh' 模式只在候选上计算，不计算、不缓存整行相似度
+    assert len(snapshot.student_similarity_row_cache) == 0
+
+
+def test_lsh_covering_all_students_matches_exact(standin_db, dataset, monkeypatch):
+    stu_nos = [student[0] for student in dataset.students[:10]]
+
+    def recommend_all(search):
+        monkeypatch.setattr(dynamic_recommend, 'SIMILAR_STUDENT_SEARCH', search)
+        dynamic_recommend._model_snapshot = None
+        bump_data_version()
+        recommender = DynamicCourseRecommender()
+        return [recommender.get_recommendations(stu_no)[:2] for stu_no in stu_nos]
+
+    exact = recommend_all('exact')
+    # 每张表只有1位签名并探测相邻桶时，候选就是所有学生，结果应与精确查找一致
+    monkeypatch.setattr(dynamic_recommend, 'LSH_TABLES', 1)
+    monkeypatch.setattr(dynamic_recommend, 'LSH_BITS', 1)
+    monkeypatch.setattr(dynamic_recommend, 'LSH_PROBES', 1)
+    approximate = recommend_all('lsh')
+
+    for (lsh_courses, lsh_students), (exact_courses, exact_students) in zip(approximate, exact):
+        assert [course_id for course_id, _ in lsh_courses] == [course_id for course_id, _ in exact_courses]
+        np.testing.assert_allclose([score for _, score in lsh_courses],
+                                   [score for _, score in exact_courses], rtol=0, atol=1e-12)
+        assert [student_id for student_id, _ in lsh_students] == [student_id for student_id, _ in exact_students]
@@ -0,0 +1,160 @@
+"""
+查询层的工作单元（query.transaction）：共用连接、统一提交或回滚、提交后回调、事务中的流式查询
+"""
+import pytest
+
+from fake_mysql import FakeServer
+from utils import query
+from utils.db_pool import ConnectionPool
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    server = FakeServer(str(tmp_path / 'query.db'))
+    server.execute("CREATE TABLE CHOOSE (STU_NO TEXT, CO_NO TEXT, GRADE REAL, PRIMARY KEY (STU_NO, CO_NO))")
+    monkeypatch.setattr(query, '_pool', ConnectionPool(server, min_size=1, max_size=4, timeout=0.5))
+    return server
+
+
+def _committed_rows(server):
+    return server.execute("SELECT STU_NO, CO_NO FROM CHOOSE ORDER BY STU_NO, CO_NO")
+
+
+def test_statements_outside_transaction_commit_individually(server):
+    query.update("INSERT INTO CHOOSE VALUES (%s, %s, %s)", ('S1', 'C1', 90))
+    query.insert("INSERT INTO CHOOSE VALUES (%s, %s, %s)", ('S1', 'C2', None))
+
+    assert _committed_rows(server) == [('S1', 'C1'), ('S1', 'C2')]
+    assert query.query("SELECT COUNT(*) FROM CHOOSE") == ((2,),)
+    # 每条语句自己提交，借用的连接归还时不需要回滚
+    assert server.connections[0].rollbacks == 0
+
+
+def test_transaction_commits_once_on_one_connection(server):
+    with query.transaction():
+        query.update("INSERT INTO CHOOSE VALUES (%s, %s, %s)", ('S1', 'C1', 90))
+        query.update("INSERT INTO CHOOSE VALUES (%s, %s, %s)", ('S1', 'C2', 80))
+        # 事务中的读取能看到尚未提交的修改，其他连接看不到
+        assert query.query("SELECT COUNT(*) FROM CHOOSE") == ((2,),)
+        assert _committed_rows(server) == []
+
+    assert _committed_rows(server) == [('S1', 'C1'), ('S1', 'C2')]
+    assert len(server.connections) == 1 and server.connections[0].commits == 1
+
+
+def test_transaction_rolls_back_on_error(server):
+    with pytest.raises(RuntimeError):
+        with query.transaction():
+            query.update("INSERT INTO CHOOSE VALUES (%s, %s, %s)", ('S1', 'C1', 90))
+            raise RuntimeError('业务检查失败')
+
+    assert _committed_rows(server) == []
+
+
+def test_failed_read_inside_transaction_raises_and_rolls_back(server):
+    # 事务外查询出错时返回空结果（原有行为）
+    assert query.query("SELECT * FROM MISSING_TABLE") == []
+
+    with pytest.raises(Exception):
+        with query.transaction():
+            query.update("INSERT INTO CHOOSE VALUES (%s, %s, %s)", ('S1', 'C1', 90))
+            query.query("SELECT * FROM MISSING_TABLE")
+            query.update("INSERT INTO CHOOSE VALUES (%s, %s, %s)", ('S1', 'C2', 80))
+
+    assert _committed_rows(server) == []
+
+
+def test_nested_transaction_joins_outer(server):
+    with pytest.raises(RuntimeError):
+        with query.transaction() as outer:
+            with query.transaction() as inner:
+                assert inner is outer
+                query.update("INSERT INTO CHOOSE VALUES (%s, %s, %s)", ('S1', 'C1', 90))
+            raise RuntimeError
+
+    assert _committed_rows(server) == []
+
+
+def test_transactional_decorator(server):
+    @query.transactional
+    def enroll(stu_no, co_nos):
+        for co_no in co_nos:
+            query.update("INSERT INTO CHOOSE VALUES (%s, %s, %s)", (stu_no, co_no, None))
+
+    enroll('S1', ['C1', 'C2'])
+    with pytest.raises(Exception):
+        enroll('S2', ['C1', 'C1'])   # 主键冲突，第一条也要回滚
+
+    assert _committed_rows(server) == [('S1', 'C1'), ('S1', 'C2')]
+
+
+def test_on_commit_callbacks_run_only_after_commit(server):
+    calls = []
+
+    with query.transaction():
+        query.on_commit(calls.append, 'committed')
+        assert calls == []
+    with pytest.raises(RuntimeError):
+        with query.transaction():
+            query.on_commit(calls.append, 'rolled back')
+            raise RuntimeError
+    query.on_commit(calls.append, 'no transaction')
+
+    assert calls == ['committed', 'no transaction']
+
+
+def test_stream_inside_transaction_uses_its_connection(server):
+    with query.transaction():
+        for index in range(7):
+            query.update("INSERT INTO CHOOSE VALUES (%s, %s, %s)", ('S1', f'C{index}', index))
+        rows = list(query.stream("SELECT CO_NO FROM CHOOSE ORDER BY CO_NO", batch_size=3))
+        batches = list(query.stream("SELECT CO_NO FROM CHOOSE ORDER BY CO_NO", batch_size=3, batches=True))
+
+        assert [co_no for co_no, in rows] == [f'C{index}' for index in range(7)]
+        assert [len(batch) for batch in batches] == [3, 3, 1]
+        assert query.get_pool_stats()['in_use'] == 1
+
+    assert len(server.connections) == 1
+
+
+def test_statements_rejected_while_streaming_in_transaction(server):
+    server.execute("INSERT INTO CHOOSE VALUES ('S1', 'C1', 1), ('S1', 'C2', 2)")
+
+    with query.transaction():
+        rows = query.stream("SELECT CO_NO FROM CHOOSE", batch_size=1)
+        next(rows)
+        with pytest.raises(RuntimeError):
+            query.query("SELECT COUNT(*) FROM CHOOSE")
+        rows.close()
+        assert query.query("SELECT COUNT(*) FROM CHOOSE") == ((2,),)
+
+
+def test_bulk_writes_and_nested_transactions_rejected_while_streaming(server):
+    server.execute("INSERT INTO CHOOSE VALUES ('S1', 'C1', 1), ('S1', 'C2', 2)")
+    insert_sql = "INSERT INTO CHOOSE VALUES (%s, %s, %s)"
+
+    with query.transaction():
+        rows = query.stream("SELECT CO_NO FROM CHOOSE", batch_size=1)
+        next(rows)
+        with pytest.raises(RuntimeError):
+            query.bulk_insert(insert_sql, [('S2', 'C1', 1)])
+        with pytest.raises(RuntimeError):
+            query.bulk_update("DELETE FROM CHOOSE WHERE STU_NO = %s", [('S1',)])
+        with pytest.raises(RuntimeError):
+            with query.transaction():
+                pass
+        rows.close()
+        assert query.bulk_insert(insert_sql, [('S2', 'C1', 1)]) == 1
+
+    assert len(_committed_rows(server)) == 3
+
+
+def test_bulk_insert_is_all_or_nothing(server):
+    rows = [('S1', f'C{index}', index) for index in range(10)]
+
+    assert query.bulk_insert("INSERT INTO CHOOSE VALUES (%s, %s, %s)", rows, chunk_size=3) == 10
+    with pytest.raises(Exception):
+        query.bulk_insert("INSERT INTO CHOOSE VALUES (%s, %s, %s)",
+                          [('S2', 'C0', 1), ('S2', 'C1', 1), ('S1', 'C0', 1)], chunk_size=2)
+
+    assert len(_committed_rows(server)) == 10
@@ -0,0 +1,299 @@
+"""
+矩阵分解推荐模型（交替最小二乘 ALS）
+离线将学生-课程评分矩阵分解为学生因子矩阵 U 和课程因子矩阵 V（评分 ≈ U·Vᵀ），保存到磁盘；
+在线推荐时学生对候选课程的预测评分就是该学生的因子向量与课程因子矩阵的一次点积。
+
+训练数据是 DynamicCourseRecommender._calculate_score 生成的评分（选课本身 + 成绩 + 评价），
+只拟合已选课的单元格，使用按评分个数加权的正则化（ALS-WR）。
+每一轮先固定 V 求解所有学生的 U，再固定 U 求解所有课程的 V，每一步都是批量的小型线性方程组。
+重新训练时默认从上一次保存的因子热启动，只需少量迭代即可收敛。
+
+用法:
+    python -m utils.als_recommend                    # 训练（有旧模型时热启动）并保存
+    python -m utils.als_recommend --factors 32 --iterations 15 --cold
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+from utils.sparse_matrix import CSRScoreMatrix
+
+# 模型文件默认保存位置（项目根目录下的 model 目录）
+DEFAULT_MODEL_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'model', 'als_factors.npz'
+)
+
+# 默认超参数
+DEFAULT_FACTORS = 20
+DEFAULT_ITERATIONS = 10
+DEFAULT_REGULARIZATION = 0.1
+# 热启动时默认的迭代次数
+DEFAULT_WARM_ITERATIONS = 3
+
+# 训练时每次处理的学生数（控制临时稠密子矩阵的内存）
+ROW_CHUNK_SIZE = 1024
+
+
+class ALSFactorModel:
+    """
+    ALS 矩阵分解模型
+
+    属性:
+        stu_nos: numpy.ndarray, 每行学生因子对应的学生编号
+        course_nos: numpy.ndarray, 每行课程因子对应的课程编号
+        student_factors: numpy.ndarray, shape=(学生数, 因子数)
+        course_factors: numpy.ndarray, shape=(课程数, 因子数)
+        trained_at: float, 训练完成时间戳
+    """
+
+    def __init__(self, stu_nos, course_nos, student_factors, course_factors, trained_at=None):
+        self.stu_nos = np.asarray(stu_nos, dtype=str)
+        self.course_nos = np.asarray(course_nos, dtype=str)
+        self.student_factors = student_factors
+        self.course_factors = course_factors
+        self.trained_at = trained_at if trained_at is not None else time.time()
+
+    def save(self, path=DEFAULT_MODEL_PATH):
+        """
+        保存模型到 .npz 文件
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        np.savez(
+            path,
+            stu_nos=self.stu_nos,
+            course_nos=self.course_nos,
+            student_factors=self.student_factors,
+            course_factors=self.course_factors,
+            trained_at=np.array(self.trained_at)
+        )
+
+    @classmethod
+    def load(cls, path=DEFAULT_MODEL_PATH):
+        """
+        从 .npz 文件加载模型
+
+        返回:
+            ALSFactorModel or None: 模型文件不存在时返回None
+        """
+        if not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                data['stu_nos'], data['course_nos'],
+                data['student_factors'], data['course_factors'], float(data['trained_at'])
+            )
+
+    def align(self, id_to_stu_no, id_to_course_no):
+        """
+        将因子矩阵对齐到当前评分矩阵的学生ID和课程ID
+
+        模型按学生编号、课程编号保存；训练之后新增的学生、课程没有因子（对应行为0）。
+
+        参数:
+            id_to_stu_no: StudentTable, 学生信息表
+            id_to_course_no: CourseTable, 课程信息表
+
+        返回:
+            tuple: (student_factors, known_students, course_factors, known_courses)
+                - known_students / known_courses: 布尔数组，对应ID在模型中是否有因子
+        """
+        student_factors, known_students = _align_rows(self.stu_nos, self.student_factors, id_to_stu_no)
+        course_factors, known_courses = _align_rows(self.course_nos, self.course_factors, id_to_course_no)
+        return student_factors, known_students, course_factors, known_courses
+
+
+def _align_rows(keys, factors, table):
+    """
+    按编号把因子矩阵的行重排到当前矩阵ID的顺序（用信息表的批量查找，与 item_recommend 的对齐方式一致）
+
+    参数:
+        keys: 模型中每行因子对应的编号
+        factors: numpy.ndarray, 因子矩阵
+        table: StudentTable 或 CourseTable, 当前的信息表
+
+    返回:
+        tuple: (对齐后的因子矩阵, 是否有因子的布尔数组)
+    """
+    row_to_id = table.lookup(keys)
+    found = row_to_id >= 0
+    aligned = np.zeros((len(table), factors.shape[1]))
+    known = np.zeros(len(table), dtype=bool)
+    aligned[row_to_id[found]] = factors[found]
+    known[row_to_id[found]] = True
+    return aligned, known
+
+
+def _row_blocks(score_matrix):
+    """
+    按 ROW_CHUNK_SIZE 分块遍历评分矩阵
+
+    生成:
+        tuple: (起始行, 结束行, 评分子矩阵, 选课掩码)，只有正评分视为已选课
+    """
+    num_students = score_matrix.shape[0]
+    for start in range(0, num_students, ROW_CHUNK_SIZE):
+        end = min(start + ROW_CHUNK_SIZE, num_students)
+        if isinstance(score_matrix, CSRScoreMatrix):
+            block = score_matrix.row_block(start, end)
+        else:
+            block = np.asarray(score_matrix[start:end], dtype=float)
+        mask = (block > 0).astype(float)
+        yield start, end, block * mask, mask
+
+
+def _outer_products(factors):
+    """每行因子向量的外积，展平为 shape=(行数, 因子数²)，用于把批量 Gram 矩阵写成一次矩阵乘法"""
+    num_factors = factors.shape[1]
+    return (factors[:, :, np.newaxis] * factors[:, np.newaxis, :]).reshape(len(factors), num_factors * num_factors)
+
+
+def _solve(gram, rhs, counts, regularization):
+    """
+    批量求解 (Gram + λ·n·I) x = rhs
+
+    参数:
+        gram: numpy.ndarray, shape=(批量, 因子数, 因子数)
+        rhs: numpy.ndarray, shape=(批量, 因子数)
+        counts: numpy.ndarray, 每个方程组对应的评分个数 n（ALS-WR 正则化）
+        regularization: float, 正则化系数 λ
+    """
+    num_factors = rhs.shape[1]
+    gram = gram + (regularization * np.maximum(counts, 1))[:, np.newaxis, np.newaxis] * np.eye(num_factors)
+    return np.linalg.solve(gram, rhs[:, :, np.newaxis])[:, :, 0]
+
+
+def _update_student_factors(score_matrix, course_factors, regularization):
+    """
+    固定课程因子，求解所有学生因子：对每个学生 (Vᵢᵀ Vᵢ + λ·nᵤ·I) u = Vᵢᵀ rᵤ，Vᵢ 为其选过的课程
+    """
+    num_factors = course_factors.shape[1]
+    course_outer = _outer_products(course_factors)
+    student_factors = np.zeros((score_matrix.shape[0], num_factors))
+    for start, end, ratings, mask in _row_blocks(score_matrix):
+        gram = (mask @ course_outer).reshape(end - start, num_factors, num_factors)
+        student_factors[start:end] = _solve(gram, ratings @ course_factors, mask.sum(axis=1), regularization)
+    return student_factors
+
+
+def _update_course_factors(score_matrix, student_factors, regularization):
+    """
+    固定学生因子，求解所有课程因子：对每门课程 (Uⱼᵀ Uⱼ + λ·nᵢ·I) v = Uⱼᵀ rᵢ，Uⱼ 为选过该课程的学生
+    """
+    num_courses = score_matrix.shape[1]
+    num_factors = student_factors.shape[1]
+    gram = np.zeros((num_courses, num_factors * num_factors))
+    rhs = np.zeros((num_courses, num_factors))
+    counts = np.zeros(num_courses)
+    for start, end, ratings, mask in _row_blocks(score_matrix):
+        block_factors = student_factors[start:end]
+        gram += mask.T @ _outer_products(block_factors)
+        rhs += ratings.T @ block_factors
+        counts += mask.sum(axis=0)
+    return _solve(gram.reshape(num_courses, num_factors, num_factors), rhs, counts, regularization)
+
+
+def _training_rmse(score_matrix, student_factors, course_factors):
+    """已选课单元格上的均方根误差"""
+    squared_error = 0.0
+    count = 0.0
+    for start, end, ratings, mask in _row_blocks(score_matrix):
+        error = (student_factors[start:end] @ course_factors.T - ratings) * mask
+        squared_error += float(np.sum(error * error))
+        count += float(mask.sum())
+    return float(np.sqrt(squared_error / count)) if count else 0.0
+
+
+def train_als(score_matrix, id_to_stu_no, id_to_course_no, factors=DEFAULT_FACTORS,
+              iterations=DEFAULT_ITERATIONS, regularization=DEFAULT_REGULARIZATION,
+              initial_model=None, seed=0):
+    """
+    训练 ALS 矩阵分解模型
+
+    参数:
+        score_matrix: numpy.ndarray 或 CSRScoreMatrix, 学生-课程评分矩阵
+        id_to_stu_no: StudentTable, 学生信息表
+        id_to_course_no: CourseTable, 课程信息表
+        factors: int, 因子数（隐向量维度）
+        iterations: int, 迭代轮数
+        regularization: float, 正则化系数 λ
+        initial_model: ALSFactorModel or None, 热启动使用的旧模型（因子数必须相同）
+        seed: int, 随机初始化种子
+
+    返回:
+        ALSFactorModel: 训练好的模型
+    """
+    rng = np.random.default_rng(seed)
+    num_courses = score_matrix.shape[1]
+
+    # 步骤1: 初始化课程因子（热启动时沿用旧模型中已有课程的因子）
+    course_factors = rng.normal(scale=0.1, size=(num_courses, factors))
+    if initial_model is not None and initial_model.course_factors.shape[1] == factors:
+        _, _, old_course_factors, known_courses = initial_model.align(id_to_stu_no, id_to_course_no)
+        course_factors[known_courses] = old_course_factors[known_courses]
+        print(f"[ALS] 热启动: 沿用 {int(known_courses.sum())}/{num_courses} 门课程的因子")
+
+    # 步骤2: 交替求解学生因子和课程因子
+    student_factors = None
+    for iteration in range(iterations):
+        student_factors = _update_student_factors(score_matrix, course_factors, regularization)
+        course_factors = _update_course_factors(score_matrix, student_factors, regularization)
+        rmse = _training_rmse(score_matrix, student_factors, course_factors)
+        print(f"[ALS] 第 {iteration + 1}/{iterations} 轮，训练RMSE: {rmse:.4f}")
+    if student_factors is None:
+        student_factors = _update_student_factors(score_matrix, course_factors, regularization)
+
+    stu_nos = [id_to_stu_no[idx][0] for idx in range(score_matrix.shape[0])]
+    course_nos = [id_to_course_no[idx][0] for idx in range(num_courses)]
+    return ALSFactorModel(stu_nos, course_nos, student_factors, course_factors)
+
+
+# 进程内缓存的模型及其文件修改时间（模型文件被重新训练后自动重新加载）
+_loaded_model = None
+_loaded_model_mtime = None
+
+
+def get_als_model(path=DEFAULT_MODEL_PATH):
+    """
+    获取 ALS 矩阵分解模型（带缓存）
+
+    返回:
+        ALSFactorModel or None: 模型文件不存在时返回None
+    """
+    global _loaded_model, _loaded_model_mtime
+    if not os.path.exists(path):
+        return None
+    mtime = os.path.getmtime(path)
+    if _loaded_model is None or _loaded_model_mtime != mtime:
+        _loaded_model = ALSFactorModel.load(path)
+        _loaded_model_mtime = mtime
+    return _loaded_model
+
+
+if __name__ == '__main__':
+    from utils.dynamic_recommend import DynamicCourseRecommender
+
+    parser = argparse.ArgumentParser(description='训练 ALS 矩阵分解推荐模型')
+    parser.add_argument('--factors', type=int, default=DEFAULT_FACTORS, help='因子数（隐向量维度）')
+    parser.add_argument('--iterations', type=int, default=None,
+                        help=f'迭代轮数（默认冷启动 {DEFAULT_ITERATIONS} 轮，热启动 {DEFAULT_WARM_ITERATIONS} 轮）')
+    parser.add_argument('--regularization', type=float, default=DEFAULT_REGULARIZATION, help='正则化系数')
+    parser.add_argument('--cold', action='store_true', help='不使用旧模型热启动，重新随机初始化')
+    parser.add_argument('--output', default=DEFAULT_MODEL_PATH, help='模型文件保存路径')
+    args = parser.parse_args()
+
+    initial_model = None if args.cold else ALSFactorModel.load(args.output)
+    iterations = args.iterations
+    if iterations is None:
+        iterations = DEFAULT_WARM_ITERATIONS if initial_model is not None else DEFAULT_ITERATIONS
+
+    start_time = time.time()
+    snapshot = DynamicCourseRecommender()._get_model_snapshot()
+    model = train_als(
+        snapshot.score_matrix, snapshot.id_to_stu_no, snapshot.id_to_course_no,
+        args.factors, iterations, args.regularization, initial_model
+    )
+    model.save(args.output)
+    print(f"[ALS] 已保存到 {args.output}：{len(model.stu_nos)} 个学生，{len(model.course_nos)} 门课程，"
+          f"{args.factors} 个因子，耗时 {time.time() - start_time:.1f} 秒")
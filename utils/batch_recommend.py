@@ -0,0 +1,360 @@
+"""
+批量推荐任务
+一次加载评分矩阵，为所有学生计算课程推荐和相似学生推荐，结果写入 RECOMMEND_RESULT 表（以 STU_NO 为主键）。
+
+/getRecommedData 优先读取该表中的结果，每次请求只执行一条查询（按主键读取结果，同时在数据库中比较选课记录指纹）；
+只有结果过期、或者学生的选课记录在上次批量任务之后发生了变化时，才回退到实时计算。
+学生选课记录是否变化通过选课记录指纹（STATE_HASH，由数据库按 STATE_HASH_SQL 计算）判断。
+RECOMMEND_RESULT 表由第一次批量任务创建，表不存在时打印提示并直接实时计算，不再逐个请求查询。
+
+全体学生的计算可以分片交给多个进程并行完成：评分矩阵写入临时目录下的 .npy 文件，
+各工作进程以只读内存映射的方式共享同一份矩阵（由操作系统页缓存共享，不复制），
+每个分片的结果写入单独的文件，最后由主进程合并。
+
+用法（每小时定时执行，与 RESULT_MAX_AGE_SECONDS 一致）:
+    python -m utils.batch_recommend
+    python -m utils.batch_recommend --processes 32
+"""
+import argparse
+import contextlib
+import hashlib
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from utils import query
+from utils import dynamic_recommend
+from utils.data_version import get_data_version
+from utils.dynamic_recommend import DynamicCourseRecommender, RecommendModelSnapshot, build_recommend_json
+from utils.sparse_matrix import CSRScoreMatrix
+
+# 预计算结果的最长有效期（秒），与定时任务的执行间隔（每小时）一致，
+# 超过后回退到实时计算，避免定时任务停止后一直返回旧结果
+RESULT_MAX_AGE_SECONDS = 60 * 60
+
+# RECOMMEND_RESULT 表不存在时，间隔多少秒再重新检查（期间直接实时计算）
+RESULT_TABLE_RECHECK_SECONDS = 5 * 60
+
+# 写入结果时每批的行数
+WRITE_CHUNK_SIZE = 500
+
+# 并行计算时每个分片的学生数（分片小一些便于各进程负载均衡）
+SHARD_SIZE = 500
+
+CREATE_RESULT_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS RECOMMEND_RESULT (
+        STU_NO VARCHAR(255) NOT NULL,
+        RESULT_JSON MEDIUMTEXT NOT NULL,
+        STATE_HASH CHAR(32) NOT NULL,
+        CREATED_AT DATETIME NOT NULL,
+        PRIMARY KEY (STU_NO)
+    )ENGINE=INNODB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+"""
+
+
+# 学生选课记录指纹（对 CHOOSE c 中一个学生的记录聚合）：记录数和每条记录 (CO_NO, GRADE, COMMENT) 的 CRC32 之和，
+# 与记录顺序无关，不受 GROUP_CONCAT 长度限制；写入结果和读取结果时都由数据库计算，格式完全一致
+STATE_HASH_SQL = (
+    "MD5(CONCAT(COUNT(*), ':', IFNULL(SUM(CRC32(CONCAT_WS('|', c.CO_NO, IFNULL(c.GRADE, ''), "
+    "IFNULL(c.COMMENT, '')))), 0)))"
+)
+
+# 没有选课记录的学生的指纹（STATE_HASH_SQL 对空集合的结果）
+EMPTY_STATE_HASH = hashlib.md5(b'0:0').hexdigest()
+
+# RECOMMEND_RESULT 表是否存在（None 表示尚未检查），以及最近一次检查的时间
+_result_table_exists = None
+_result_table_checked_at = 0.0
+
+
+def _load_choose_state_hashes():
+    """
+    一次查询计算所有学生的选课记录指纹
+
+    返回:
+        dict: 学生编号 -> 选课记录指纹（没有选课记录的学生不在其中）
+    """
+    sql = f"SELECT c.STU_NO, {STATE_HASH_SQL} FROM CHOOSE c GROUP BY c.STU_NO"
+    return {stu_no: state_hash for stu_no, state_hash in query.query(sql)}
+
+
+def _recommend_students(recommender, snapshot, student_ids, top_n_courses, top_n_students):
+    """
+    在同一个模型快照上为一组学生计算推荐结果
+
+    每个学生的相似度整行批量计算，用完即从推荐器当前使用的快照的缓存中移除，避免缓存随学生数平方增长。
+
+    返回:
+        dict: 学生编号 -> /getRecommedData 格式的推荐结果
+    """
+    results = {}
+    with open(os.devnull, 'w') as devnull:
+        for student_id in student_ids:
+            stu_no = snapshot.id_to_stu_no[student_id][0]
+            # 推荐器的调试输出对批量任务没有意义，这里丢弃
+            with contextlib.redirect_stdout(devnull):
+                course_list, student_list, id2course, id2student = recommender.get_recommendations(
+                    stu_no, top_n_courses=top_n_courses, top_n_students=top_n_students
+                )
+            recommender.student_similarity_row_cache.pop(student_id, None)
+            results[stu_no] = build_recommend_json(course_list, student_list, id2course, id2student)
+    return results
+
+
+def compute_batch_recommendations(top_n_courses=20, top_n_students=20):
+    """
+    在当前进程中为所有学生计算推荐结果
+
+    所有学生共用同一个模型快照（只加载一次评分矩阵）。
+
+    参数:
+        top_n_courses: int, 每个学生推荐课程数量
+        top_n_students: int, 每个学生推荐相似学生数量
+
+    返回:
+        dict: 学生编号 -> /getRecommedData 格式的推荐结果
+    """
+    recommender = DynamicCourseRecommender()
+    snapshot = recommender._get_model_snapshot()
+    num_students = len(snapshot.id_to_stu_no)
+
+    results = {}
+    for start in range(0, num_students, SHARD_SIZE):
+        student_ids = range(start, min(start + SHARD_SIZE, num_students))
+        results.update(_recommend_students(recommender, snapshot, student_ids, top_n_courses, top_n_students))
+        print(f"[批量推荐] 已完成 {len(results)}/{num_students} 个学生")
+
+    return results
+
+
+def _share_score_matrix(score_matrix, directory):
+    """
+    将评分矩阵的数组保存为目录下的 .npy 文件，供工作进程以内存映射方式打开
+
+    返回:
+        dict: 数组名称 -> 文件路径（稠密矩阵只有一个 'dense' 数组）
+    """
+    if isinstance(score_matrix, CSRScoreMatrix):
+        arrays = score_matrix.to_arrays()
+    else:
+        arrays = {'dense': score_matrix}
+
+    paths = {}
+    for name, array in arrays.items():
+        paths[name] = os.path.join(directory, f'score_matrix_{name}.npy')
+        np.save(paths[name], array)
+    return paths
+
+
+def _attach_score_matrix(paths, shape):
+    """
+    以只读内存映射方式打开 _share_score_matrix 保存的评分矩阵
+    """
+    arrays = {name: np.load(path, mmap_mode='r') for name, path in paths.items()}
+    if 'dense' in arrays:
+        return arrays['dense']
+    return CSRScoreMatrix.from_arrays(shape, arrays)
+
+
+# 工作进程内的状态（由 _init_worker 设置）
+_worker_state = {}
+
+
+def _init_worker(matrix_paths, shape, id_to_stu_no, id_to_course_no, output_dir, top_n_courses, top_n_students):
+    """
+    工作进程初始化：映射共享的评分矩阵，并将其安装为本进程的推荐模型快照
+
+    学生、课程信息表只传一次，编号 -> 矩阵ID 等映射视图在工作进程内由信息表重新生成，
+    避免视图各自被序列化成一份独立的索引副本。
+    工作进程开启后台刷新模式，推荐请求始终使用安装的快照：不会因为快照文件代数或有效期
+    丢弃共享的矩阵，再各自映射快照文件或从数据库重建
+    """
+    score_matrix = _attach_score_matrix(matrix_paths, shape)
+    snapshot = RecommendModelSnapshot(
+        get_data_version(), id_to_stu_no, id_to_course_no, score_matrix,
+        id_to_stu_no.by_stu_no, id_to_stu_no.major_by_stu_no
+    )
+    if dynamic_recommend.SNAPSHOT_FILE:
+        snapshot.checked_generation = dynamic_recommend.snapshot_generation()
+    dynamic_recommend.set_background_refresh(True)
+    dynamic_recommend._model_snapshot = snapshot
+
+    _worker_state['recommender'] = DynamicCourseRecommender()
+    _worker_state['snapshot'] = snapshot
+    _worker_state['output_dir'] = output_dir
+    _worker_state['top_n'] = (top_n_courses, top_n_students)
+
+
+def _run_shard(shard):
+    """
+    工作进程：计算一个分片的推荐结果并写入分片结果文件
+
+    参数:
+        shard: tuple, (分片编号, 起始学生ID, 结束学生ID)
+
+    返回:
+        str: 分片结果文件路径
+    """
+    shard_index, start, end = shard
+    top_n_courses, top_n_students = _worker_state['top_n']
+    results = _recommend_students(
+        _worker_state['recommender'], _worker_state['snapshot'],
+        range(start, end), top_n_courses, top_n_students
+    )
+    path = os.path.join(_worker_state['output_dir'], f'shard_{shard_index}.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False)
+    return path
+
+
+def compute_batch_recommendations_parallel(processes=None, top_n_courses=20, top_n_students=20):
+    """
+    使用多进程为所有学生计算推荐结果
+
+    主进程加载一次模型快照，把评分矩阵保存到临时目录；学生按 SHARD_SIZE 分片，
+    交给进程池中的工作进程计算，工作进程只读映射同一份评分矩阵，
+    每个分片的结果写入单独的文件，最后由主进程合并。
+
+    参数:
+        processes: int, 进程数，默认为CPU核数
+        top_n_courses: int, 每个学生推荐课程数量
+        top_n_students: int, 每个学生推荐相似学生数量
+
+    返回:
+        dict: 学生编号 -> /getRecommedData 格式的推荐结果
+    """
+    snapshot = DynamicCourseRecommender()._get_model_snapshot()
+    num_students = len(snapshot.id_to_stu_no)
+    shards = [
+        (shard_index, start, min(start + SHARD_SIZE, num_students))
+        for shard_index, start in enumerate(range(0, num_students, SHARD_SIZE))
+    ]
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='batch_recommend_') as work_dir:
+        matrix_paths = _share_score_matrix(snapshot.score_matrix, work_dir)
+        init_args = (
+            matrix_paths, snapshot.score_matrix.shape,
+            snapshot.id_to_stu_no, snapshot.id_to_course_no,
+            work_dir, top_n_courses, top_n_students
+        )
+        with multiprocessing.Pool(processes, initializer=_init_worker, initargs=init_args) as pool:
+            for path in pool.imap_unordered(_run_shard, shards):
+                with open(path, encoding='utf-8') as f:
+                    results.update(json.load(f))
+                print(f"[批量推荐] 已完成 {len(results)}/{num_students} 个学生")
+
+    return results
+
+
+def save_batch_recommendations(results, state_hashes):
+    """
+    将批量推荐结果写入 RECOMMEND_RESULT 表
+
+    参数:
+        results: dict, 学生编号 -> 推荐结果
+        state_hashes: dict, 学生编号 -> 计算推荐时的选课记录指纹
+    """
+    global _result_table_exists
+    query.update(CREATE_RESULT_TABLE_SQL)
+    _result_table_exists = True
+
+    created_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    rows = (
+        (stu_no, json.dumps(result, ensure_ascii=False), state_hashes.get(stu_no, EMPTY_STATE_HASH), created_at)
+        for stu_no, result in results.items()
+    )
+
+    # 所有批次在同一个事务中写入（失败时整体回滚，旧结果保持不变）
+    sql = """
+        REPLACE INTO RECOMMEND_RESULT (STU_NO, RESULT_JSON, STATE_HASH, CREATED_AT)
+        VALUES (%s, %s, %s, %s)
+    """
+    query.bulk_insert(sql, rows, chunk_size=WRITE_CHUNK_SIZE)
+
+
+def run_batch_recommendations(top_n_courses=20, top_n_students=20, processes=1):
+    """
+    批量推荐任务入口：计算所有学生的推荐结果并保存
+
+    选课记录指纹在加载评分矩阵之前读取：任务运行期间发生的选课变化会导致指纹不一致，
+    这些学生的请求会回退到实时计算，而不会拿到过时的结果。
+
+    参数:
+        top_n_courses: int, 每个学生推荐课程数量
+        top_n_students: int, 每个学生推荐相似学生数量
+        processes: int, 并行计算的进程数，1表示在当前进程中计算
+
+    返回:
+        int: 写入结果的学生数量
+    """
+    start_time = time.time()
+    state_hashes = _load_choose_state_hashes()
+    if processes == 1:
+        results = compute_batch_recommendations(top_n_courses, top_n_students)
+    else:
+        results = compute_batch_recommendations_parallel(processes, top_n_courses, top_n_students)
+    save_batch_recommendations(results, state_hashes)
+    print(f"[批量推荐] 完成：{len(results)} 个学生，耗时 {time.time() - start_time:.1f} 秒")
+    return len(results)
+
+
+def _check_result_table():
+    """
+    RECOMMEND_RESULT 表是否存在
+
+    表存在后不再检查；不存在时打印提示，并在 RESULT_TABLE_RECHECK_SECONDS 秒内直接返回False，
+    避免每个请求都查询一张不存在的表（批量任务第一次运行时创建该表）。
+    """
+    global _result_table_exists, _result_table_checked_at
+    if _result_table_exists:
+        return True
+    now = time.time()
+    if _result_table_exists is None or now - _result_table_checked_at >= RESULT_TABLE_RECHECK_SECONDS:
+        _result_table_exists = bool(query.query("SHOW TABLES LIKE 'RECOMMEND_RESULT'"))
+        _result_table_checked_at = now
+        if not _result_table_exists:
+            print("[批量推荐] RECOMMEND_RESULT 表不存在，推荐请求将实时计算"
+                  "（请定时运行 python -m utils.batch_recommend 生成预计算结果）")
+    return _result_table_exists
+
+
+def get_precomputed_recommendations(stu_no):
+    """
+    读取学生的预计算推荐结果
+
+    结果是否过期、学生选课记录的指纹是否一致都在同一条查询中判断，命中与否都只执行一条查询。
+
+    参数:
+        stu_no: str, 学生编号
+
+    返回:
+        dict or None: /getRecommedData 格式的推荐结果；
+            没有结果表、没有结果、结果过期或者学生选课记录已变化时返回None（调用方需要实时计算）
+    """
+    if not _check_result_table():
+        return None
+
+    oldest = (datetime.now() - timedelta(seconds=RESULT_MAX_AGE_SECONDS)).strftime('%Y-%m-%d %H:%M:%S')
+    sql = f"""
+        SELECT r.RESULT_JSON
+        FROM RECOMMEND_RESULT r
+        WHERE r.STU_NO = %s AND r.CREATED_AT >= %s
+          AND r.STATE_HASH = (SELECT {STATE_HASH_SQL} FROM CHOOSE c WHERE c.STU_NO = %s)
+    """
+    result = query.query(sql, (stu_no, oldest, stu_no))
+    if not result:
+        return None
+    return json.loads(result[0][0])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='为所有学生批量计算课程推荐和相似学生推荐')
+    parser.add_argument('--processes', type=int, default=1, help='并行计算的进程数（默认1，0表示使用全部CPU核）')
+    args = parser.parse_args()
+    run_batch_recommendations(processes=args.processes or None)
@@ -91,34 +91,30 @@ def handle_broadcast_request(request, session, query_module):
             return {'status': 'error', 'message': '标题和内容不能为空'}
         
         try:
-            # 1. 写入公告表
-            sql = "INSERT INTO announcement(topic, content, time_str) VALUES (%s, %s, %s)"
-            ann_id = query_module.insert(sql, (topic, contents, time_str))  # 返回公告ID
+            # 公告和可见性记录在同一个事务中写入
+            with query_module.transaction():
+                # 1. 写入公告表
+                sql = "INSERT INTO announcement(topic, content, time_str) VALUES (%s, %s, %s)"
+                ann_id = query_module.insert(sql, (topic, contents, time_str))  # 返回公告ID
 
-            # 2. 写入可见性表
-            vis_sql = """
-                INSERT INTO announcement_visibility(announcement_id, target_type, target_id)
-                VALUES (%s, %s, %s)
-            """
+                # 2. 写入可见性表
+                vis_sql = """
+                    INSERT INTO announcement_visibility(announcement_id, target_type, target_id)
+                    VALUES (%s, %s, %s)
+                """
             
-            # 如果没有选择任何目标，则对所有学生可见（可选：可以添加一个"全部"选项）
-            if not selected_students and not selected_colleges and not selected_majors:
-                # 如果没有选择任何目标，可以选择不插入可见性记录，或者插入一个特殊的"all"记录
-                # 这里我们选择对所有学生可见（通过不设置可见性限制）
-                # 但为了兼容现有查询逻辑，我们添加一个特殊的可见性记录
-                query_module.insert(vis_sql, (ann_id, 'college', 'ALL'))
-            else:
-                for s in selected_students:
-                    if s:  # 确保不为空
-                        query_module.insert(vis_sql, (ann_id, 'student', s))
-                        
-                for c in selected_colleges:
-                    if c:  # 确保不为空
-                        query_module.insert(vis_sql, (ann_id, 'college', c))
-                        
-                for m in selected_majors:
-                    if m:  # 确保不为空
-                        query_module.insert(vis_sql, (ann_id, 'major', m))
+                # 如果没有选择任何目标，则对所有学生可见（可选：可以添加一个"全部"选项）
+                if not selected_students and not selected_colleges and not selected_majors:
+                    # 如果没有选择任何目标，可以选择不插入可见性记录，或者插入一个特殊的"all"记录
+                    # 这里我们选择对所有学生可见（通过不设置可见性限制）
+                    # 但为了兼容现有查询逻辑，我们添加一个特殊的可见性记录
+                    query_module.insert(vis_sql, (ann_id, 'college', 'ALL'))
+                else:
+                    # 所有目标一次批量插入（跳过空值）
+                    vis_rows = [(ann_id, 'student', s) for s in selected_students if s]
+                    vis_rows += [(ann_id, 'college', c) for c in selected_colleges if c]
+                    vis_rows += [(ann_id, 'major', m) for m in selected_majors if m]
+                    query_module.bulk_insert(vis_sql, vis_rows)
             
             return {'status': 'redirect', 'url':url_for('manager'), 'message': '公告发布成功'}
             
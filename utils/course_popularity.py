@@ -0,0 +1,135 @@
+"""
+课程热度表
+按模型快照预先统计每门课程的选课人数和平均评分（全体学生以及按专业分组），
+冷启动推荐和各种热门课程回退策略直接查表，不再查询数据库、也不再对整个评分矩阵做归约。
+
+专业用整数编号表示：majors[k] 为第k个专业，课程所属专业编号为 -1 表示全校通用课程（MAJOR为空）。
+"""
+import numpy as np
+
+from utils.sparse_matrix import CSRScoreMatrix
+
+
+class CoursePopularityTable:
+    """
+    课程热度表
+
+    属性:
+        majors: list, 专业名称（学生专业与课程所属专业的并集）
+        major_codes: dict, 专业名称 -> 专业编号
+        course_major_codes: numpy.ndarray, shape=(课程数,)，课程所属专业编号，通用课程为-1
+        student_major_codes: numpy.ndarray, shape=(学生数,)，学生专业编号，没有专业为-1
+        popularity: numpy.ndarray, shape=(课程数,)，选课人数（正评分个数）
+        rating_sum: numpy.ndarray, shape=(课程数,)，正评分之和
+        major_popularity: numpy.ndarray, shape=(专业数, 课程数)，各专业学生的选课人数
+        major_rating_sum: numpy.ndarray, shape=(专业数, 课程数)，各专业学生的正评分之和
+    """
+
+    def __init__(self, score_matrix, students, courses):
+        """
+        参数:
+            score_matrix: numpy.ndarray 或 CSRScoreMatrix, 学生-课程评分矩阵
+            students: StudentTable, 学生信息表
+            courses: CourseTable, 课程信息表
+        """
+        num_courses = score_matrix.shape[1]
+
+        # 步骤1: 专业编号
+        student_majors = students.major_list()
+        course_majors = courses.major_list()
+        self.majors = sorted({major for major in student_majors + course_majors if major})
+        self.major_codes = {major: code for code, major in enumerate(self.majors)}
+        self.student_major_codes = np.array(
+            [self.major_codes.get(major, -1) if major else -1 for major in student_majors], dtype=np.int64
+        )
+        self.course_major_codes = np.array(
+            [self.major_codes.get(major, -1) if major else -1 for major in course_majors], dtype=np.int64
+        )
+
+        # 步骤2: 全体及按专业分组的选课人数、评分之和
+        if isinstance(score_matrix, CSRScoreMatrix):
+            rows, cols, values = score_matrix._row_ids(), score_matrix.indices, score_matrix.data
+        else:
+            rows, cols = np.nonzero(score_matrix)
+            values = score_matrix[rows, cols]
+        self.popularity = np.zeros(num_courses, dtype=np.int64)
+        self.rating_sum = np.zeros(num_courses)
+        self.major_popularity = np.zeros((len(self.majors), num_courses), dtype=np.int64)
+        self.major_rating_sum = np.zeros((len(self.majors), num_courses))
+        self._accumulate(rows, cols, values)
+
+    def _accumulate(self, rows, cols, values):
+        """将若干非零单元格累加到热度统计中（只统计正评分）"""
+        positive = values > 0
+        rows, cols, values = rows[positive], cols[positive], values[positive]
+        num_courses = len(self.popularity)
+        self.popularity += np.bincount(cols, minlength=num_courses)
+        self.rating_sum += np.bincount(cols, weights=values, minlength=num_courses)
+
+        codes = self.student_major_codes[rows]
+        has_major = codes >= 0
+        if self.majors:
+            keys = codes[has_major] * num_courses + cols[has_major]
+            size = len(self.majors) * num_courses
+            self.major_popularity += np.bincount(keys, minlength=size).reshape(len(self.majors), num_courses)
+            self.major_rating_sum += np.bincount(
+                keys, weights=values[has_major], minlength=size
+            ).reshape(len(self.majors), num_courses)
+
+    def with_updated_courses(self, score_matrix, course_ids):
+        """
+        生成若干门课程重新统计后的新热度表（原热度表不变，用于增量更新的快照）
+
+        参数:
+            score_matrix: numpy.ndarray 或 CSRScoreMatrix, 更新后的评分矩阵
+            course_ids: 评分发生变化的课程ID
+        """
+        course_ids = np.asarray(sorted(course_ids), dtype=np.int64)
+        table = CoursePopularityTable.__new__(CoursePopularityTable)
+        table.__dict__.update(self.__dict__)
+        table.popularity = self.popularity.copy()
+        table.rating_sum = self.rating_sum.copy()
+        table.major_popularity = self.major_popularity.copy()
+        table.major_rating_sum = self.major_rating_sum.copy()
+        if len(course_ids) == 0:
+            return table
+
+        table.popularity[course_ids] = 0
+        table.rating_sum[course_ids] = 0.0
+        table.major_popularity[:, course_ids] = 0
+        table.major_rating_sum[:, course_ids] = 0.0
+        if isinstance(score_matrix, CSRScoreMatrix):
+            rows, local_ids, values = score_matrix.column_entries(course_ids)
+            cols = course_ids[local_ids]
+        else:
+            rows, local_ids = np.nonzero(score_matrix[:, course_ids])
+            cols = course_ids[local_ids]
+            values = score_matrix[rows, cols]
+        table._accumulate(rows, cols, values)
+        return table
+
+    @property
+    def average_rating(self):
+        """每门课程的平均评分（只统计正评分，没有人选过为0）"""
+        return self.rating_sum / np.maximum(self.popularity, 1)
+
+    def major_course_mask(self, major):
+        """
+        属于某专业的课程掩码（包括通用课程），与按 MAJOR = 专业 OR MAJOR 为空 查询 EDUCATION_PLAN 的结果一致
+        """
+        code = self.major_codes.get(major, -2) if major else -2
+        return (self.course_major_codes == code) | (self.course_major_codes == -1)
+
+    def popularity_in_major(self, major):
+        """某专业学生中每门课程的选课人数；未知专业返回全0"""
+        code = self.major_codes.get(major) if major else None
+        if code is None:
+            return np.zeros_like(self.popularity)
+        return self.major_popularity[code]
+
+    def average_rating_in_major(self, major):
+        """某专业学生给每门课程的平均评分；未知专业返回全0"""
+        code = self.major_codes.get(major) if major else None
+        if code is None:
+            return np.zeros_like(self.rating_sum)
+        return self.major_rating_sum[code] / np.maximum(self.major_popularity[code], 1)
@@ -0,0 +1,105 @@
+"""
+课程容量与上课时间表
+按模型快照预先加载每门课程的选课人数上限（MAX_STUDENTS）、上课时间（CLASS_TIME）和起止日期，
+推荐流水线的重排阶段（去掉满员课程、去掉时间冲突课程）直接查表，不再每个请求查询数据库。
+
+选课人数取自课程热度表（快照评分矩阵中每门课程的正评分个数，选课后立即增量更新），
+学生已选的课程取自快照中学生的评分向量。与课程名称、类别一样，课程容量和上课时间只在快照完整重建时重新加载。
+推荐结果以快照为准，选课时的容量、冲突检查仍以数据库为准。
+"""
+import numpy as np
+
+# 视为没有安排上课时间的 CLASS_TIME 取值
+UNSCHEDULED_CLASS_TIMES = ('', '未定')
+
+
+def _overlaps(start_a, end_a, start_b, end_b):
+    """两个日期区间是否重叠（缺少日期时视为重叠）"""
+    if not (start_a and end_a and start_b and end_b):
+        return True
+    return start_a <= end_b and start_b <= end_a
+
+
+class CourseScheduleTable:
+    """
+    课程容量与上课时间表
+
+    属性:
+        max_students: numpy.ndarray, shape=(课程数,)，选课人数上限，0 表示不限
+        class_times: list, 上课时间类别
+        class_time_codes: numpy.ndarray, shape=(课程数,)，上课时间在 class_times 中的编号，没有安排为-1
+        start_times, end_times: list, 按课程ID排列的起止日期（可能为None）
+    """
+
+    def __init__(self, rows, courses):
+        """
+        参数:
+            rows: 查询结果 (CO_NO, MAX_STUDENTS, CLASS_TIME, START_TIME, END_TIME)
+            courses: CourseTable, 课程信息表（结果按其课程ID对齐，不在表中的课程忽略）
+        """
+        num_courses = len(courses)
+        self.max_students = np.zeros(num_courses, dtype=np.int64)
+        self.class_time_codes = np.full(num_courses, -1, dtype=np.int64)
+        self.start_times = [None] * num_courses
+        self.end_times = [None] * num_courses
+        self.class_times = []
+        if not rows:
+            return
+
+        co_nos, max_students, class_times, start_times, end_times = zip(*rows)
+        course_ids = courses.lookup(co_nos)
+        code_of = {}
+        for course_id, limit, class_time, start_time, end_time in zip(
+                course_ids.tolist(), max_students, class_times, start_times, end_times):
+            if course_id < 0:
+                continue
+            self.max_students[course_id] = limit or 0
+            if class_time is not None and class_time not in UNSCHEDULED_CLASS_TIMES:
+                self.class_time_codes[course_id] = code_of.setdefault(class_time, len(code_of))
+            self.start_times[course_id] = start_time
+            self.end_times[course_id] = end_time
+        self.class_times = list(code_of)
+
+    def full_mask(self, course_ids, popularity):
+        """
+        课程是否已经满员（MAX_STUDENTS 大于0且选课人数已达到上限，与选课时的容量检查一致）
+
+        参数:
+            course_ids: numpy.ndarray, 课程ID
+            popularity: numpy.ndarray, shape=(课程数,)，每门课程的选课人数
+
+        返回:
+            numpy.ndarray: 与 course_ids 对应的布尔数组
+        """
+        limits = self.max_students[course_ids]
+        return (limits > 0) & (popularity[course_ids] >= limits)
+
+    def conflict_mask(self, course_ids, chosen_ids):
+        """
+        课程是否与已选课程上课时间冲突：上课时间相同，并且两门课程的起止日期重叠（已经结课的课程不算冲突）
+
+        参数:
+            course_ids: numpy.ndarray, 课程ID
+            chosen_ids: numpy.ndarray, 学生已选课程的ID
+
+        返回:
+            numpy.ndarray: 与 course_ids 对应的布尔数组
+        """
+        conflicts = np.zeros(len(course_ids), dtype=bool)
+        timetable = {}
+        for chosen_id in chosen_ids[self.class_time_codes[chosen_ids] >= 0].tolist():
+            timetable.setdefault(int(self.class_time_codes[chosen_id]), []).append(
+                (self.start_times[chosen_id], self.end_times[chosen_id])
+            )
+        if not timetable:
+            return conflicts
+
+        codes = self.class_time_codes[course_ids]
+        for position in np.nonzero(np.isin(codes, list(timetable)))[0].tolist():
+            course_id = int(course_ids[position])
+            start_time, end_time = self.start_times[course_id], self.end_times[course_id]
+            conflicts[position] = any(
+                _overlaps(start_time, end_time, chosen_start, chosen_end)
+                for chosen_start, chosen_end in timetable[int(codes[position])]
+            )
+        return conflicts
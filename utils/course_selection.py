@@ -3,7 +3,8 @@
 提供专业选修课程的选课功能
 """
 
-from utils.query import query, update
+from utils.query import query, update, transactional, on_commit
+from utils.data_version import publish_choose_change
 
 
 def get_available_elective_courses(stu_no):
@@ -64,6 +65,7 @@ def get_student_chosen_courses(stu_no):
     return query(sql)
 
 
+@transactional
 def select_course(stu_no, co_no, ad_year='2016', major='计算机科学与技术'):
     """
     学生选课功能
@@ -76,9 +78,12 @@ def select_course(stu_no, co_no, ad_year='2016', major='计算机科学与技术
     
     返回:
         tuple: (success: bool, message: str)
+    
+    检查和插入在同一个事务中执行，并锁定课程记录（FOR UPDATE），
+    同一门课程的并发选课依次检查容量，不会超出最大学生数
     """
     # 检查课程是否存在
-    sql_check = f"SELECT CO_NO, CO_NAME, MAX_STUDENTS FROM EDUCATION_PLAN WHERE CO_NO = '{co_no}'"
+    sql_check = f"SELECT CO_NO, CO_NAME, MAX_STUDENTS FROM EDUCATION_PLAN WHERE CO_NO = '{co_no}' FOR UPDATE"
     course_info = query(sql_check)
     
     if not course_info:
@@ -118,6 +123,8 @@ def select_course(stu_no, co_no, ad_year='2016', major='计算机科学与技术
     try:
         # 使用 update 方法插入选课记录
         update(sql_insert)
+        # 事务提交后通知推荐系统：新增一条成绩和评价为空的选课记录
+        on_commit(publish_choose_change, stu_no, co_no, grade=None, comment=None)
         return True, f"成功选择课程《{course_name}》"
     except Exception as e:
         import traceback
@@ -126,6 +133,7 @@ def select_course(stu_no, co_no, ad_year='2016', major='计算机科学与技术
         return False, f"选课失败：{error_msg}"
 
 
+@transactional
 def drop_course(stu_no, co_no):
     """
     学生退课功能
@@ -162,6 +170,8 @@ def drop_course(stu_no, co_no):
     try:
         # 使用 update 方法删除选课记录
         update(sql_delete)
+        # 事务提交后通知推荐系统：选课记录被删除
+        on_commit(publish_choose_change, stu_no, co_no, removed=True)
         return True, f"成功退选课程《{course_name}》"
     except Exception as e:
         import traceback
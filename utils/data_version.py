@@ -0,0 +1,125 @@
+"""
+推荐数据版本计数器与变化事件
+
+STUDENT / EDUCATION_PLAN / CHOOSE 三张表决定了推荐系统的评分矩阵和ID映射。
+这些表的写入路径在写入成功后通知本模块，推荐模型快照据此判断是否需要更新：
+
+- publish_choose_change(): CHOOSE 表单条选课记录的变化（选课、退课、评分），
+  推荐器可以只更新评分矩阵中的一个单元格
+- bump_data_version(): 其他变化（学生信息、课程信息等），推荐器需要完整重建快照
+
+每次通知都会递增数据版本号。计数器和事件日志是进程内的，线程安全。
+后台刷新线程可以用 wait_for_data_change() 等待下一次变化，而不必轮询。
+"""
+import threading
+import time
+from collections import deque, namedtuple
+
+# CHOOSE表单条选课记录的变化：removed为True表示选课记录被删除
+ChooseChange = namedtuple('ChooseChange', ['stu_no', 'co_no', 'grade', 'comment', 'removed'])
+
+# 事件日志最多保留的条数，落后太多的快照直接完整重建
+MAX_CHANGE_EVENTS = 1000
+
+_data_version = 0
+# 最近一次数据变化的时间戳（用于判断其他进程写出的模型快照文件是否已经包含本进程的写入）
+_data_changed_at = 0.0
+_data_version_lock = threading.Lock()
+# 数据版本变化时通知等待者（与计数器共用同一把锁）
+_data_version_changed = threading.Condition(_data_version_lock)
+# (版本号, ChooseChange 或 None)，None 表示无法增量应用的变化
+_change_events = deque(maxlen=MAX_CHANGE_EVENTS)
+
+
+def get_data_version():
+    """
+    获取当前数据版本号
+
+    返回:
+        int: 当前数据版本号
+    """
+    return _data_version
+
+
+def get_data_changed_at():
+    """
+    获取本进程内最近一次数据变化的时间戳（没有变化时为0）
+
+    返回:
+        float: 时间戳
+    """
+    return _data_changed_at
+
+
+def bump_data_version():
+    """
+    推荐相关数据发生变化后递增数据版本号（需要完整重建推荐模型快照）
+
+    返回:
+        int: 递增后的数据版本号
+    """
+    global _data_version, _data_changed_at
+    with _data_version_lock:
+        _data_version += 1
+        _data_changed_at = time.time()
+        _change_events.append((_data_version, None))
+        _data_version_changed.notify_all()
+        return _data_version
+
+
+def publish_choose_change(stu_no, co_no, grade=None, comment=None, removed=False):
+    """
+    发布一条CHOOSE表选课记录变化事件，并递增数据版本号
+
+    参数:
+        stu_no: str, 学生编号
+        co_no: str, 课程编号
+        grade: 变化后的成绩(GRADE)，没有成绩时为None
+        comment: 变化后的评价(COMMENT)，没有评价时为None
+        removed: bool, 选课记录是否被删除（退课）
+
+    返回:
+        int: 递增后的数据版本号
+    """
+    global _data_version, _data_changed_at
+    with _data_version_lock:
+        _data_version += 1
+        _data_changed_at = time.time()
+        _change_events.append((_data_version, ChooseChange(stu_no, co_no, grade, comment, removed)))
+        _data_version_changed.notify_all()
+        return _data_version
+
+
+def get_choose_changes_since(version):
+    """
+    获取某个版本之后发生的所有CHOOSE表变化事件
+
+    参数:
+        version: int, 起始数据版本号（不包含）
+
+    返回:
+        tuple: (当前数据版本号, 事件列表)
+            - 事件列表按发生顺序排列；如果期间有无法增量应用的变化，
+              或事件日志已经不完整，则为None，调用方需要完整重建
+    """
+    with _data_version_lock:
+        current_version = _data_version
+        events = [event for event_version, event in _change_events if event_version > version]
+        if len(events) != current_version - version or None in events:
+            return current_version, None
+        return current_version, events
+
+
+def wait_for_data_change(version, timeout=None):
+    """
+    阻塞等待数据版本号不再等于 version
+
+    参数:
+        version: int, 调用方已经处理过的数据版本号
+        timeout: float, 最长等待秒数，None 表示一直等待
+
+    返回:
+        bool: 数据版本是否已经变化（False 表示等待超时）
+    """
+    with _data_version_changed:
+        return _data_version_changed.wait_for(lambda: _data_version != version, timeout)
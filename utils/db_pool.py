@@ -0,0 +1,313 @@
+"""
+数据库连接池
+
+utils.query 中的 query / update / insert 原来每条语句都新建一个 pymysql 连接（TCP 握手 + 认证），
+用完即关闭；一个请求往往要执行几条到上百条语句。连接池把用过的连接放回池中复用：
+
+- 大小有上下限：第一次使用时建立 min_size 个连接，同时借出的连接最多 max_size 个，
+  连接都被占用时等待归还，超过 timeout 秒抛出 PoolTimeoutError
+- 借出前健康检查：空闲超过 health_check_idle 秒的连接先 ping，失败则丢弃并新建
+- 连接最长使用 max_lifetime 秒，超过后在借出或归还时关闭并按需新建（避免被 MySQL wait_timeout 断开）
+- 归还时连接上还有未结束的事务（或使用中抛出异常）才回滚，已经提交的连接直接放回池中；执行出错的连接直接丢弃
+- 进程 fork 之后（例如 gunicorn 预加载应用）不复用父进程的连接
+- stats() 返回借出、等待、超时次数等统计
+
+用法:
+    pool = ConnectionPool(connect, min_size=1, max_size=10)
+    with pool.connection() as conn:
+        ...
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+# MySQL 服务器状态中"有未结束的事务"的标志位（SERVER_STATUS_IN_TRANS）
+SERVER_STATUS_IN_TRANS = 0x0001
+
+
+class PoolTimeoutError(Exception):
+    """等待空闲连接超时"""
+
+
+class _PooledConnection:
+    """
+    池中的一个连接及其创建、最近归还的时间
+    """
+
+    __slots__ = ('raw', 'created_at', 'returned_at')
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.created_at = time.monotonic()
+        self.returned_at = self.created_at
+
+
+def _close_quietly(raw):
+    """关闭连接，忽略关闭时的错误（连接可能已经断开）"""
+    try:
+        raw.close()
+    except Exception:
+        pass
+
+
+class ConnectionPool:
+    """
+    线程安全的有界连接池
+
+    属性:
+        min_size: int, 第一次使用时建立、并尽量保持的空闲连接数
+        max_size: int, 同时存在的连接数上限
+        timeout: float, 等待空闲连接的最长秒数
+        max_lifetime: float, 连接的最长使用秒数
+        health_check_idle: float, 空闲超过该秒数的连接在借出前 ping 检查（0 表示每次借出都检查）
+    """
+
+    def __init__(self, connect, min_size=1, max_size=10, timeout=10.0, max_lifetime=3600.0, health_check_idle=30.0):
+        """
+        参数:
+            connect: callable, 无参数，返回一个新的 DB-API 连接（需支持 ping / rollback / close）
+        """
+        if max_size < 1 or min_size > max_size:
+            raise ValueError(f"连接池大小设置错误: min_size={min_size}, max_size={max_size}")
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.health_check_idle = health_check_idle
+
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._idle = []
+        self._size = 0
+        self._filled = False
+        self._pid = os.getpid()
+        self._stats = {
+            'checkouts': 0, 'waits': 0, 'wait_seconds': 0.0, 'timeouts': 0,
+            'created': 0, 'closed': 0, 'health_check_failures': 0, 'expired': 0, 'discarded': 0,
+        }
+
+    def _check_fork(self):
+        """
+        fork 之后的子进程丢弃从父进程继承的连接（需持有锁）
+
+        继承的连接与父进程共享同一个套接字，不能使用也不能关闭（关闭会断开父进程的连接）。
+        """
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._idle = []
+            self._size = 0
+            self._filled = False
+
+    def _expired(self, conn, now):
+        return now - conn.created_at >= self.max_lifetime
+
+    def _new_connection(self):
+        """新建连接（不持有锁时调用；调用前已经占用了一个 _size 名额）"""
+        try:
+            conn = _PooledConnection(self._connect())
+        except BaseException:
+            with self._lock:
+                self._size -= 1
+                self._available.notify()
+            raise
+        with self._lock:
+            self._stats['created'] += 1
+        return conn
+
+    def _fill(self):
+        """第一次使用时建立 min_size 个空闲连接"""
+        with self._lock:
+            if self._filled:
+                return
+            self._filled = True
+            missing = max(self.min_size - self._size, 0)
+            self._size += missing
+        for created in range(missing):
+            try:
+                conn = self._new_connection()
+            except BaseException:
+                # 剩余的名额也释放掉，之后按需新建；让调用方看到连接错误
+                with self._lock:
+                    self._size -= missing - created - 1
+                    self._filled = False
+                raise
+            with self._lock:
+                self._idle.append(conn)
+                self._available.notify()
+
+    def _discard(self, conn, reason):
+        """关闭并移除一个连接（不持有锁时调用）"""
+        _close_quietly(conn.raw)
+        with self._lock:
+            self._size -= 1
+            self._stats['closed'] += 1
+            self._stats[reason] += 1
+            self._available.notify()
+
+    def acquire(self):
+        """
+        借出一个连接（用完必须调用 release 归还）
+
+        返回:
+            _PooledConnection: 池中的连接，.raw 为 DB-API 连接
+
+        异常:
+            PoolTimeoutError: 等待空闲连接超过 timeout 秒
+        """
+        with self._lock:
+            self._check_fork()
+        self._fill()
+
+        while True:
+            conn = None
+            with self._lock:
+                self._check_fork()
+                deadline = None
+                while not self._idle and self._size >= self.max_size:
+                    # 所有连接都被占用：等待归还
+                    if deadline is None:
+                        deadline = time.monotonic() + self.timeout
+                        self._stats['waits'] += 1
+                        wait_start = time.monotonic()
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not self._available.wait(remaining):
+                        if not self._idle and self._size >= self.max_size:
+                            self._stats['timeouts'] += 1
+                            self._stats['wait_seconds'] += time.monotonic() - wait_start
+                            raise PoolTimeoutError(
+                                f"等待数据库连接超时（{self.timeout} 秒，连接池上限 {self.max_size}）"
+                            )
+                if deadline is not None:
+                    self._stats['wait_seconds'] += time.monotonic() - wait_start
+                if self._idle:
+                    # 后进先出：最近归还的连接最可能仍然可用
+                    conn = self._idle.pop()
+                else:
+                    self._size += 1
+
+            if conn is None:
+                conn = self._new_connection()
+            else:
+                now = time.monotonic()
+                if self._expired(conn, now):
+                    self._discard(conn, 'expired')
+                    continue
+                if now - conn.returned_at >= self.health_check_idle:
+                    try:
+                        conn.raw.ping(reconnect=False)
+                    except Exception:
+                        self._discard(conn, 'health_check_failures')
+                        continue
+
+            with self._lock:
+                self._stats['checkouts'] += 1
+            return conn
+
+    def release(self, conn, broken=False, dirty=False):
+        """
+        归还连接
+
+        参数:
+            conn: _PooledConnection, acquire 借出的连接
+            broken: bool, 连接在使用中出错（直接丢弃，不放回池中）
+            dirty: bool, 使用中抛出了异常，连接上可能留有未结束的事务（一定回滚）
+        """
+        with self._lock:
+            if self._pid != os.getpid():
+                # 借出之后进程已经 fork，连接属于父进程
+                return
+        if broken:
+            self._discard(conn, 'discarded')
+            return
+        if self._expired(conn, time.monotonic()):
+            self._discard(conn, 'expired')
+            return
+        if dirty or _in_transaction(conn.raw):
+            try:
+                # 回滚调用方没有提交的事务，下一个使用者从干净的状态开始
+                conn.raw.rollback()
+            except Exception:
+                self._discard(conn, 'discarded')
+                return
+        conn.returned_at = time.monotonic()
+        with self._lock:
+            self._idle.append(conn)
+            self._available.notify()
+
+    @contextmanager
+    def connection(self):
+        """
+        借出一个连接，退出上下文时自动归还；上下文中抛出 OSError 或 DB-API 的 OperationalError / InterfaceError
+        （可能是连接断开）且连接 ping 不通时丢弃该连接
+        """
+        conn = self.acquire()
+        try:
+            yield conn.raw
+        except BaseException as e:
+            self.release(conn, broken=_is_connection_error(e) and not _is_alive(conn.raw), dirty=True)
+            raise
+        else:
+            self.release(conn)
+
+    def close(self):
+        """
+        关闭所有空闲连接（借出中的连接归还时照常放回池中）
+        """
+        with self._lock:
+            self._check_fork()
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._stats['closed'] += len(idle)
+            self._filled = False
+        for conn in idle:
+            _close_quietly(conn.raw)
+
+    def stats(self):
+        """
+        获取连接池统计
+
+        返回:
+            dict: size（当前连接数）, idle, in_use, min_size, max_size, checkouts, waits, wait_seconds,
+                  timeouts, created, closed, health_check_failures, expired, discarded
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+            })
+        return stats
+
+
+def _is_connection_error(error):
+    """异常是否可能由连接断开引起（SQL 语句错误一般是 ProgrammingError / IntegrityError）"""
+    if isinstance(error, OSError):
+        return True
+    return type(error).__name__ in ('OperationalError', 'InterfaceError')
+
+
+def _in_transaction(raw):
+    """
+    连接上是否有未结束的事务：显式开始的事务，或者非自动提交模式下执行语句后隐式开始、还没有提交的事务
+
+    按服务器最近一次返回的状态判断（pymysql 连接的 server_status）；连接不提供状态时按有未结束的事务处理
+    """
+    server_status = getattr(raw, 'server_status', None)
+    if server_status is None:
+        return True
+    return bool(server_status & SERVER_STATUS_IN_TRANS)
+
+
+def _is_alive(raw):
+    """连接是否仍然可用（ping 不自动重连）"""
+    try:
+        raw.ping(reconnect=False)
+        return True
+    except Exception:
+        return False
@@ -3,21 +3,259 @@
 基于协同过滤算法，根据学生的选课历史、成绩、专业等信息动态推荐课程
 
 主要功能：
-1. 基于用户的协同过滤推荐（User-based Collaborative Filtering）
-2. 冷启动处理：为新同学根据专业推荐热门课程
-3. 动态数据加载：每次推荐都从数据库重新加载最新数据
-4. 相似学生推荐：推荐志同道合的朋友
+1. 基于用户的协同过滤推荐（User-based Collaborative Filtering），
+   也可以切换为基于预先计算的课程相似邻居的协同过滤（config['RECOMMEND_MODE'] = 'item'）
+   或 ALS 矩阵分解模型（config['RECOMMEND_MODE'] = 'als'）
+2. 冷启动处理：为新同学根据专业推荐热门课程（热度表按模型快照预先统计，见 utils/course_popularity.py）
+3. 动态数据加载：推荐基于进程内共享的模型快照，选课、退课、评分等变化以单元格为单位增量更新，
+   其他数据变化后自动重建（可选由多个工作进程共享内存映射的快照文件，config['RECOMMEND_SNAPSHOT_FILE']）
+4. 推荐流水线：课程推荐由可插拔的候选生成、评分、重排阶段组成，各阶段单独计时（见 utils/recommend_pipeline.py）
+5. 相似学生推荐：推荐志同道合的朋友（可选 LSH 近似最近邻索引筛选候选，config['RECOMMEND_SIMILAR_STUDENT_SEARCH'] = 'lsh'）
 
 算法特点：
 - 使用皮尔逊相关系数计算学生相似度
 - 使用余弦相似度计算课程相似度
 - 综合考虑成绩(GRADE)和评价(COMMENT)计算评分
 - 支持冷启动场景，根据专业推荐热门课程
+- 评分矩阵可选稀疏存储（config['RECOMMEND_SPARSE_MATRIX']），内存与选课记录数成正比
 """
 import numpy as np
-from collections import defaultdict
-from utils.query import query
+from collections import defaultdict, OrderedDict
+from utils.query import query, stream
+from utils.data_version import get_data_version, get_choose_changes_since, get_data_changed_at
+from utils.sparse_matrix import CSRScoreMatrix
+from utils.item_recommend import get_course_neighbor_model, score_courses
+from utils.als_recommend import get_als_model
+from utils.student_index import StudentLSHIndex
+from utils.course_popularity import CoursePopularityTable
+from utils.course_schedule import CourseScheduleTable
+from utils.snapshot_store import load_fresh_snapshot, save_snapshot, snapshot_generation
+from utils.id_maps import StudentTable, CourseTable
+from utils.recommend_pipeline import RecommendContext, course_pipeline
+from config import config
 import math
+import threading
+import time
+
+
+class RecommendModelSnapshot:
+    """
+    推荐模型快照
+    
+    保存某一数据版本下构建好的ID映射、评分矩阵以及在该矩阵上计算出的相似度缓存。
+    快照在进程内所有推荐器实例之间共享，只在数据版本变化时重建，
+    推荐请求直接读取快照，不再访问数据库。
+    
+    属性:
+        version: int, 构建快照时的数据版本号
+        id_to_stu_no: StudentTable, 学生信息表（矩阵ID到(学生编号, 学生姓名)的映射）
+        id_to_course_no: CourseTable, 课程信息表（矩阵ID到(课程编号, 课程名称, 课程类别, 所属专业)的映射）
+        score_matrix: numpy.ndarray 或 CSRScoreMatrix, 学生-课程评分矩阵
+        stu_no_to_id: Mapping, 学生编号到矩阵ID的映射
+        stu_no_to_major: Mapping, 学生编号到专业的映射
+        student_similarity_cache: 学生相似度缓存 {(id1, id2): similarity}
+        student_similarity_row_cache: 学生相似度整行缓存（SimilarityRowCache，LRU）
+        course_similarity_cache: 课程相似度缓存 {(id1, id2): similarity}
+        course_neighbors: 对齐到本快照课程ID的课程邻居模型 (模型, neighbor_ids, neighbor_sims)，首次使用时生成
+        als_factors: 对齐到本快照学生ID、课程ID的ALS因子 (模型, 学生因子, 已知学生, 课程因子, 已知课程)，首次使用时生成
+        student_index: 相似学生 LSH 索引（StudentLSHIndex），首次使用时构建
+        popularity_table: 课程热度表（CoursePopularityTable），首次使用时构建
+        course_schedule: 课程容量与上课时间表（CourseScheduleTable），首次使用时查询一次数据库
+        built_at: float, 快照数据从数据库加载的时间戳（增量更新和映射文件得到的快照沿用其来源快照的时间）
+        source: str, 快照来源：'database' 从数据库加载；'file' 映射快照文件；'incremental' 增量更新
+        file_generation: int, 本快照的数据所基于的快照文件代数（见 utils/snapshot_store.py），未开启快照文件时为None
+        root_generation: int, 本快照所在的一串增量写回的基准代数；本快照不是由快照文件派生的时为None
+        checked_generation: int, 最近一次检查过的快照文件代数（文件代数变化后才需要再次检查，见 snapshot_file_changed）
+        unsaved_changes: bool, 是否含有尚未写回快照文件的增量变化（只由后台刷新线程定期写回）
+    """
+    
+    def __init__(self, version, id_to_stu_no, id_to_course_no, score_matrix, stu_no_to_id, stu_no_to_major,
+                 source='database'):
+        self.version = version
+        self.id_to_stu_no = id_to_stu_no
+        self.id_to_course_no = id_to_course_no
+        self.score_matrix = score_matrix
+        self.stu_no_to_id = stu_no_to_id
+        self.stu_no_to_major = stu_no_to_major
+        self.student_similarity_cache = {}
+        self.student_similarity_row_cache = SimilarityRowCache()
+        self.course_similarity_cache = {}
+        self.course_neighbors = None
+        self.als_factors = None
+        self.student_index = None
+        self.popularity_table = None
+        self.course_schedule = None
+        self.built_at = time.time()
+        self.source = source
+        self.file_generation = None
+        self.root_generation = None
+        self.checked_generation = None
+        self.unsaved_changes = False
+
+
+# 是否使用稀疏评分矩阵（学生和课程很多、选课记录相对很少时可以大幅降低内存占用）
+SPARSE_SCORE_MATRIX = config.get('RECOMMEND_SPARSE_MATRIX', False)
+
+# 推荐模式：'user' 基于学生相似度；'item' 基于预先计算的课程相似邻居；'als' 基于ALS矩阵分解
+# （模型文件不存在、或学生不在模型中时回退到 'user'）
+RECOMMEND_MODE = config.get('RECOMMEND_MODE', 'user')
+
+# 相似学生查找方式：'exact' 与所有学生精确比较；'lsh' 先用 LSH 索引筛选候选，再在候选上精确计算
+SIMILAR_STUDENT_SEARCH = config.get('RECOMMEND_SIMILAR_STUDENT_SEARCH', 'exact')
+# LSH 索引参数（召回率与耗时的权衡，见 utils/student_index.py）
+LSH_TABLES = config.get('RECOMMEND_LSH_TABLES', 16)
+LSH_BITS = config.get('RECOMMEND_LSH_BITS', 9)
+LSH_PROBES = config.get('RECOMMEND_LSH_PROBES', 3)
+# 增量更新累计变化的学生超过该比例后，丢弃旧索引、在下次查询时重建
+LSH_MAX_STALE_RATIO = 0.05
+
+# 是否通过内存映射的快照文件在多个工作进程之间共享模型快照（见 utils/snapshot_store.py）
+SNAPSHOT_FILE = config.get('RECOMMEND_SNAPSHOT_FILE', False)
+# 模型快照的最长有效期（秒）：快照文件超过后由下一个需要快照的进程从数据库重建并重新写入；
+# 没有后台刷新线程时，进程内的快照从数据库加载超过该时间后也完整重建
+SNAPSHOT_MAX_AGE = config.get('RECOMMEND_SNAPSHOT_MAX_AGE', 600)
+
+# 每个模型快照最多缓存的学生相似度整行数（每行 学生数 个浮点数，超过后淘汰最久未使用的行）
+SIMILARITY_ROW_CACHE_SIZE = config.get('RECOMMEND_SIMILARITY_ROW_CACHE_SIZE', 256)
+
+
+class SimilarityRowCache:
+    """
+    学生相似度整行缓存（LRU，线程安全）
+
+    每个条目为 (整行相似度, 过期的学生ID数组)。增量更新时由 carry_over 生成新快照的缓存：
+    变化学生自己的行丢弃，其他行不复制、不重新计算，只记下与变化学生对应的元素已经过期，
+    由读取的一方（_get_student_similarity_row）在快照锁之外一次性重新计算这些元素。
+    
+    属性:
+        max_rows: int, 最多缓存的行数
+    """
+    
+    def __init__(self, max_rows=SIMILARITY_ROW_CACHE_SIZE):
+        self.max_rows = max_rows
+        # 学生矩阵ID -> (numpy.ndarray, numpy.ndarray)，按最近使用排序
+        self._rows = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def __contains__(self, student_id):
+        return student_id in self._rows
+    
+    def __len__(self):
+        return len(self._rows)
+    
+    def get(self, student_id):
+        """
+        返回:
+            tuple or None: (整行相似度, 过期的学生ID数组)，没有缓存时返回None
+        """
+        with self._lock:
+            entry = self._rows.get(student_id)
+            if entry is not None:
+                self._rows.move_to_end(student_id)
+            return entry
+    
+    def put(self, student_id, similarity_row, stale_ids=None):
+        """
+        保存一行相似度（stale_ids 为其中已经过期的学生ID，None 表示整行有效）
+        """
+        if stale_ids is None:
+            stale_ids = np.zeros(0, dtype=np.int64)
+        with self._lock:
+            self._rows[student_id] = (similarity_row, stale_ids)
+            self._rows.move_to_end(student_id)
+            while len(self._rows) > self.max_rows:
+                self._rows.popitem(last=False)
+    
+    def pop(self, student_id, default=None):
+        """
+        删除一行（返回删除的条目）
+        """
+        with self._lock:
+            return self._rows.pop(student_id, default)
+    
+    def clear(self):
+        """
+        清空缓存
+        """
+        with self._lock:
+            self._rows.clear()
+    
+    def carry_over(self, changed_students):
+        """
+        生成增量更新后快照使用的缓存（旧缓存不变，仍在使用旧快照的请求不受影响）
+        
+        参数:
+            changed_students: set of int, 评分发生变化的学生矩阵ID
+        
+        返回:
+            SimilarityRowCache: 新缓存，变化学生的行被丢弃，其他行把变化学生标记为过期
+        """
+        changed_ids = np.array(sorted(changed_students), dtype=np.int64)
+        new_cache = SimilarityRowCache(self.max_rows)
+        with self._lock:
+            entries = list(self._rows.items())
+        for student_id, (similarity_row, stale_ids) in entries:
+            if student_id not in changed_students:
+                new_cache._rows[student_id] = (similarity_row, np.union1d(stale_ids, changed_ids))
+        return new_cache
+
+
+# 进程内共享的推荐模型快照，以及保护快照重建的锁
+_model_snapshot = None
+_model_snapshot_lock = threading.Lock()
+# 是否由后台线程负责更新快照（见 utils/model_refresher.py）；开启后请求不再自己重建快照
+_background_refresh = False
+
+
+def set_background_refresh(enabled):
+    """
+    开启/关闭后台刷新模式
+
+    开启后，只要已经有快照，推荐请求就直接使用当前快照（即使数据版本已经变化），
+    加载数据和构建模型全部由后台刷新线程完成；进程内还没有快照时，请求仍会自己构建一次。
+    """
+    global _background_refresh
+    _background_refresh = enabled
+
+
+def get_model_version():
+    """
+    获取推荐请求当前会使用的模型数据版本（不触发快照重建）
+
+    后台刷新模式下为当前快照的版本（刷新线程更新快照之前保持不变）；
+    否则请求会先把快照更新到最新数据版本，即当前数据版本号。
+
+    返回:
+        int: 模型数据版本
+    """
+    snapshot = _model_snapshot
+    if _background_refresh and snapshot is not None:
+        return snapshot.version
+    return get_data_version()
+
+
+def _snapshot_expired(snapshot):
+    """
+    快照数据从数据库加载是否已经超过 SNAPSHOT_MAX_AGE 秒（增量更新得到的快照按其来源快照的加载时间计算）
+    """
+    return time.time() - snapshot.built_at > SNAPSHOT_MAX_AGE
+
+
+def snapshot_file_changed(snapshot=None):
+    """
+    快照文件是否已被其他进程写入了快照尚未检查过的新代数（只需一次 stat，见 snapshot_store.snapshot_generation）
+
+    参数:
+        snapshot: RecommendModelSnapshot, 要比较的快照，默认为进程内共享的快照
+
+    返回:
+        bool: 未开启快照文件、还没有快照或文件不存在时为False
+    """
+    snapshot = _model_snapshot if snapshot is None else snapshot
+    if not SNAPSHOT_FILE or snapshot is None:
+        return False
+    generation = snapshot_generation()
+    return generation is not None and generation != snapshot.checked_generation
 
 
 class DynamicCourseRecommender:
@@ -30,11 +268,13 @@ class DynamicCourseRecommender:
     3. 推荐相似的学生（志同道合的朋友）
     
     属性:
-        student_course_matrix: 学生-课程评分矩阵（已废弃，每次重新加载）
+        student_course_matrix: 学生-课程评分矩阵（已废弃，由模型快照提供）
         course_student_matrix: 课程-学生矩阵（已废弃）
-        student_similarity_cache: 学生相似度缓存，避免重复计算
-        course_similarity_cache: 课程相似度缓存，避免重复计算
-        last_update_time: 最后更新时间（预留，用于未来优化）
+        model_snapshot: 当前使用的推荐模型快照（进程内共享）
+        student_similarity_cache: 学生相似度缓存，避免重复计算（绑定到模型快照）
+        student_similarity_row_cache: 学生相似度整行缓存（向量化批量计算的结果，绑定到模型快照）
+        course_similarity_cache: 课程相似度缓存，避免重复计算（绑定到模型快照）
+        last_update_time: 当前模型快照的构建时间
     """
     
     def __init__(self):
@@ -45,23 +285,330 @@ class DynamicCourseRecommender:
         """
         self.student_course_matrix = None  # 预留，当前未使用
         self.course_student_matrix = None   # 预留，当前未使用
+        self.model_snapshot = None          # 当前使用的推荐模型快照
         self.student_similarity_cache = {}  # 学生相似度缓存 {(id1, id2): similarity}
+        self.student_similarity_row_cache = SimilarityRowCache()  # 学生相似度整行缓存（LRU）
         self.course_similarity_cache = {}   # 课程相似度缓存 {(id1, id2): similarity}
-        self.last_update_time = None         # 预留，用于未来数据更新检测
+        self.last_update_time = None         # 当前模型快照的构建时间
+        
+    def _get_model_snapshot(self):
+        """
+        获取当前数据版本对应的推荐模型快照
+        
+        如果进程内共享的快照与当前数据版本一致、没有超过最长有效期、并且快照文件没有被其他进程更新，直接复用；
+        否则调用 _refresh_model_snapshot 更新。
+        数据版本只记录本进程内的写入，其他进程写入、直接修改数据库等变化只能靠超过有效期后的完整重建发现。
+        开启后台刷新（set_background_refresh）后，请求直接使用当前快照，更新由后台线程完成。
+        获取快照后，本实例的相似度缓存会绑定到快照上，同一版本的请求之间共享缓存。
+        
+        返回:
+            RecommendModelSnapshot: 当前数据版本的模型快照
+        """
+        snapshot = _model_snapshot
+        if snapshot is None or (not _background_refresh and (
+                snapshot.version != get_data_version() or _snapshot_expired(snapshot)
+                or snapshot_file_changed(snapshot))):
+            snapshot = self._refresh_model_snapshot()
+        
+        self.model_snapshot = snapshot
+        self.student_similarity_cache = snapshot.student_similarity_cache
+        self.student_similarity_row_cache = snapshot.student_similarity_row_cache
+        self.course_similarity_cache = snapshot.course_similarity_cache
+        self.last_update_time = snapshot.built_at
+        return snapshot
+    
+    def _refresh_model_snapshot(self, full_reload=False, prepare=False):
+        """
+        将进程内共享的模型快照更新到当前数据版本
+        
+        加锁后更新：
+        0. 没有后台刷新线程时，快照从数据库加载超过 SNAPSHOT_MAX_AGE 秒后完整重建（开启快照文件时可以映射更新的文件）
+        1. 期间只有CHOOSE表的选课记录变化时，逐条增量应用到评分矩阵（见 _apply_choose_changes）
+        2. 开启快照文件时，如果其他进程写入了新的快照文件，并且文件包含本进程的全部变化，先映射该文件，
+           再应用本进程尚未应用的选课变化；文件不包含本进程的变化时继续使用本进程的快照，不查询数据库
+           （其他进程的变化在快照过期后完整重建时得到）
+        3. 否则完整重建并替换（从数据库加载，或映射快照文件，见 _load_model_snapshot）
+        版本号在加载前读取：加载期间如有新的写入，下一次更新会发现版本不一致并再次更新。
+        新快照构建完成后才替换共享快照，正在使用旧快照的请求不受影响。
+        开启快照文件时，只有从数据库完整重建的快照会立即写回文件（见 _save_snapshot_file）；
+        增量变化保留在进程内存中，由后台刷新线程定期写回（见 _write_back_snapshot_file）。
+        
+        参数:
+            full_reload: bool, 是否强制从数据库完整重建（用于发现其他进程写入的数据）
+            prepare: bool, 是否在替换前预先构建热度表、相似学生索引等按需构建的结构（见 _prepare_snapshot）
+        
+        返回:
+            RecommendModelSnapshot: 更新后的模型快照
+        """
+        global _model_snapshot
+        with _model_snapshot_lock:
+            # 双重检查：等待锁期间其他线程可能已经完成更新
+            snapshot = _model_snapshot
+            if snapshot is None:
+                snapshot = self._load_model_snapshot(get_data_version())
+            elif full_reload:
+                snapshot = self._load_model_snapshot(get_data_version(), use_file=False)
+            elif not _background_refresh and _snapshot_expired(snapshot):
+                snapshot = self._load_model_snapshot(get_data_version())
+            else:
+                version, events = get_choose_changes_since(snapshot.version)
+                if events is not None and snapshot_file_changed(snapshot):
+                    # 其他进程写入了新的快照文件：文件包含本进程的全部变化时映射，否则记下已经检查过该代数
+                    file_snapshot = self._map_snapshot_file(version, covering=snapshot)
+                    if file_snapshot is None:
+                        snapshot.checked_generation = snapshot_generation()
+                    else:
+                        snapshot = file_snapshot
+                if events is None:
+                    snapshot = self._load_model_snapshot(version)
+                elif events:
+                    snapshot = self._apply_choose_changes(snapshot, version, events)
+            if prepare:
+                self._prepare_snapshot(snapshot)
+            if SNAPSHOT_FILE and snapshot.source == 'database' and snapshot is not _model_snapshot:
+                self._save_snapshot_file(snapshot)
+            _model_snapshot = snapshot
+        return snapshot
+    
+    def _write_back_snapshot_file(self):
+        """
+        将进程内快照尚未写回的增量变化写回快照文件（由后台刷新线程按 RECOMMEND_SNAPSHOT_WRITE_INTERVAL 定期调用）
         
+        返回:
+            bool: 是否写入了文件（没有需要写回的变化、文件已被其他进程更新或写入失败时为False）
+        """
+        with _model_snapshot_lock:
+            snapshot = _model_snapshot
+            if not SNAPSHOT_FILE or snapshot is None or not snapshot.unsaved_changes:
+                return False
+            self._save_snapshot_file(snapshot)
+            return not snapshot.unsaved_changes
+    
+    def _load_model_snapshot(self, version, use_file=True):
+        """
+        完整构建一个模型快照
+        
+        开启快照文件（SNAPSHOT_FILE）时，优先映射其他进程写出的快照文件（见 _map_snapshot_file）；
+        文件不可用时从数据库加载。
+        
+        参数:
+            version: int, 快照对应的数据版本号（在加载前读取）
+            use_file: bool, 是否允许映射快照文件（False 时一定从数据库加载）
+        
+        返回:
+            RecommendModelSnapshot: 新的模型快照
+        """
+        if SNAPSHOT_FILE and use_file:
+            snapshot = self._map_snapshot_file(version)
+            if snapshot is not None:
+                return snapshot
+        return RecommendModelSnapshot(version, *self._load_student_course_data())
+    
+    def _map_snapshot_file(self, version, covering=None):
+        """
+        映射快照文件得到模型快照
+        
+        文件需要足够新（从数据库加载不超过 SNAPSHOT_MAX_AGE 秒），并且包含本进程写入的数据：
+        从数据库加载于本进程最近一次写入数据之后，或者是 covering 快照写回文件之后的增量写回
+        （covering 快照还有没写回的变化时，只有前一种文件才包含这些变化）。
+        
+        参数:
+            version: int, 快照对应的数据版本号
+            covering: RecommendModelSnapshot, 可选，本进程当前的快照
+        
+        返回:
+            RecommendModelSnapshot or None: 文件不存在、不够新或读取失败时返回None
+        """
+        descends_from = None
+        if covering is not None and covering.root_generation is not None and not covering.unsaved_changes:
+            descends_from = (covering.root_generation, covering.file_generation)
+        try:
+            snapshot_file = load_fresh_snapshot(
+                max_age=SNAPSHOT_MAX_AGE, not_before=get_data_changed_at(), descends_from=descends_from
+            )
+        except Exception as e:
+            print(f"读取推荐模型快照文件失败，改为从数据库加载: {str(e)}")
+            return None
+        if snapshot_file is None:
+            return None
+        snapshot = RecommendModelSnapshot(version, *snapshot_file.data, source='file')
+        snapshot.built_at = snapshot_file.built_at
+        snapshot.file_generation = snapshot.checked_generation = snapshot_file.generation
+        snapshot.root_generation = snapshot_file.root_generation
+        index = snapshot_file.student_index
+        # 索引参数与当前配置一致时才沿用
+        if index is not None and (index.num_tables, index.num_bits, index.probes) == (
+                LSH_TABLES, LSH_BITS, LSH_PROBES):
+            snapshot.student_index = index
+        print(f"推荐模型快照已从文件映射（第 {snapshot_file.generation} 代）: {snapshot.score_matrix.shape[0]} 个学生，"
+              f"{snapshot.score_matrix.shape[1]} 门课程")
+        return snapshot
+    
+    def _save_snapshot_file(self, snapshot):
+        """
+        将快照写回快照文件，供其他工作进程映射（写入失败不影响本进程使用快照）
+        
+        从数据库完整重建的快照直接写入，成为新的基准代数；增量更新的快照只在文件代数仍是其来源代数时写回，
+        期间其他进程写入了文件时放弃本次写回（变化保留在本进程内存中，下次完整重建时写入），不查询数据库。
+        
+        参数:
+            snapshot: RecommendModelSnapshot, 从数据库加载或增量更新得到的快照（写入后更新其文件代数）
+        """
+        try:
+            if snapshot.source == 'incremental':
+                if snapshot.root_generation is None:
+                    return
+                generation = save_snapshot(snapshot, expected_generation=snapshot.file_generation)
+                if generation is None:
+                    print("推荐模型快照文件已被其他进程更新，本进程的选课变化保留在内存中")
+                    snapshot.checked_generation = snapshot_generation()
+                    return
+            else:
+                generation = save_snapshot(snapshot)
+                snapshot.root_generation = generation
+            snapshot.file_generation = snapshot.checked_generation = generation
+            snapshot.unsaved_changes = False
+        except Exception as e:
+            print(f"写入推荐模型快照文件失败: {str(e)}")
+            # 记下文件当前的代数，避免每个请求都认为文件有变化而重复更新
+            snapshot.checked_generation = snapshot_generation()
+    
+    def _prepare_snapshot(self, snapshot):
+        """
+        预先构建快照上按需构建的结构，使推荐请求不再承担构建开销
+        
+        包括课程热度表、课程容量与上课时间表，以及当前配置用到的相似学生 LSH 索引、课程邻居模型、ALS 因子的对齐结果。
+        """
+        self._get_popularity_table(snapshot)
+        self._get_course_schedule(snapshot)
+        if SIMILAR_STUDENT_SEARCH == 'lsh':
+            self._get_student_index(snapshot)
+        if RECOMMEND_MODE == 'item':
+            self._get_course_neighbors(snapshot)
+        elif RECOMMEND_MODE == 'als':
+            self._get_aligned_als_model(snapshot)
+    
+    def _apply_choose_changes(self, snapshot, version, events):
+        """
+        将CHOOSE表的变化事件增量应用到模型快照
+        
+        每条事件只更新评分矩阵中的一个单元格（学生, 课程），相似度缓存只失效受影响的部分：
+        - 变化学生的整行相似度：直接丢弃，下次使用时重新计算
+        - 其他学生已缓存的整行相似度：与变化学生对应的元素标记为过期，下次读取该行时重新计算
+        - 含有变化学生/课程的逐对相似度缓存：丢弃
+        
+        稀疏评分矩阵生成一份新矩阵（见 CSRScoreMatrix.with_cells）。稠密评分矩阵不在请求路径上整体复制：
+        - 开启后台刷新时由刷新线程复制后再更新（请求不等待刷新线程，仍在读取旧快照的请求不受影响）
+        - 否则在快照锁内原地写入变化的单元格（一次批量赋值），新旧快照共用同一个矩阵；
+          旧快照随即被替换，仍在读取它的请求最多看到本批完整写入后的评分
+        - 映射自快照文件、批量推荐共享文件的矩阵是只读的，第一次增量更新时复制一次，之后原地写入
+        缓存的相似度行不会被修改：两个未变化学生之间的相似度与变化的单元格无关，
+        变化学生对应的元素在新快照中标记为过期后重新计算。
+        事件涉及的学生或课程不在快照中（例如新增学生）时，回退到完整重建。
+        
+        参数:
+            snapshot: RecommendModelSnapshot, 当前模型快照
+            version: int, 应用完事件后的数据版本号
+            events: list of ChooseChange, 按发生顺序排列的变化事件
+        
+        返回:
+            RecommendModelSnapshot: 新的模型快照
+        """
+        event_rows = snapshot.id_to_stu_no.lookup([event.stu_no for event in events])
+        event_cols = snapshot.id_to_course_no.lookup([event.co_no for event in events])
+        
+        # 先检查所有事件都能增量应用，避免只应用一半
+        if np.any(event_rows < 0) or np.any(event_cols < 0):
+            return self._load_model_snapshot(version)
+        
+        # 逐条计算需要更新的单元格
+        cell_updates = []
+        changed_students = set()
+        changed_courses = set()
+        for event, stu_idx, course_idx in zip(events, event_rows.tolist(), event_cols.tolist()):
+            if event.removed:
+                score = 0.0
+            else:
+                classification = snapshot.id_to_course_no.classification(course_idx)
+                score = self._calculate_score(
+                    event.grade, event.comment, snapshot.stu_no_to_major.get(event.stu_no), classification
+                )
+            cell_updates.append((stu_idx, course_idx, score))
+            changed_students.add(stu_idx)
+            changed_courses.add(course_idx)
+        
+        score_matrix = snapshot.score_matrix
+        if isinstance(score_matrix, CSRScoreMatrix):
+            score_matrix = score_matrix.with_cells(cell_updates)
+        else:
+            if _background_refresh or not score_matrix.flags.writeable:
+                score_matrix = score_matrix.copy()
+            # 同一单元格有多条事件时以最后一条为准，合并后一次写入
+            cells = {(stu_idx, course_idx): score for stu_idx, course_idx, score in cell_updates}
+            cell_rows, cell_cols = (np.array(part, dtype=np.int64) for part in zip(*cells))
+            score_matrix[cell_rows, cell_cols] = np.fromiter(cells.values(), dtype=np.float64, count=len(cells))
+        
+        new_snapshot = RecommendModelSnapshot(
+            version, snapshot.id_to_stu_no, snapshot.id_to_course_no, score_matrix,
+            snapshot.stu_no_to_id, snapshot.stu_no_to_major, source='incremental'
+        )
+        # 评分矩阵仍以来源快照从数据库加载的数据为基础；写回快照文件时以来源快照的文件代数为准
+        new_snapshot.built_at = snapshot.built_at
+        new_snapshot.file_generation = snapshot.file_generation
+        new_snapshot.root_generation = snapshot.root_generation
+        new_snapshot.checked_generation = snapshot.checked_generation
+        new_snapshot.unsaved_changes = True
+        # 课程ID不变，对齐好的课程邻居模型可以直接沿用
+        new_snapshot.course_neighbors = snapshot.course_neighbors
+        new_snapshot.als_factors = snapshot.als_factors
+        # 课程容量与上课时间只随 EDUCATION_PLAN 变化（会触发完整重建），直接沿用
+        new_snapshot.course_schedule = snapshot.course_schedule
+        # 相似学生索引：评分变化的学生作为固定候选；变化太多时丢弃，下次查询时重建
+        student_index = snapshot.student_index
+        if student_index is not None:
+            student_index = student_index.with_extra_candidates(changed_students)
+            if len(student_index.extra_ids) > LSH_MAX_STALE_RATIO * student_index.num_students:
+                student_index = None
+        new_snapshot.student_index = student_index
+        # 课程热度表：只重新统计评分变化的课程
+        if snapshot.popularity_table is not None:
+            new_snapshot.popularity_table = snapshot.popularity_table.with_updated_courses(
+                score_matrix, changed_courses
+            )
+        
+        # 整行相似度缓存：丢弃变化学生的行，其他行把变化学生对应的元素标记为过期，读取时再重新计算
+        new_snapshot.student_similarity_row_cache = snapshot.student_similarity_row_cache.carry_over(
+            changed_students
+        )
+        
+        # 逐对相似度缓存：只保留与变化无关的条目
+        new_snapshot.student_similarity_cache = {
+            key: value for key, value in list(snapshot.student_similarity_cache.items())
+            if key[0] not in changed_students and key[1] not in changed_students
+        }
+        new_snapshot.course_similarity_cache = {
+            key: value for key, value in list(snapshot.course_similarity_cache.items())
+            if key[0] not in changed_courses and key[1] not in changed_courses
+        }
+        
+        print(f"推荐模型快照增量更新: {len(events)} 条选课变化，数据版本 {snapshot.version} -> {version}")
+        return new_snapshot
+    
     def _load_student_course_data(self):
         """
         从数据库加载学生-课程数据，构建评分矩阵
         
-        该方法每次调用都会重新从数据库加载数据，确保推荐结果基于最新数据。
+        该方法每次调用都会重新从数据库加载数据，由 _get_model_snapshot 在数据版本变化时调用。
         这是实现"动态推荐"的关键：推荐结果会随着学生选课和评分的变化而更新。
         
         返回:
-            tuple: (id_to_stu_no, id_to_course_no, score_matrix, stu_no_to_id)
-                - id_to_stu_no: dict, 矩阵ID到(学生编号, 学生姓名)的映射
-                - id_to_course_no: dict, 矩阵ID到(课程编号, 课程名称)的映射
-                - score_matrix: numpy.ndarray, 学生-课程评分矩阵，shape=(学生数, 课程数)
-                - stu_no_to_id: dict, 学生编号到矩阵ID的映射
+            tuple: (id_to_stu_no, id_to_course_no, score_matrix, stu_no_to_id, stu_no_to_major)
+                - id_to_stu_no: StudentTable, 矩阵ID到(学生编号, 学生姓名)的映射
+                - id_to_course_no: CourseTable, 矩阵ID到(课程编号, 课程名称, 课程类别, 所属专业)的映射
+                - score_matrix: numpy.ndarray 或 CSRScoreMatrix（启用稀疏存储时），
+                  学生-课程评分矩阵，shape=(学生数, 课程数)
+                - stu_no_to_id: Mapping, 学生编号到矩阵ID的映射（id_to_stu_no.by_stu_no）
+                - stu_no_to_major: Mapping, 学生编号到专业的映射（id_to_stu_no.major_by_stu_no）
         """
         # 步骤1: 获取所有学生信息（排除管理员账号）
         sql = "SELECT STU_NO, NAME, MAJOR, AD_YEAR FROM STUDENT WHERE STU_NO<>'admin'"
@@ -72,56 +619,56 @@ class DynamicCourseRecommender:
         sql = "SELECT CO_NO, CO_NAME, CLASSIFICATION, MAJOR FROM EDUCATION_PLAN"
         courses = query(sql)
         
-        # 步骤3: 构建双向映射关系
-        # 学生编号 -> 矩阵ID（用于快速查找）
-        stu_no_to_id = {}
-        # 矩阵ID -> (学生编号, 学生姓名)（用于结果返回）
-        id_to_stu_no = {}
-        # 课程编号 -> 矩阵ID（用于快速查找）
-        course_no_to_id = {}
-        # 矩阵ID -> (课程编号, 课程名称)（用于结果返回）
-        id_to_course_no = {}
-        
-        # 建立学生映射：为每个学生分配一个矩阵索引
-        for idx, (stu_no, name, major, ad_year) in enumerate(students):
-            stu_no_to_id[stu_no] = idx
-            id_to_stu_no[idx] = (stu_no, name)
-        
-        # 建立课程映射：为每门课程分配一个矩阵索引
-        # 保存的信息为 (课程号, 课程名, 课程类别, 所属专业)
-        for idx, (co_no, co_name, classification, major) in enumerate(courses):
-            course_no_to_id[co_no] = idx
-            id_to_course_no[idx] = (co_no, co_name, classification, major)
-        
-        # 步骤4: 初始化评分矩阵（全零矩阵）
+        # 步骤3: 构建学生、课程信息表（按矩阵ID排列的并行数组，见 utils/id_maps.py）
+        # 学生信息表：矩阵ID -> (学生编号, 学生姓名)，by_stu_no 为学生编号 -> 矩阵ID，
+        # major_by_stu_no 为学生编号 -> 专业（用于冷启动推荐，避免再次查询数据库）
+        student_columns = tuple(zip(*students)) if students else ((), (), (), ())
+        id_to_stu_no = StudentTable(student_columns[0], student_columns[1], student_columns[2])
+        stu_no_to_id = id_to_stu_no.by_stu_no
+        stu_no_to_major = id_to_stu_no.major_by_stu_no
+        
+        # 课程信息表：矩阵ID -> (课程号, 课程名, 课程类别, 所属专业)，并预先计算"专业选修"课程掩码
+        course_columns = tuple(zip(*courses)) if courses else ((), (), (), ())
+        id_to_course_no = CourseTable(*course_columns)
+        
+        # 步骤4: 初始化评分矩阵（稠密存储时为全零矩阵，稀疏存储时由非零元素直接构建）
         num_students = len(students)
         num_courses = len(courses)
-        score_matrix = np.zeros((num_students, num_courses))
-        
-        # 步骤5: 从CHOOSE表加载选课和成绩数据，填充评分矩阵
-        sql = """
-            SELECT c.STU_NO, c.CO_NO, c.GRADE, c.COMMENT, 
-                   s.MAJOR, s.AD_YEAR, e.CLASSIFICATION
-            FROM CHOOSE c
-            JOIN STUDENT s ON c.STU_NO = s.STU_NO
-            JOIN EDUCATION_PLAN e ON c.CO_NO = e.CO_NO
-            WHERE c.STU_NO <> 'admin'
-        """
-        choose_data = query(sql)
-        
-        # 遍历选课记录，计算并填充评分
-        for row in choose_data:
-            stu_no, co_no, grade, comment, major, ad_year, classification = row
-            # 确保学生和课程都在映射中（数据一致性检查）
-            if stu_no in stu_no_to_id and co_no in course_no_to_id:
-                stu_idx = stu_no_to_id[stu_no]
-                course_idx = course_no_to_id[co_no]
-                
-                # 计算综合评分：综合考虑成绩、评价等因素
-                score = self._calculate_score(grade, comment, major, classification)
-                score_matrix[stu_idx][course_idx] = score
-        
-        return (id_to_stu_no, id_to_course_no, score_matrix, stu_no_to_id)
+        if not SPARSE_SCORE_MATRIX:
+            score_matrix = np.zeros((num_students, num_courses))
+        
+        # 步骤5: 从CHOOSE表流式加载选课和成绩数据
+        # 评分只取决于成绩和评价（专业、课程类别在 _calculate_score 中为预留参数），
+        # 学生和课程是否存在由映射检查，因此不需要关联 STUDENT / EDUCATION_PLAN 表
+        # 选课记录可能很多，逐批读取并立即转换为数组，不在内存中保存全部结果行
+        sql = "SELECT STU_NO, CO_NO, GRADE, COMMENT FROM CHOOSE WHERE STU_NO <> 'admin'"
+        row_parts, col_parts, value_parts = [], [], []
+        for choose_batch in stream(sql, batches=True):
+            stu_nos, co_nos, grades, comments = zip(*choose_batch)
+            
+            # 步骤6: 编号批量映射为矩阵ID（-1 表示不在信息表中，数据一致性检查）
+            batch_rows = id_to_stu_no.lookup(stu_nos)
+            batch_cols = id_to_course_no.lookup(co_nos)
+            
+            # 步骤7: 批量计算综合评分
+            batch_values = self._calculate_scores(grades, comments)
+            valid = (batch_rows >= 0) & (batch_cols >= 0)
+            row_parts.append(batch_rows[valid])
+            col_parts.append(batch_cols[valid])
+            value_parts.append(batch_values[valid])
+        
+        # 所有批次的评分一次性写入评分矩阵
+        cell_rows = np.concatenate(row_parts) if row_parts else np.zeros(0, dtype=np.int64)
+        cell_cols = np.concatenate(col_parts) if col_parts else np.zeros(0, dtype=np.int64)
+        cell_values = np.concatenate(value_parts) if value_parts else np.zeros(0)
+        if SPARSE_SCORE_MATRIX:
+            score_matrix = CSRScoreMatrix.from_coo(
+                cell_rows, cell_cols, cell_values, (num_students, num_courses)
+            )
+        else:
+            score_matrix[cell_rows, cell_cols] = cell_values
+        
+        return (id_to_stu_no, id_to_course_no, score_matrix, stu_no_to_id, stu_no_to_major)
     
     def _calculate_score(self, grade, comment, student_major, course_classification):
         """
@@ -145,33 +692,11 @@ class DynamicCourseRecommender:
         
         # 因素1: 成绩因素（0-100分转换为0-3分）
         # 成绩越高，说明学生越喜欢或适合这门课程
-        if grade is not None:
-            try:
-                grade_float = float(grade)
-                if grade_float >= 90:      # 优秀：3.0分
-                    score += 3.0
-                elif grade_float >= 80:   # 良好：2.5分
-                    score += 2.5
-                elif grade_float >= 70:   # 中等：2.0分
-                    score += 2.0
-                elif grade_float >= 60:    # 及格：1.5分
-                    score += 1.5
-                else:                     # 不及格：1.0分
-                    score += 1.0
-            except (ValueError, TypeError):
-                # 成绩格式错误，忽略
-                pass
+        score += self._grade_points(grade)
         
         # 因素2: 评价因素（COMMENT字段，0-5分转换为0-2分）
         # 学生的主观评价，反映对课程的满意度
-        if comment is not None:
-            try:
-                comment_int = int(comment)
-                # 线性映射：0-5分 -> 0-2分
-                score += comment_int * 0.4
-            except (ValueError, TypeError):
-                # 评价格式错误，忽略
-                pass
+        score += self._comment_points(comment)
         
         # 因素3: 默认评分（如果没有任何数据）
         # 表示学生选过这门课，但未提供成绩或评价
@@ -181,6 +706,113 @@ class DynamicCourseRecommender:
         # 限制评分范围在0-5分之间
         return min(score, 5.0)
     
+    def _grade_points(self, grade):
+        """
+        成绩因素：0-100分的成绩转换为1-3分，没有成绩或格式错误时为0分
+        """
+        if grade is None:
+            return 0.0
+        try:
+            grade_float = float(grade)
+        except (ValueError, TypeError):
+            # 成绩格式错误，忽略
+            return 0.0
+        if grade_float >= 90:      # 优秀：3.0分
+            return 3.0
+        elif grade_float >= 80:   # 良好：2.5分
+            return 2.5
+        elif grade_float >= 70:   # 中等：2.0分
+            return 2.0
+        elif grade_float >= 60:    # 及格：1.5分
+            return 1.5
+        else:                     # 不及格：1.0分
+            return 1.0
+    
+    def _comment_points(self, comment):
+        """
+        评价因素：0-5分的评价线性映射为0-2分，没有评价或格式错误时为0分
+        """
+        if comment is None:
+            return 0.0
+        try:
+            comment_int = int(comment)
+        except (ValueError, TypeError):
+            # 评价格式错误，忽略
+            return 0.0
+        return comment_int * 0.4
+    
+    def _calculate_scores(self, grades, comments):
+        """
+        批量计算评分（列式版本），结果与逐条调用 _calculate_score 完全一致
+        
+        成绩、评价的取值种类很少（成绩是一位小数，评价是0-5分），
+        因此每种取值只解析一次，再按取值编号把分值展开到所有记录上，评分的组合、默认值和上限都是数组运算。
+        
+        参数:
+            grades: 成绩(GRADE)列
+            comments: 评价(COMMENT)列
+        
+        返回:
+            numpy.ndarray: 每条选课记录的综合评分
+        """
+        grade_points = self._column_points(grades, self._grade_points)
+        comment_points = self._column_points(comments, self._comment_points)
+        
+        # 与 _calculate_score 相同的累加顺序：0.0 + 成绩分 + 评价分
+        scores = 0.0 + grade_points + comment_points
+        scores[scores == 0] = 2.0
+        return np.minimum(scores, 5.0)
+    
+    def _column_points(self, values, to_points):
+        """
+        将一列原始值转换为分值数组：每种不同的取值只调用一次 to_points
+        """
+        distinct = {value: code for code, value in enumerate(dict.fromkeys(values))}
+        points = np.array([to_points(value) for value in distinct], dtype=float)
+        codes = np.fromiter(map(distinct.__getitem__, values), dtype=np.int64, count=len(values))
+        return points[codes]
+    
+    def _student_vector(self, score_matrix, student_id):
+        """
+        获取学生对所有课程的评分向量（稠密向量，兼容稀疏评分矩阵）
+        """
+        if isinstance(score_matrix, CSRScoreMatrix):
+            return score_matrix.row(student_id)
+        return score_matrix[student_id]
+    
+    def _course_vector(self, score_matrix, course_id):
+        """
+        获取所有学生对某门课程的评分向量（稠密向量，兼容稀疏评分矩阵）
+        """
+        if isinstance(score_matrix, CSRScoreMatrix):
+            return score_matrix.column(course_id)
+        return score_matrix[:, course_id]
+    
+    def _get_course_schedule(self, snapshot):
+        """
+        获取快照上的课程容量与上课时间表（首次使用时查询一次 EDUCATION_PLAN，之后每个快照只查询一次）
+        
+        返回:
+            CourseScheduleTable: 每门课程的选课人数上限、上课时间和起止日期
+        """
+        if snapshot.course_schedule is None:
+            sql = "SELECT CO_NO, MAX_STUDENTS, CLASS_TIME, START_TIME, END_TIME FROM EDUCATION_PLAN"
+            snapshot.course_schedule = CourseScheduleTable(query(sql), snapshot.id_to_course_no)
+        return snapshot.course_schedule
+    
+    def _get_popularity_table(self, snapshot):
+        """
+        获取快照上的课程热度表（首次使用时构建，之后每个快照只统计一次）
+        
+        返回:
+            CoursePopularityTable: 全体及各专业的选课人数、平均评分
+        """
+        if snapshot.popularity_table is None:
+            snapshot.popularity_table = CoursePopularityTable(
+                snapshot.score_matrix, snapshot.id_to_stu_no, snapshot.id_to_course_no
+            )
+        return snapshot.popularity_table
+    
     def _cosine_similarity(self, vec1, vec2):
         """
         计算两个向量的余弦相似度
@@ -264,6 +896,147 @@ class DynamicCourseRecommender:
         # 步骤6: 返回皮尔逊相关系数
         return numerator / denominator
     
+    def _pearson_correlation_row(self, student_id, score_matrix, candidate_ids=None):
+        """
+        批量计算目标学生与所有学生（或部分候选学生）的皮尔逊相关系数（向量化版本）
+        
+        结果与逐对调用 _pearson_correlation 一致（包括共同评分项少于2个时的规则），
+        但整行相似度由几次矩阵运算一次性得到，不再在Python循环中逐对计算。
+        
+        算法流程：
+        1. 构建共同评分掩码：mask[j, k] = 目标学生和学生j都评过课程k
+        2. 按每一对学生各自的共同评分项求均值，得到两个中心化矩阵
+        3. 按行求协方差（分子）和标准差乘积（分母）
+        
+        参数:
+            student_id: int, 目标学生的矩阵ID
+            score_matrix: numpy.ndarray, 学生-课程评分矩阵
+            candidate_ids: numpy.ndarray or None, 只计算这些学生的相似度；None表示所有学生
+        
+        返回:
+            numpy.ndarray: shape=(学生数,)，第j个元素为目标学生与学生j的相似度
+                （包含目标学生与自己的相似度，调用方需自行跳过）；
+                指定candidate_ids时shape=(候选数,)，与candidate_ids一一对应
+        """
+        if isinstance(score_matrix, CSRScoreMatrix):
+            return self._pearson_correlation_row_sparse(student_id, score_matrix, candidate_ids)
+        
+        target_vector = score_matrix[student_id]
+        if candidate_ids is not None:
+            score_matrix = score_matrix[candidate_ids]
+        
+        # 步骤1: 共同评分掩码及每一对学生的共同评分项数量
+        mask = (score_matrix != 0) & (target_vector != 0)
+        common_count = np.sum(mask, axis=1)
+        safe_count = np.maximum(common_count, 1)  # 避免除0，数量不足的行最后单独处理
+        
+        # 步骤2: 计算每一对学生在共同评分项上的均值，并中心化
+        mean_target = np.sum(np.where(mask, target_vector, 0.0), axis=1) / safe_count
+        mean_others = np.sum(np.where(mask, score_matrix, 0.0), axis=1) / safe_count
+        target_centered = np.where(mask, target_vector - mean_target[:, np.newaxis], 0.0)
+        others_centered = np.where(mask, score_matrix - mean_others[:, np.newaxis], 0.0)
+        
+        # 步骤3: 按行计算协方差（分子）和标准差乘积（分母）
+        numerator = np.sum(target_centered * others_centered, axis=1)
+        denominator = np.sqrt(
+            np.sum(target_centered ** 2, axis=1) *
+            np.sum(others_centered ** 2, axis=1)
+        )
+        
+        # 步骤4: 与 _pearson_correlation 相同的规则
+        # 共同评分项>=2且分母非0时取相关系数；共同评分项为1时取0.1；其余为0
+        similarities = np.zeros(score_matrix.shape[0])
+        valid = (common_count >= 2) & (denominator != 0)
+        similarities[valid] = numerator[valid] / denominator[valid]
+        similarities[common_count == 1] = 0.1
+        return similarities
+    
+    def _pearson_correlation_row_sparse(self, student_id, score_matrix, candidate_ids=None):
+        """
+        稀疏评分矩阵上的整行皮尔逊相关系数（结果与 _pearson_correlation_row 一致）
+        
+        只取出目标学生选过的课程所在列的非零元素，这些元素正好是所有共同评分项。
+        按学生编号分组求和（np.bincount）即可得到每一对学生的均值、协方差和方差，
+        计算量与这些列的选课记录数成正比。指定候选学生时只保留候选学生的共同评分项，
+        结果数组的长度为候选数而不是学生数。
+        
+        参数:
+            student_id: int, 目标学生的矩阵ID
+            score_matrix: CSRScoreMatrix, 稀疏学生-课程评分矩阵
+            candidate_ids: numpy.ndarray or None, 只计算这些学生的相似度；None表示所有学生
+        
+        返回:
+            numpy.ndarray: shape=(学生数,)，目标学生与每个学生的相似度；
+                指定candidate_ids时shape=(候选数,)，与candidate_ids一一对应
+        """
+        target_vector = score_matrix.row(student_id)
+        target_courses = np.nonzero(target_vector)[0]
+        
+        # 步骤1: 共同评分项，other_ids[k]为学生编号（指定候选时为候选中的位置），target_values/other_values为双方评分
+        other_ids, local_ids, other_values = score_matrix.column_entries(target_courses)
+        if candidate_ids is None:
+            num_students = score_matrix.shape[0]
+        else:
+            candidate_ids = np.asarray(candidate_ids, dtype=np.int64)
+            num_students = len(candidate_ids)
+            if num_students == 0:
+                return np.zeros(0)
+            # 按学生编号查找在候选中的位置，丢弃非候选学生的评分项
+            order = np.argsort(candidate_ids, kind='stable')
+            sorted_ids = candidate_ids[order]
+            positions = np.minimum(np.searchsorted(sorted_ids, other_ids), num_students - 1)
+            keep = sorted_ids[positions] == other_ids
+            other_ids, local_ids, other_values = order[positions[keep]], local_ids[keep], other_values[keep]
+        target_values = target_vector[target_courses][local_ids]
+        common_count = np.bincount(other_ids, minlength=num_students)
+        safe_count = np.maximum(common_count, 1)
+        
+        # 步骤2: 每一对学生在共同评分项上的均值，并中心化
+        mean_target = np.bincount(other_ids, weights=target_values, minlength=num_students) / safe_count
+        mean_others = np.bincount(other_ids, weights=other_values, minlength=num_students) / safe_count
+        target_centered = target_values - mean_target[other_ids]
+        others_centered = other_values - mean_others[other_ids]
+        
+        # 步骤3: 协方差（分子）和标准差乘积（分母）
+        numerator = np.bincount(other_ids, weights=target_centered * others_centered, minlength=num_students)
+        denominator = np.sqrt(
+            np.bincount(other_ids, weights=target_centered ** 2, minlength=num_students) *
+            np.bincount(other_ids, weights=others_centered ** 2, minlength=num_students)
+        )
+        
+        # 步骤4: 与 _pearson_correlation 相同的规则
+        similarities = np.zeros(num_students)
+        valid = (common_count >= 2) & (denominator != 0)
+        similarities[valid] = numerator[valid] / denominator[valid]
+        similarities[common_count == 1] = 0.1
+        return similarities
+    
+    def _get_student_similarity_row(self, student_id, score_matrix):
+        """
+        获取目标学生与所有学生的相似度（整行，带缓存）
+        
+        缓存的行中有过期元素（增量更新后评分变化的学生）时，只对这些学生重新计算一次并写回缓存。
+        
+        参数:
+            student_id: int, 目标学生的矩阵ID
+            score_matrix: numpy.ndarray, 学生-课程评分矩阵
+        
+        返回:
+            numpy.ndarray: shape=(学生数,)，目标学生与每个学生的皮尔逊相似度
+        """
+        cached = self.student_similarity_row_cache.get(student_id)
+        if cached is None:
+            similarity_row = self._pearson_correlation_row(student_id, score_matrix)
+        else:
+            similarity_row, stale_ids = cached
+            if len(stale_ids) == 0:
+                return similarity_row
+            # 复制后再修补：旧快照的缓存可能仍在使用这一行
+            similarity_row = similarity_row.copy()
+            similarity_row[stale_ids] = self._pearson_correlation_row(student_id, score_matrix, stale_ids)
+        self.student_similarity_row_cache.put(student_id, similarity_row)
+        return similarity_row
+    
     def _get_student_similarity(self, student_id1, student_id2, score_matrix):
         """
         计算两个学生的相似度（带缓存）
@@ -286,9 +1059,15 @@ class DynamicCourseRecommender:
         if cache_key in self.student_similarity_cache:
             return self.student_similarity_cache[cache_key]
         
+        # 如果任一学生的整行相似度已批量计算过（且对应元素没有过期），直接取对应元素
+        for row_id, other_id in ((student_id1, student_id2), (student_id2, student_id1)):
+            cached = self.student_similarity_row_cache.get(row_id)
+            if cached is not None and other_id not in cached[1]:
+                return cached[0][other_id]
+        
         # 获取两个学生的评分向量
-        vec1 = score_matrix[student_id1]  # 学生1对所有课程的评分
-        vec2 = score_matrix[student_id2]  # 学生2对所有课程的评分
+        vec1 = self._student_vector(score_matrix, student_id1)  # 学生1对所有课程的评分
+        vec2 = self._student_vector(score_matrix, student_id2)  # 学生2对所有课程的评分
         
         # 使用皮尔逊相关系数计算相似度
         # 皮尔逊相关系数考虑了评分基准的差异，更适合学生相似度计算
@@ -298,6 +1077,154 @@ class DynamicCourseRecommender:
         self.student_similarity_cache[cache_key] = similarity
         return similarity
     
+    def _predict_course_scores(self, student_id, score_matrix, course_ids, similarity_row):
+        """
+        批量预测目标学生对候选课程的评分（矩阵运算版本）
+        
+        预测评分 = Σ(相似度 × 评分) / Σ相似度，只统计选过该课程且相似度为正的学生。
+        分子、分母分别是"正相似度向量"与候选课程评分矩阵、选课掩码矩阵的向量-矩阵乘积，
+        所有候选课程一次算完；稀疏评分矩阵上则按课程对候选列的非零元素分组求和。
+        
+        回退规则与逐课程计算时一致：
+        - 没有人选过的课程：给基础评分3.0分
+        - 没有正相似度的选课学生：使用所有选课学生的平均分
+        
+        参数:
+            student_id: int, 目标学生的矩阵ID
+            score_matrix: numpy.ndarray 或 CSRScoreMatrix, 学生-课程评分矩阵
+            course_ids: list, 候选课程ID列表
+            similarity_row: numpy.ndarray, 目标学生与所有学生的相似度
+        
+        返回:
+            list: (course_id, predicted_score) 元组列表，顺序与course_ids一致
+        """
+        course_ids = np.asarray(course_ids, dtype=int)
+        if len(course_ids) == 0:
+            return []
+        
+        # 只考虑正相似度，并跳过自己
+        weights = np.where(similarity_row > 0, similarity_row, 0.0)
+        weights[student_id] = 0.0
+        
+        if isinstance(score_matrix, CSRScoreMatrix):
+            # 候选课程列中的非零元素，按课程分组求和
+            num_candidates = len(course_ids)
+            other_ids, local_ids, ratings = score_matrix.column_entries(course_ids)
+            rated = (ratings > 0).astype(float)
+            ratings = ratings * rated
+            weighted_sum = np.bincount(local_ids, weights=weights[other_ids] * ratings, minlength=num_candidates)
+            similarity_sum = np.bincount(local_ids, weights=weights[other_ids] * rated, minlength=num_candidates)
+            rated_count = np.bincount(local_ids, weights=rated, minlength=num_candidates)
+            rating_sum = np.bincount(local_ids, weights=ratings, minlength=num_candidates)
+        else:
+            # 候选课程的评分子矩阵及选课掩码，shape=(学生数, 候选课程数)
+            candidate_scores = score_matrix[:, course_ids]
+            rated = (candidate_scores > 0).astype(float)
+            candidate_scores = candidate_scores * rated
+            
+            # 加权评分总和与相似度总和（用于归一化）
+            weighted_sum = weights @ candidate_scores
+            similarity_sum = weights @ rated
+            rated_count = rated.sum(axis=0)
+            rating_sum = candidate_scores.sum(axis=0)
+        
+        return self._finalize_predictions(course_ids, weighted_sum, similarity_sum, rated_count, rating_sum)
+    
+    def _predict_course_scores_item_based(self, student_id, score_matrix, course_ids, course_neighbors):
+        """
+        基于课程相似邻居批量预测目标学生对候选课程的评分
+        
+        预测评分 = Σ(相似度(j, c) × 学生对j的评分) / Σ相似度(j, c)，j 为学生评过分且 c 在其邻居列表中的课程；
+        只需对学生评过分的课程查表累加，不需要计算学生之间的相似度。回退规则与 _predict_course_scores 一致。
+        
+        参数:
+            student_id: int, 目标学生的矩阵ID
+            score_matrix: numpy.ndarray 或 CSRScoreMatrix, 学生-课程评分矩阵
+            course_ids: list, 候选课程ID列表
+            course_neighbors: tuple, (neighbor_ids, neighbor_sims)，对齐到当前课程ID的课程邻居
+        
+        返回:
+            list: (course_id, predicted_score) 元组列表，顺序与course_ids一致
+        """
+        course_ids = np.asarray(course_ids, dtype=int)
+        if len(course_ids) == 0:
+            return []
+        
+        neighbor_ids, neighbor_sims = course_neighbors
+        weighted_sum, similarity_sum = score_courses(
+            neighbor_ids, neighbor_sims, self._student_vector(score_matrix, student_id), course_ids
+        )
+        
+        # 回退值需要的选课人数与评分总和
+        if isinstance(score_matrix, CSRScoreMatrix):
+            _, local_ids, ratings = score_matrix.column_entries(course_ids)
+            ratings = np.where(ratings > 0, ratings, 0.0)
+            rated_count = np.bincount(local_ids, weights=(ratings > 0).astype(float), minlength=len(course_ids))
+            rating_sum = np.bincount(local_ids, weights=ratings, minlength=len(course_ids))
+        else:
+            candidate_scores = score_matrix[:, course_ids]
+            candidate_scores = np.where(candidate_scores > 0, candidate_scores, 0.0)
+            rated_count = (candidate_scores > 0).sum(axis=0)
+            rating_sum = candidate_scores.sum(axis=0)
+        
+        return self._finalize_predictions(course_ids, weighted_sum, similarity_sum, rated_count, rating_sum)
+    
+    def _predict_course_scores_als(self, student_id, score_matrix, course_ids, als_factors):
+        """
+        基于ALS矩阵分解批量预测目标学生对候选课程的评分：学生因子向量与候选课程因子矩阵的一次点积
+        
+        训练之后才有人选的新课程没有因子，与其他模式一致给基础评分3.0分。
+        
+        参数:
+            student_id: int, 目标学生的矩阵ID
+            score_matrix: numpy.ndarray 或 CSRScoreMatrix, 学生-课程评分矩阵
+            course_ids: list, 候选课程ID列表
+            als_factors: tuple, (学生因子向量, 课程因子矩阵, 已知课程掩码)，对齐到当前ID
+        
+        返回:
+            list: (course_id, predicted_score) 元组列表，顺序与course_ids一致
+        """
+        course_ids = np.asarray(course_ids, dtype=int)
+        if len(course_ids) == 0:
+            return []
+        
+        student_factor, course_factors, known_courses = als_factors
+        predicted = course_factors[course_ids] @ student_factor
+        predicted[~known_courses[course_ids]] = 3.0
+        
+        return [
+            (int(course_id), float(score))
+            for course_id, score in zip(course_ids, predicted)
+            if score > 0
+        ]
+    
+    def _finalize_predictions(self, course_ids, weighted_sum, similarity_sum, rated_count, rating_sum):
+        """
+        由加权评分总和、相似度总和得到预测评分，并应用回退规则
+        
+        - 相似度总和为正：加权评分总和 / 相似度总和
+        - 否则使用所有选课学生的平均分；没有人选过的课程给基础评分3.0分
+        
+        返回:
+            list: (course_id, predicted_score) 元组列表，只保留正的预测评分
+        """
+        # 回退值：所有选课学生的平均分
+        avg_rating = rating_sum / np.maximum(rated_count, 1)
+        
+        predicted = np.where(
+            similarity_sum > 0,
+            weighted_sum / np.where(similarity_sum > 0, similarity_sum, 1.0),
+            avg_rating
+        )
+        # 没有人选过的新课程给基础评分（3.0分），确保它们能被推荐
+        predicted[rated_count == 0] = 3.0
+        
+        return [
+            (int(course_id), float(score))
+            for course_id, score in zip(course_ids, predicted)
+            if score > 0
+        ]
+    
     def _get_course_similarity(self, course_id1, course_id2, score_matrix):
         """
         计算两个课程的相似度（带缓存）
@@ -321,8 +1248,8 @@ class DynamicCourseRecommender:
             return self.course_similarity_cache[cache_key]
         
         # 获取两门课程的评分向量（所有学生对该课程的评分）
-        vec1 = score_matrix[:, course_id1]  # 所有学生对课程1的评分
-        vec2 = score_matrix[:, course_id2]  # 所有学生对课程2的评分
+        vec1 = self._course_vector(score_matrix, course_id1)  # 所有学生对课程1的评分
+        vec2 = self._course_vector(score_matrix, course_id2)  # 所有学生对课程2的评分
         
         # 使用余弦相似度计算相似度
         # 余弦相似度适合计算课程相似度（基于选课模式）
@@ -332,6 +1259,58 @@ class DynamicCourseRecommender:
         self.course_similarity_cache[cache_key] = similarity
         return similarity
     
+    def _get_course_neighbors(self, snapshot):
+        """
+        获取对齐到快照课程ID的课程邻居模型
+        
+        模型文件由 python -m utils.item_recommend 离线生成；每个快照只对齐一次，
+        模型文件重建后自动重新对齐。
+        
+        返回:
+            tuple or None: (neighbor_ids, neighbor_sims)，模型文件不存在时返回None
+        """
+        model = get_course_neighbor_model()
+        if model is None:
+            return None
+        cached = snapshot.course_neighbors
+        if cached is None or cached[0] is not model:
+            cached = (model,) + model.align(snapshot.id_to_course_no)
+            snapshot.course_neighbors = cached
+        return cached[1], cached[2]
+    
+    def _get_als_factors(self, snapshot, student_id):
+        """
+        获取目标学生对齐到快照ID的ALS因子
+        
+        模型文件由 python -m utils.als_recommend 离线训练；每个快照只对齐一次，模型文件重新训练后自动重新对齐。
+        
+        返回:
+            tuple or None: (学生因子向量, 课程因子矩阵, 已知课程掩码)；模型文件不存在或学生不在模型中时返回None
+        """
+        cached = self._get_aligned_als_model(snapshot)
+        if cached is None:
+            return None
+        _, student_factors, known_students, course_factors, known_courses = cached
+        if not known_students[student_id]:
+            return None
+        return student_factors[student_id], course_factors, known_courses
+    
+    def _get_aligned_als_model(self, snapshot):
+        """
+        获取对齐到快照学生ID、课程ID的ALS模型（每个快照只对齐一次）
+        
+        返回:
+            tuple or None: (模型, 学生因子, 已知学生, 课程因子, 已知课程)，模型文件不存在时返回None
+        """
+        model = get_als_model()
+        if model is None:
+            return None
+        cached = snapshot.als_factors
+        if cached is None or cached[0] is not model:
+            cached = (model,) + model.align(snapshot.id_to_stu_no, snapshot.id_to_course_no)
+            snapshot.als_factors = cached
+        return cached
+    
     def _cold_start_recommend(self, stu_no, student_major, id_to_course_no, score_matrix, unrated_courses, top_n=20):
         """
         冷启动推荐：为新同学推荐该专业下的热门课程
@@ -345,7 +1324,7 @@ class DynamicCourseRecommender:
         参数:
             stu_no: str, 学生编号
             student_major: str, 学生专业
-            id_to_course_no: dict, 课程ID到(课程编号, 课程名称)的映射
+            id_to_course_no: CourseTable, 课程信息表（课程ID到(课程编号, 课程名称, 课程类别, 所属专业)的映射）
             score_matrix: numpy.ndarray, 学生-课程评分矩阵
             unrated_courses: numpy.ndarray, 学生未选过的课程ID列表
             top_n: int, 推荐课程数量，默认20门
@@ -357,77 +1336,36 @@ class DynamicCourseRecommender:
         """
         print(f"检测到冷启动情况，为学生 {stu_no} (专业: {student_major}) 推荐热门课程")
         
-        # 步骤1: 查询该专业下的所有课程
+        # 步骤1-2: 从快照的课程热度表中查出该专业下的所有课程和每门课程的选课人数
         # 注意：也包含通用课程（MAJOR为空或NULL的课程）
-        sql = f"""
-            SELECT CO_NO, CO_NAME 
-            FROM EDUCATION_PLAN 
-            WHERE MAJOR = '{student_major}' OR MAJOR = '' OR MAJOR IS NULL
-        """
-        major_courses = query(sql)
+        popularity_table = self._get_popularity_table(self.model_snapshot)
+        is_major_course_mask = popularity_table.major_course_mask(student_major)
+        course_popularity = popularity_table.popularity
         
-        # 步骤2: 构建专业课程编号集合（用于快速判断课程是否属于该专业）
-        major_course_nos = {row[0] for row in major_courses} if major_courses else set()
+        # 步骤3: 用课程信息表的掩码筛选所有未选的专业选修课程（包含"专业选修-XXX"这类前缀）
+        unrated_courses = np.asarray(unrated_courses, dtype=np.int64)
+        candidates = unrated_courses[id_to_course_no.elective_mask[unrated_courses]]
         
-        # 步骤3: 筛选所有未选的专业选修课程
-        prof_elective_candidates = []
-        for course_id in unrated_courses:
-            if course_id in id_to_course_no:
-                co_no, co_name, classification, major = id_to_course_no[course_id]
-                
-                # 只考虑"专业选修"类课程（包含"专业选修-XXX"这类前缀）
-                if classification and str(classification).startswith("专业选修"):
-                    # 统计选过这门课的学生数量（评分矩阵中非零元素的数量）
-                    students_count = np.sum(score_matrix[:, course_id] > 0)
-                    is_major_course = co_no in major_course_nos
-                    
-                    prof_elective_candidates.append({
-                        'course_id': course_id,
-                        'co_no': co_no,
-                        'co_name': co_name,
-                        'students_count': students_count,
-                        'is_major_course': is_major_course
-                    })
-        
-        print(f"调试信息 - 冷启动推荐: 找到 {len(prof_elective_candidates)} 门专业选修候选课程")
+        print(f"调试信息 - 冷启动推荐: 找到 {len(candidates)} 门专业选修候选课程")
         
         # 如果没有找到任何专业选修课程，尝试推荐所有未选课程（放宽限制）
-        if not prof_elective_candidates:
+        if len(candidates) == 0:
             print(f"警告: 未找到专业选修课程，尝试推荐所有未选课程")
-            for course_id in unrated_courses:
-                if course_id in id_to_course_no:
-                    co_no, co_name, classification, major = id_to_course_no[course_id]
-                    # 排除必修课程，只推荐选修类课程
-                    if classification and ("选修" in str(classification) or "任选" in str(classification)):
-                        students_count = np.sum(score_matrix[:, course_id] > 0)
-                        is_major_course = co_no in major_course_nos
-                        prof_elective_candidates.append({
-                            'course_id': course_id,
-                            'co_no': co_no,
-                            'co_name': co_name,
-                            'students_count': students_count,
-                            'is_major_course': is_major_course
-                        })
-        
-        # 步骤4: 将课程分为两类：专业课程和其他课程
-        major_course_scores = []  # 专业课程列表
-        other_course_scores = []  # 其他课程列表
-        
-        for candidate in prof_elective_candidates:
-            # 热度评分 = 选课人数（基础热度）+ 基础分（确保即使没有选课数据也有评分）
-            popularity_score = float(candidate['students_count']) + 1.0  # 加1分基础分，避免0分
-            
-            if candidate['is_major_course']:
-                # 专业课程额外加分（+10分），提高专业课程优先级
-                popularity_score += 10.0
-                major_course_scores.append((candidate['course_id'], popularity_score))
-            else:
-                # 非专业课程，仅使用基础热度
-                other_course_scores.append((candidate['course_id'], popularity_score))
+            # 排除必修课程，只推荐选修类课程
+            candidates = unrated_courses[id_to_course_no.optional_mask[unrated_courses]]
+        
+        # 步骤4: 计算热度评分并将课程分为两类：专业课程和其他课程
+        # 热度评分 = 选课人数（基础热度）+ 基础分1分（确保即使没有选课数据也有评分），专业课程额外加10分
+        is_major_candidate = is_major_course_mask[candidates]
+        popularity_scores = course_popularity[candidates].astype(float) + 1.0 + 10.0 * is_major_candidate
         
-        # 步骤5: 分别对两类课程按热度排序（降序）
-        major_course_scores.sort(key=lambda x: x[1], reverse=True)
-        other_course_scores.sort(key=lambda x: x[1], reverse=True)
+        # 步骤5: 分别对两类课程按热度排序（降序，热度相同时保持原有顺序）
+        def sort_by_popularity(course_ids, scores):
+            order = np.argsort(-scores, kind='stable')
+            return list(zip(course_ids[order].tolist(), scores[order].tolist()))
+        
+        major_course_scores = sort_by_popularity(candidates[is_major_candidate], popularity_scores[is_major_candidate])
+        other_course_scores = sort_by_popularity(candidates[~is_major_candidate], popularity_scores[~is_major_candidate])
         
         # 步骤6: 组合推荐结果
         # 优先推荐专业课程，如果专业课程不足top_n门，则补充其他热门课程
@@ -436,14 +1374,14 @@ class DynamicCourseRecommender:
             remaining = top_n - len(recommended_courses)
             recommended_courses.extend(other_course_scores[:remaining])
         
-        print(f"冷启动推荐完成：找到 {len(prof_elective_candidates)} 门候选课程，专业课程 {len(major_course_scores)} 门，其他课程 {len(other_course_scores)} 门，共推荐 {len(recommended_courses)} 门")
+        print(f"冷启动推荐完成：找到 {len(candidates)} 门候选课程，专业课程 {len(major_course_scores)} 门，其他课程 {len(other_course_scores)} 门，共推荐 {len(recommended_courses)} 门")
         
         # 如果还是没有推荐结果，至少返回前top_n门专业选修课程（即使没有热度数据）
-        if not recommended_courses and prof_elective_candidates:
-            print(f"警告: 没有热度数据，直接推荐前 {min(top_n, len(prof_elective_candidates))} 门专业选修课程")
-            for i, candidate in enumerate(prof_elective_candidates[:top_n]):
-                score = 10.0 if candidate['is_major_course'] else 5.0
-                recommended_courses.append((candidate['course_id'], score))
+        if not recommended_courses and len(candidates) > 0:
+            print(f"警告: 没有热度数据，直接推荐前 {min(top_n, len(candidates))} 门专业选修课程")
+            for course_id, is_major_course in zip(candidates[:top_n].tolist(), is_major_candidate[:top_n].tolist()):
+                score = 10.0 if is_major_course else 5.0
+                recommended_courses.append((course_id, score))
         
         return recommended_courses, id_to_course_no
     
@@ -451,12 +1389,17 @@ class DynamicCourseRecommender:
         """
         获取学生的专业信息
         
+        优先从当前模型快照中读取，快照中没有时再查询数据库。
+        
         参数:
             stu_no: str, 学生编号
         
         返回:
             str or None: 学生专业名称，如果查询失败返回None
         """
+        if self.model_snapshot is not None and stu_no in self.model_snapshot.stu_no_to_major:
+            return self.model_snapshot.stu_no_to_major[stu_no]
+        
         sql = f"SELECT MAJOR FROM STUDENT WHERE STU_NO = '{stu_no}'"
         result = query(sql)
         if result and len(result) > 0:
@@ -485,12 +1428,13 @@ class DynamicCourseRecommender:
         """
         为学生推荐课程
         
-        这是推荐系统的核心方法，采用多种策略：
-        1. 冷启动推荐：如果学生选课历史不足，使用基于专业的热门课程推荐
-        2. 协同过滤推荐：如果数据充足，使用基于用户的协同过滤算法
-        3. 热门课程推荐：如果协同过滤失败，回退到热门课程推荐
+        推荐由可插拔的流水线完成（见 utils/recommend_pipeline.py）：
+        1. 候选生成：未选的专业选修课程
+        2. 评分：协同过滤（按 RECOMMEND_MODE 选择 ALS / 基于课程 / 基于用户），
+           冷启动或协同过滤失败时回退到基于专业的热门课程推荐
+        3. 重排：去掉已满员、与已选课程时间冲突的课程
         
-        算法流程（协同过滤）：
+        基于用户的协同过滤：
         1. 找到与目标学生相似的其他学生
         2. 对于每门未选课程，计算加权平均评分
         3. 权重 = 学生相似度，评分 = 相似学生对课程的评分
@@ -503,10 +1447,12 @@ class DynamicCourseRecommender:
         返回:
             tuple: (推荐课程列表, 课程映射)
                 - 推荐课程列表: list of (course_id, predicted_score) 元组
-                - 课程映射: dict, 课程ID到课程信息的映射
+                - 课程映射: CourseTable, 课程ID到课程信息的映射
         """
-        # 步骤1: 重新加载数据（确保数据是最新的，实现动态推荐）
-        id_to_stu_no, id_to_course_no, score_matrix, stu_no_to_id = self._load_student_course_data()
+        # 步骤1: 获取当前数据版本的模型快照（数据变化后会自动重建，实现动态推荐）
+        snapshot = self._get_model_snapshot()
+        id_to_course_no = snapshot.id_to_course_no
+        stu_no_to_id = snapshot.stu_no_to_id
         
         # 步骤2: 数据验证
         if stu_no not in stu_no_to_id:
@@ -517,182 +1463,20 @@ class DynamicCourseRecommender:
             print("警告: 数据库中没有课程数据")
             return [], id_to_course_no
         
-        # 步骤3: 获取学生的评分向量
-        student_id = stu_no_to_id[stu_no]
-        student_vector = score_matrix[student_id]
-        
-        # 步骤4: 找到未选过的课程（评分为0的课程）
-        # 注意：这里只考虑"专业选修"类课程，而不是所有课程
-        # 因为学生可能已经选完了所有必修课程，但还有专业选修课程可选
-        all_unrated_courses = np.where(student_vector == 0)[0]
-        
-        # 筛选出未选的专业选修课程
-        unrated_prof_elective = []
-        for course_id in all_unrated_courses:
-            if course_id in id_to_course_no:
-                _, _, classification, _ = id_to_course_no[course_id]
-                if classification and str(classification).startswith("专业选修"):
-                    unrated_prof_elective.append(course_id)
-        
-        # 如果找不到专业选修课程，再考虑所有未选课程
-        if len(unrated_prof_elective) > 0:
-            unrated_courses = np.array(unrated_prof_elective)
-            print(f"调试信息 - 学生 {stu_no}: 总课程数={len(id_to_course_no)}, 已选课程数={np.sum(student_vector > 0)}, 未选专业选修课程数={len(unrated_courses)}")
+        # 步骤3: 准备推荐请求状态（评分向量、未选的专业选修课程、是否冷启动）
+        context = RecommendContext(self, snapshot, stu_no, stu_no_to_id[stu_no], top_n, RECOMMEND_MODE)
+        if len(context.unrated_electives) > 0:
+            print(f"调试信息 - 学生 {stu_no}: 总课程数={len(id_to_course_no)}, 已选课程数={context.selected_count}, 未选专业选修课程数={len(context.unrated_electives)}")
         else:
-            unrated_courses = all_unrated_courses
-            print(f"调试信息 - 学生 {stu_no}: 总课程数={len(id_to_course_no)}, 已选课程数={np.sum(student_vector > 0)}, 未选课程数={len(unrated_courses)} (未找到专业选修课程，使用所有未选课程)")
+            print(f"调试信息 - 学生 {stu_no}: 总课程数={len(id_to_course_no)}, 已选课程数={context.selected_count}, 未选课程数={len(context.fallback_courses)} (未找到专业选修课程，使用所有未选课程)")
         
-        if len(unrated_courses) == 0:
+        if len(context.fallback_courses) == 0:
             print(f"警告: 学生 {stu_no} 已选完所有可推荐课程（专业选修课程），无法推荐")
             return [], id_to_course_no
         
-        # 调试：统计未选课程中专业选修课程的数量
-        prof_elective_count = 0
-        for course_id in unrated_courses:
-            if course_id in id_to_course_no:
-                _, _, classification, _ = id_to_course_no[course_id]
-                if classification and str(classification).startswith("专业选修"):
-                    prof_elective_count += 1
-        print(f"调试信息 - 未选课程中专业选修课程数量: {prof_elective_count}")
-        
-        # 步骤5: 检查是否为冷启动情况
-        if self._is_cold_start(student_vector, min_courses=3):
-            # 获取学生专业
-            student_major = self._get_student_major(stu_no)
-            if student_major:
-                # 使用冷启动推荐（基于专业的热门课程）
-                return self._cold_start_recommend(
-                    stu_no, student_major, id_to_course_no, score_matrix, 
-                    unrated_courses, top_n
-                )
-            else:
-                print(f"警告: 无法获取学生 {stu_no} 的专业信息，使用通用热门课程推荐")
-                # 如果没有专业信息，使用通用热门课程推荐
-                course_popularity = np.sum(score_matrix > 0, axis=0)
-                popular_courses = [(idx, float(course_popularity[idx])) for idx in unrated_courses if course_popularity[idx] > 0]
-                popular_courses.sort(key=lambda x: x[1], reverse=True)
-                return popular_courses[:top_n], id_to_course_no
-        
-        # 步骤6: 检查是否有足够的学生进行协同过滤（至少需要2个学生）
-        total_students = len(id_to_stu_no)
-        if total_students < 2:
-            print("警告: 数据库中只有1个学生，使用热门课程推荐")
-            # 获取学生专业，优先推荐专业课程
-            student_major = self._get_student_major(stu_no)
-            if student_major:
-                return self._cold_start_recommend(
-                    stu_no, student_major, id_to_course_no, score_matrix, 
-                    unrated_courses, top_n
-                )
-            else:
-                # 返回热门课程（选课人数最多的课程）
-                course_popularity = np.sum(score_matrix > 0, axis=0)
-                popular_courses = [(idx, float(course_popularity[idx])) for idx in unrated_courses if course_popularity[idx] > 0]
-                popular_courses.sort(key=lambda x: x[1], reverse=True)
-                return popular_courses[:top_n], id_to_course_no
-        
-        # 步骤7: 筛选所有"专业选修"类课程
-        prof_elective_courses = []
-        for course_id in unrated_courses:
-            if course_id in id_to_course_no:
-                co_no, co_name, classification, major = id_to_course_no[course_id]
-                # 只推荐"专业选修"类课程（包含"专业选修-XXX"这类前缀）
-                if classification and str(classification).startswith("专业选修"):
-                    prof_elective_courses.append(course_id)
-                    print(f"调试信息 - 找到专业选修课程: {co_name} (分类: {classification})")
-
-        print(f"调试信息 - 筛选到的专业选修课程数量: {len(prof_elective_courses)}")
-
-        if not prof_elective_courses:
-            # 如果在未选课程中找不到任何"专业选修"课程，则回退到冷启动推荐
-            print(f"警告: 学生 {stu_no} 未找到可推荐的专业选修课程，回退到冷启动推荐")
-            student_major = self._get_student_major(stu_no)
-            if student_major:
-                return self._cold_start_recommend(
-                    stu_no, student_major, id_to_course_no, score_matrix,
-                    unrated_courses, top_n
-                )
-            else:
-                # 如果没有专业信息，尝试推荐所有包含"选修"或"任选"的课程
-                print(f"警告: 无法获取学生专业，尝试推荐所有选修类课程")
-                elective_courses = []
-                for course_id in unrated_courses:
-                    if course_id in id_to_course_no:
-                        _, _, classification, _ = id_to_course_no[course_id]
-                        if classification and ("选修" in str(classification) or "任选" in str(classification)):
-                            students_count = np.sum(score_matrix[:, course_id] > 0)
-                            elective_courses.append((course_id, float(students_count) + 1.0))
-                
-                if elective_courses:
-                    elective_courses.sort(key=lambda x: x[1], reverse=True)
-                    return elective_courses[:top_n], id_to_course_no
-                else:
-                    # 最后的回退：返回空列表
-                    print(f"警告: 无法找到任何可推荐的选修课程")
-                    return [], id_to_course_no
-
-        course_scores = []
-        for course_id in prof_elective_courses:
-            # 找到选过这门课的所有学生
-            students_who_took = np.where(score_matrix[:, course_id] > 0)[0]
-            
-            # 如果没有人选过这门课，给一个默认评分（基于课程基本信息）
-            if len(students_who_took) == 0:
-                # 给新课程一个基础评分（3.0分），确保它们能被推荐
-                course_scores.append((course_id, 3.0))
-                continue
-            
-            # 计算加权平均评分（基于学生相似度）
-            weighted_sum = 0.0  # 加权评分总和
-            similarity_sum = 0.0  # 相似度总和（用于归一化）
-            
-            for other_student_id in students_who_took:
-                if other_student_id == student_id:
-                    continue  # 跳过自己
-                
-                # 计算与目标学生的相似度
-                similarity = self._get_student_similarity(student_id, other_student_id, score_matrix)
-                
-                if similarity > 0:  # 只考虑正相似度
-                    # 获取该学生对课程的评分
-                    rating = score_matrix[other_student_id][course_id]
-                    # 加权累加：相似度越高，权重越大
-                    weighted_sum += similarity * rating
-                    similarity_sum += abs(similarity)
-            
-            # 计算预测评分
-            if similarity_sum > 0:
-                # 预测评分 = 加权平均
-                predicted_score = weighted_sum / similarity_sum
-                course_scores.append((course_id, predicted_score))
-            else:
-                # 如果没有相似学生（相似度都为0或负），使用所有选课学生的平均分
-                avg_rating = np.mean(score_matrix[students_who_took, course_id])
-                if avg_rating > 0:
-                    course_scores.append((course_id, avg_rating))
-        
-        # 步骤8: 按预测评分排序，取前N个
-        course_scores.sort(key=lambda x: x[1], reverse=True)
-        top_courses = course_scores[:top_n]
-        
-        # 步骤9: 如果协同过滤失败（没有推荐结果），回退到冷启动推荐
-        if len(top_courses) == 0:
-            print(f"警告: 无法为学生 {stu_no} 生成协同过滤推荐，切换到冷启动推荐")
-            # 如果协同过滤失败，使用冷启动推荐
-            student_major = self._get_student_major(stu_no)
-            if student_major:
-                return self._cold_start_recommend(
-                    stu_no, student_major, id_to_course_no, score_matrix, 
-                    unrated_courses, top_n
-                )
-            else:
-                # 使用通用热门课程推荐
-                course_popularity = np.sum(score_matrix > 0, axis=0)
-                popular_courses = [(idx, float(course_popularity[idx])) for idx in unrated_courses if course_popularity[idx] > 0]
-                popular_courses.sort(key=lambda x: x[1], reverse=True)
-                return popular_courses[:top_n], id_to_course_no
-        
-        print(f"调试信息 - 协同过滤推荐成功，返回 {len(top_courses)} 门课程")
+        # 步骤4: 候选生成 -> 评分 -> 重排
+        top_courses = course_pipeline.run(context)
+        print(f"调试信息 - 推荐完成，返回 {len(top_courses)} 门课程")
         return top_courses, id_to_course_no
     
     def recommend_similar_students(self, stu_no, top_n=20):
@@ -711,68 +1495,34 @@ class DynamicCourseRecommender:
                 - 推荐学生列表: list of (student_id, similarity) 元组，按相似度降序排列
                 - 学生映射: dict, 学生ID到学生信息的映射
         """
-        # 重新加载数据（确保使用最新数据）
-        id_to_stu_no, id_to_course_no, score_matrix, stu_no_to_id = self._load_student_course_data()
+        # 获取当前数据版本的模型快照（确保使用最新数据）
+        snapshot = self._get_model_snapshot()
+        id_to_stu_no = snapshot.id_to_stu_no
+        score_matrix = snapshot.score_matrix
+        stu_no_to_id = snapshot.stu_no_to_id
         
         if stu_no not in stu_no_to_id:
             return [], id_to_stu_no
         
-        # 获取目标学生的ID和评分向量
+        # 获取目标学生的ID
         student_id = stu_no_to_id[stu_no]
-        student_vector = score_matrix[student_id]
         
-        # 计算与所有其他学生的相似度
-        student_similarities = []
-        for other_student_id in range(len(id_to_stu_no)):
-            if other_student_id == student_id:
-                continue  # 跳过自己
-            
-            # 计算相似度（使用皮尔逊相关系数）
-            similarity = self._get_student_similarity(student_id, other_student_id, score_matrix)
-            
-            # 只保留正相似度（相似度 > 0）
-            if similarity > 0:
-                student_similarities.append((other_student_id, similarity))
+        # 计算与其他学生的相似度（使用皮尔逊相关系数）
+        candidate_ids, similarities = self._similar_student_candidates(snapshot, student_id)
+        
+        # 只保留正相似度（相似度 > 0），并跳过自己
+        positive = (similarities > 0) & (candidate_ids != student_id)
+        student_similarities = [
+            (int(other_student_id), float(similarity))
+            for other_student_id, similarity in zip(candidate_ids[positive], similarities[positive])
+        ]
         
         print(f"调试信息 - 相似学生推荐: 找到 {len(student_similarities)} 个正相似度的学生")
         
         # 如果没有找到正相似度的学生，使用备选策略
         if len(student_similarities) == 0:
             print("警告: 没有找到正相似度的学生，使用备选策略（基于共同选课数量和评分相似度）")
-            # 备选策略：综合考虑共同选课数量和评分相似度
-            for other_student_id in range(len(id_to_stu_no)):
-                if other_student_id == student_id:
-                    continue
-                
-                other_student_vector = score_matrix[other_student_id]
-                # 计算共同选课数量
-                common_courses = np.sum((student_vector > 0) & (other_student_vector > 0))
-                
-                if common_courses > 0:
-                    # 计算共同选课比例（基础相似度）
-                    max_common = min(np.sum(student_vector > 0), np.sum(other_student_vector > 0))
-                    if max_common > 0:
-                        common_ratio = float(common_courses) / max_common
-                        
-                        # 计算共同选课的平均评分差异（评分相似度）
-                        # 如果评分差异小，说明选课偏好相似
-                        common_mask = (student_vector > 0) & (other_student_vector > 0)
-                        if np.sum(common_mask) > 0:
-                            common_scores_stu = student_vector[common_mask]
-                            common_scores_other = other_student_vector[common_mask]
-                            # 计算平均绝对误差（MAE），然后转换为相似度
-                            mae = np.mean(np.abs(common_scores_stu - common_scores_other))
-                            # MAE越小，相似度越高；将MAE映射到0-1（假设最大MAE为5）
-                            score_similarity = max(0, 1.0 - mae / 5.0)
-                        else:
-                            score_similarity = 0.5  # 默认值
-                        
-                        # 综合相似度 = 共同选课比例 * 0.6 + 评分相似度 * 0.4
-                        # 这样即使所有学生都选了所有课程，也能根据评分差异区分
-                        similarity_score = common_ratio * 0.6 + score_similarity * 0.4
-                        student_similarities.append((other_student_id, similarity_score))
-                        
-                        print(f"调试 - 学生{other_student_id}: 共同选课比例={common_ratio:.3f}, 评分相似度={score_similarity:.3f}, 综合相似度={similarity_score:.3f}")
+            student_similarities = self._common_course_similarities(student_id, score_matrix)
         
         # 按相似度排序（降序），取前N个
         student_similarities.sort(key=lambda x: x[1], reverse=True)
@@ -782,6 +1532,106 @@ class DynamicCourseRecommender:
         
         return top_students, id_to_stu_no
     
+    def _similar_student_candidates(self, snapshot, student_id):
+        """
+        获取目标学生的候选相似学生及其皮尔逊相似度
+        
+        - SIMILAR_STUDENT_SEARCH 为 'lsh'：用快照上的 LSH 索引筛选候选，只在候选上精确计算（不计算、不缓存整行）
+        - 否则与所有学生精确计算，并缓存整行
+        
+        返回:
+            tuple: (候选学生ID数组, 对应的相似度数组)
+        """
+        score_matrix = snapshot.score_matrix
+        if SIMILAR_STUDENT_SEARCH == 'lsh':
+            candidate_ids = self._get_student_index(snapshot).query(score_matrix, student_id)
+            print(f"调试信息 - 相似学生推荐: LSH 索引筛选出 {len(candidate_ids)} 个候选学生")
+            return candidate_ids, self._pearson_correlation_row(student_id, score_matrix, candidate_ids)
+        
+        similarity_row = self._get_student_similarity_row(student_id, score_matrix)
+        return np.arange(len(similarity_row)), similarity_row
+    
+    def _get_neighbor_similarity_row(self, snapshot, student_id):
+        """
+        基于学生的协同过滤使用的相似度行（见 _similar_student_candidates）
+        
+        返回:
+            numpy.ndarray: shape=(学生数,)，候选相似学生位置为相似度，其余为0
+                （'exact' 模式下即与所有学生的整行相似度）
+        """
+        if SIMILAR_STUDENT_SEARCH != 'lsh':
+            return self._get_student_similarity_row(student_id, snapshot.score_matrix)
+        candidate_ids, similarities = self._similar_student_candidates(snapshot, student_id)
+        similarity_row = np.zeros(snapshot.score_matrix.shape[0])
+        similarity_row[candidate_ids] = similarities
+        return similarity_row
+    
+    def _get_student_index(self, snapshot):
+        """
+        获取快照上的相似学生 LSH 索引（首次使用时构建）
+        """
+        if snapshot.student_index is None:
+            start_time = time.time()
+            snapshot.student_index = StudentLSHIndex(
+                snapshot.score_matrix, num_tables=LSH_TABLES, num_bits=LSH_BITS, probes=LSH_PROBES
+            )
+            print(f"相似学生 LSH 索引构建完成: {snapshot.score_matrix.shape[0]} 个学生，"
+                  f"耗时 {time.time() - start_time:.3f} 秒")
+        return snapshot.student_index
+    
+    def _common_course_similarities(self, student_id, score_matrix):
+        """
+        备选相似度：综合考虑共同选课数量和共同课程上的评分差异（向量化版本）
+        
+        综合相似度 = 共同选课比例 × 0.6 + 评分相似度 × 0.4
+        - 共同选课比例 = 共同选课数 / min(双方选课数)
+        - 评分相似度 = max(0, 1 - 共同课程上评分的平均绝对误差(MAE) / 5)
+        即使所有学生都选了所有课程，也能根据评分差异区分。只返回有共同选课的学生。
+        
+        参数:
+            student_id: int, 目标学生的矩阵ID
+            score_matrix: numpy.ndarray 或 CSRScoreMatrix, 学生-课程评分矩阵
+        
+        返回:
+            list: (student_id, similarity) 元组列表
+        """
+        student_vector = self._student_vector(score_matrix, student_id)
+        rated_courses = np.nonzero(student_vector > 0)[0]
+        num_students = score_matrix.shape[0]
+        
+        # 共同选课数量和共同课程上的评分绝对误差之和
+        if isinstance(score_matrix, CSRScoreMatrix):
+            other_ids, local_ids, other_values = score_matrix.column_entries(rated_courses)
+            positive = other_values > 0
+            other_ids, local_ids, other_values = other_ids[positive], local_ids[positive], other_values[positive]
+            common_count = np.bincount(other_ids, minlength=num_students)
+            abs_error = np.bincount(
+                other_ids, weights=np.abs(student_vector[rated_courses][local_ids] - other_values),
+                minlength=num_students
+            )
+        else:
+            common_mask = (score_matrix > 0) & (student_vector > 0)
+            common_count = common_mask.sum(axis=1)
+            abs_error = np.sum(np.where(common_mask, np.abs(score_matrix - student_vector), 0.0), axis=1)
+        
+        rated_count = self._student_rated_counts(score_matrix)
+        others = np.nonzero(common_count > 0)[0]
+        others = others[others != student_id]
+        
+        common_ratio = common_count[others] / np.minimum(len(rated_courses), rated_count[others])
+        mae = abs_error[others] / common_count[others]
+        score_similarity = np.maximum(0, 1.0 - mae / 5.0)
+        similarity_scores = common_ratio * 0.6 + score_similarity * 0.4
+        return [(int(other_id), float(score)) for other_id, score in zip(others, similarity_scores)]
+    
+    def _student_rated_counts(self, score_matrix):
+        """
+        每个学生的选课数（评分矩阵每行中正评分的个数）
+        """
+        if isinstance(score_matrix, CSRScoreMatrix):
+            return score_matrix.positive_count(axis=1)
+        return np.sum(score_matrix > 0, axis=1)
+    
     def get_recommendations(self, stu_no, top_n_courses=20, top_n_students=20):
         """
         获取推荐结果（课程和相似学生）
@@ -801,9 +1651,7 @@ class DynamicCourseRecommender:
                 - 课程ID映射: dict, 课程ID到课程名称的映射
                 - 学生ID映射: dict, 学生ID到学生名称的映射
         """
-        # 清空缓存，确保使用最新数据（每次调用都重新计算）
-        self.student_similarity_cache = {}
-        self.course_similarity_cache = {}
+        # 相似度缓存绑定在模型快照上，数据版本变化时随快照一起失效，无需手动清空
         
         # 推荐课程（使用协同过滤或冷启动推荐）
         top_courses, id_to_course_no = self.recommend_courses(stu_no, top_n_courses)
@@ -830,9 +1678,9 @@ class DynamicCourseRecommender:
         
         # 如果映射为空，至少包含所有可能的ID（用于调试）
         if not id2course and id_to_course_no:
-            id2course = {idx: id_to_course_no[idx][1] for idx in id_to_course_no.keys()}
+            id2course = dict(id_to_course_no.names_by_id)
         if not id2student and id_to_stu_no:
-            id2student = {idx: id_to_stu_no[idx][1] for idx in id_to_stu_no.keys()}
+            id2student = dict(id_to_stu_no.names_by_id)
         
         print(f"ID映射 - 课程映射数量: {len(id2course)}, 学生映射数量: {len(id2student)}")
         print(f"课程列表: {course_list[:3] if course_list else '无'}")
@@ -966,3 +1814,30 @@ def regular_data(data, a, b):
     
     return data
 
+
+def build_recommend_json(course_list, student_list, id2course, id2student):
+    """
+    将推荐结果转换为 /getRecommedData 返回给前端的完整JSON
+    
+    课程推荐和相似学生推荐分别转换为ECharts dataset格式，
+    有数据时课程评分归一化到1-5，学生相似度归一化到0-1。
+    
+    参数:
+        course_list: list, 课程推荐列表 [(course_id, score), ...]
+        student_list: list, 学生推荐列表 [(student_id, similarity), ...]
+        id2course: dict, 课程ID到课程名称的映射
+        id2student: dict, 学生ID到学生名称的映射
+    
+    返回:
+        dict: {"course": 课程图表数据, "person": 学生图表数据}
+    """
+    course_json = to_bar_json(course_list, id2course)
+    person_json = to_bar_json(student_list, id2student)
+    
+    # 有数据才归一化（第一行是列名）
+    if len(course_json['source']) > 1:
+        course_json = regular_data(course_json, 1, 5)
+    if len(person_json['source']) > 1:
+        person_json = regular_data(person_json, 0, 1)
+    
+    return {'course': course_json, 'person': person_json}
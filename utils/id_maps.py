@@ -0,0 +1,342 @@
+"""
+推荐系统的学生/课程信息表
+用按矩阵ID排列的并行 numpy 数组保存学生、课程信息，代替每个学生、每门课程一个 Python 元组的字典。
+
+- 学号、课程号、姓名、课程名保存为定长 unicode 数组（可能为空的列额外保存一个空值掩码）
+- 专业、课程类别等取值很少的列保存为类别编号数组（类别列表 + 每个元素的编号）
+- 按编号查找矩阵ID使用排序后的编号数组二分查找，可以一次查找一批编号
+- 课程表预先计算"专业选修"课程掩码，推荐时的候选课程筛选是一次向量化的掩码运算
+
+两个表都实现了只读 Mapping 接口（矩阵ID -> 元组），与原来的 id_to_stu_no / id_to_course_no 字典兼容；
+by_stu_no / major_by_stu_no 等视图与原来的 stu_no_to_id / stu_no_to_major 字典兼容。
+表中的数组可以通过 to_arrays() / from_arrays() 序列化（例如写入内存映射的快照文件）。
+"""
+import operator
+from collections.abc import Mapping
+
+import numpy as np
+
+
+def string_column(values):
+    """
+    字符串列（可能含None）转为定长 unicode 数组和空值掩码
+
+    返回:
+        tuple: (unicode数组, 空值掩码)
+    """
+    null = np.array([value is None for value in values], dtype=bool)
+    strings = np.array(['' if value is None else str(value) for value in values], dtype=str)
+    if len(strings) == 0:
+        strings = strings.astype('<U1')
+    return strings, null
+
+
+def categorical_column(values):
+    """
+    取值很少的列转为类别列表和类别编号数组（类别按首次出现的顺序编号）
+
+    返回:
+        tuple: (类别列表, 类别编号数组)
+    """
+    code_of = {}
+    codes = np.fromiter(
+        (code_of.setdefault(value, len(code_of)) for value in values), dtype=np.int32, count=len(values)
+    )
+    return list(code_of), codes
+
+
+def _row_id(idx, size):
+    """
+    将 Mapping 的键转换为矩阵ID，不是合法ID时抛出 KeyError
+    """
+    try:
+        row = operator.index(idx)
+    except TypeError:
+        raise KeyError(idx)
+    if not 0 <= row < size:
+        raise KeyError(idx)
+    return row
+
+
+class _KeyIndex:
+    """
+    编号 -> 矩阵ID 的二分查找索引
+
+    属性:
+        keys: numpy.ndarray, 按矩阵ID排列的编号
+        order: numpy.ndarray, 按编号排序后的矩阵ID
+    """
+
+    def __init__(self, keys, order=None):
+        self.keys = keys
+        self.order = np.argsort(keys, kind='stable') if order is None else order
+        self.sorted_keys = keys[self.order]
+
+    def lookup(self, query_keys):
+        """
+        批量查找编号对应的矩阵ID，不存在的编号为-1（编号重复时取最后一个，与字典的行为一致）
+        """
+        query_keys = np.asarray(query_keys, dtype=str)
+        ids = np.full(query_keys.shape, -1, dtype=np.int64)
+        if len(self.sorted_keys) == 0 or query_keys.size == 0:
+            return ids
+        positions = np.searchsorted(self.sorted_keys, query_keys, side='right') - 1
+        found = positions >= 0
+        found[found] = self.sorted_keys[positions[found]] == query_keys[found]
+        ids[found] = self.order[positions[found]]
+        return ids
+
+    def get(self, key, default=None):
+        """
+        查找单个编号对应的矩阵ID
+        """
+        if not isinstance(key, str):
+            return default
+        position = int(np.searchsorted(self.sorted_keys, key, side='right')) - 1
+        if position < 0 or self.sorted_keys[position] != key:
+            return default
+        return int(self.order[position])
+
+
+class _KeyView(Mapping):
+    """
+    编号 -> 某一列的值 的只读映射视图（与原来的 stu_no_to_id / stu_no_to_major 字典兼容）
+    """
+
+    def __init__(self, index, value_of):
+        self._index = index
+        self._value_of = value_of
+
+    def __getitem__(self, key):
+        row = self._index.get(key)
+        if row is None:
+            raise KeyError(key)
+        return self._value_of(row)
+
+    def __contains__(self, key):
+        return self._index.get(key) is not None
+
+    def __iter__(self):
+        return iter(self._index.keys.tolist())
+
+    def __len__(self):
+        return len(self._index.keys)
+
+
+class _ColumnView(Mapping):
+    """
+    矩阵ID -> 某一列的值 的只读映射视图（例如课程ID -> 课程名称）
+    """
+
+    def __init__(self, size, value_of):
+        self._size = size
+        self._value_of = value_of
+
+    def __getitem__(self, idx):
+        return self._value_of(_row_id(idx, self._size))
+
+    def __iter__(self):
+        return iter(range(self._size))
+
+    def __len__(self):
+        return self._size
+
+
+class StudentTable(Mapping):
+    """
+    学生信息表：作为 Mapping 使用时为 矩阵ID -> (学生编号, 学生姓名)
+
+    属性:
+        stu_nos: numpy.ndarray, 学生编号
+        names, name_null: numpy.ndarray, 学生姓名及其空值掩码
+        majors: list, 专业类别（可能包含None）
+        major_codes: numpy.ndarray, 每个学生的专业在 majors 中的编号
+        by_stu_no: Mapping, 学生编号 -> 矩阵ID
+        major_by_stu_no: Mapping, 学生编号 -> 专业
+    """
+
+    # 构成信息表的全部数组（用于序列化）
+    ARRAY_NAMES = ('stu_nos', 'names', 'name_null', 'major_codes', 'order')
+
+    def __init__(self, stu_nos, names, majors):
+        """
+        参数:
+            stu_nos, names, majors: 按矩阵ID排列的学生编号、姓名、专业序列
+        """
+        stu_nos, _ = string_column(stu_nos)
+        names, name_null = string_column(names)
+        majors, major_codes = categorical_column(majors)
+        self._init(stu_nos, names, name_null, majors, major_codes, None)
+
+    def _init(self, stu_nos, names, name_null, majors, major_codes, order):
+        self.stu_nos = stu_nos
+        self.names = names
+        self.name_null = name_null
+        self.majors = majors
+        self.major_codes = major_codes
+        self._index = _KeyIndex(stu_nos, order)
+        self.by_stu_no = _KeyView(self._index, int)
+        self.major_by_stu_no = _KeyView(self._index, self.major)
+
+    @classmethod
+    def from_arrays(cls, arrays, majors):
+        """
+        直接由 to_arrays() 的数组和专业类别列表创建信息表（不复制数组，可以传入内存映射的只读数组）
+        """
+        table = cls.__new__(cls)
+        table._init(
+            arrays['stu_nos'], arrays['names'], arrays['name_null'], list(majors),
+            arrays['major_codes'], arrays['order']
+        )
+        return table
+
+    def to_arrays(self):
+        """
+        返回构成信息表的全部数组，dict: 名称 -> 数组（专业类别列表见 majors）
+        """
+        return {
+            'stu_nos': self.stu_nos, 'names': self.names, 'name_null': self.name_null,
+            'major_codes': self.major_codes, 'order': self._index.order,
+        }
+
+    def lookup(self, stu_nos):
+        """
+        批量查找学生编号对应的矩阵ID，不存在的学生为-1
+        """
+        return self._index.lookup(stu_nos)
+
+    def name(self, student_id):
+        """学生姓名"""
+        return None if self.name_null[student_id] else str(self.names[student_id])
+
+    def major(self, student_id):
+        """学生专业"""
+        return self.majors[self.major_codes[student_id]]
+
+    def major_list(self):
+        """按矩阵ID排列的所有学生专业"""
+        return [self.majors[code] for code in self.major_codes.tolist()]
+
+    @property
+    def names_by_id(self):
+        """矩阵ID -> 学生姓名 的映射视图"""
+        return _ColumnView(len(self), self.name)
+
+    def __getitem__(self, student_id):
+        student_id = _row_id(student_id, len(self.stu_nos))
+        return str(self.stu_nos[student_id]), self.name(student_id)
+
+    def __iter__(self):
+        return iter(range(len(self.stu_nos)))
+
+    def __len__(self):
+        return len(self.stu_nos)
+
+
+class CourseTable(Mapping):
+    """
+    课程信息表：作为 Mapping 使用时为 矩阵ID -> (课程编号, 课程名称, 课程类别, 所属专业)
+
+    属性:
+        co_nos: numpy.ndarray, 课程编号
+        names, name_null: numpy.ndarray, 课程名称及其空值掩码
+        classifications: list, 课程类别（可能包含None）
+        classification_codes: numpy.ndarray, 每门课程的类别在 classifications 中的编号
+        majors: list, 所属专业类别（可能包含None）
+        major_codes: numpy.ndarray, 每门课程的所属专业在 majors 中的编号
+        elective_mask: numpy.ndarray, 布尔数组，课程是否为"专业选修"类课程（包含"专业选修-XXX"这类前缀）
+        optional_mask: numpy.ndarray, 布尔数组，课程类别是否包含"选修"或"任选"
+    """
+
+    # 构成信息表的全部数组（用于序列化）
+    ARRAY_NAMES = ('co_nos', 'names', 'name_null', 'classification_codes', 'major_codes', 'order')
+
+    def __init__(self, co_nos, names, classifications, majors):
+        """
+        参数:
+            co_nos, names, classifications, majors: 按矩阵ID排列的课程编号、名称、类别、所属专业序列
+        """
+        co_nos, _ = string_column(co_nos)
+        names, name_null = string_column(names)
+        classifications, classification_codes = categorical_column(classifications)
+        majors, major_codes = categorical_column(majors)
+        self._init(co_nos, names, name_null, classifications, classification_codes, majors, major_codes, None)
+
+    def _init(self, co_nos, names, name_null, classifications, classification_codes, majors, major_codes, order):
+        self.co_nos = co_nos
+        self.names = names
+        self.name_null = name_null
+        self.classifications = classifications
+        self.classification_codes = classification_codes
+        self.majors = majors
+        self.major_codes = major_codes
+        self._index = _KeyIndex(co_nos, order)
+
+        # 按类别计算一次，再用类别编号展开到每门课程
+        is_elective = np.array(
+            [bool(value) and str(value).startswith("专业选修") for value in classifications], dtype=bool
+        )
+        is_optional = np.array(
+            [bool(value) and ("选修" in str(value) or "任选" in str(value)) for value in classifications], dtype=bool
+        )
+        self.elective_mask = is_elective[classification_codes]
+        self.optional_mask = is_optional[classification_codes]
+
+    @classmethod
+    def from_arrays(cls, arrays, classifications, majors):
+        """
+        直接由 to_arrays() 的数组和类别列表创建信息表（不复制数组，可以传入内存映射的只读数组）
+        """
+        table = cls.__new__(cls)
+        table._init(
+            arrays['co_nos'], arrays['names'], arrays['name_null'], list(classifications),
+            arrays['classification_codes'], list(majors), arrays['major_codes'], arrays['order']
+        )
+        return table
+
+    def to_arrays(self):
+        """
+        返回构成信息表的全部数组，dict: 名称 -> 数组（类别列表见 classifications / majors）
+        """
+        return {
+            'co_nos': self.co_nos, 'names': self.names, 'name_null': self.name_null,
+            'classification_codes': self.classification_codes, 'major_codes': self.major_codes,
+            'order': self._index.order,
+        }
+
+    def lookup(self, co_nos):
+        """
+        批量查找课程编号对应的矩阵ID，不存在的课程为-1
+        """
+        return self._index.lookup(co_nos)
+
+    def name(self, course_id):
+        """课程名称"""
+        return None if self.name_null[course_id] else str(self.names[course_id])
+
+    def classification(self, course_id):
+        """课程类别"""
+        return self.classifications[self.classification_codes[course_id]]
+
+    def major(self, course_id):
+        """课程所属专业"""
+        return self.majors[self.major_codes[course_id]]
+
+    def major_list(self):
+        """按矩阵ID排列的所有课程所属专业"""
+        return [self.majors[code] for code in self.major_codes.tolist()]
+
+    @property
+    def names_by_id(self):
+        """矩阵ID -> 课程名称 的映射视图"""
+        return _ColumnView(len(self), self.name)
+
+    def __getitem__(self, course_id):
+        course_id = _row_id(course_id, len(self.co_nos))
+        return str(self.co_nos[course_id]), self.name(course_id), self.classification(course_id), self.major(course_id)
+
+    def __iter__(self):
+        return iter(range(len(self.co_nos)))
+
+    def __len__(self):
+        return len(self.co_nos)
@@ -0,0 +1,235 @@
+"""
+基于课程的协同过滤模型（Item-based Collaborative Filtering）
+离线预先计算每门课程最相似的 top-K 门课程，保存到磁盘；
+在线推荐时只需对学生评过分的课程查表累加，不再计算学生之间的相似度。
+
+课程之间的相似度与 DynamicCourseRecommender._get_course_similarity 一致，使用评分矩阵列向量的余弦相似度，
+也可以选择调整余弦相似度（先减去每个学生的平均评分）。课程的相似邻居变化很慢，模型可以每晚重建一次。
+
+预测评分 = Σ(相似度(j, c) × 学生对j的评分) / Σ相似度(j, c)，其中 j 为学生评过分、且 c 在其邻居列表中的课程。
+
+用法:
+    python -m utils.item_recommend               # 构建模型并保存
+    python -m utils.item_recommend --top-k 30 --adjusted
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+from utils.sparse_matrix import CSRScoreMatrix
+
+# 模型文件默认保存位置（项目根目录下的 model 目录）
+DEFAULT_MODEL_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'model', 'course_neighbors.npz'
+)
+
+# 每门课程保留的相似课程数量
+DEFAULT_TOP_K = 20
+
+# 计算课程相似度时每次处理的学生数（控制临时稠密子矩阵的内存）
+ROW_CHUNK_SIZE = 2048
+
+
+class CourseNeighborModel:
+    """
+    课程相似邻居模型
+
+    属性:
+        course_nos: numpy.ndarray, 每个模型位置对应的课程编号
+        neighbor_ids: numpy.ndarray, shape=(课程数, K)，每门课程最相似的K门课程（模型位置）
+        neighbor_sims: numpy.ndarray, shape=(课程数, K)，对应的相似度（只保留正相似度，其余为0）
+        built_at: float, 模型构建时间戳
+    """
+
+    def __init__(self, course_nos, neighbor_ids, neighbor_sims, built_at=None):
+        self.course_nos = np.asarray(course_nos, dtype=str)
+        self.neighbor_ids = neighbor_ids
+        self.neighbor_sims = neighbor_sims
+        self.built_at = built_at if built_at is not None else time.time()
+
+    def save(self, path=DEFAULT_MODEL_PATH):
+        """
+        保存模型到 .npz 文件
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        np.savez(
+            path,
+            course_nos=self.course_nos,
+            neighbor_ids=self.neighbor_ids,
+            neighbor_sims=self.neighbor_sims,
+            built_at=np.array(self.built_at)
+        )
+
+    @classmethod
+    def load(cls, path=DEFAULT_MODEL_PATH):
+        """
+        从 .npz 文件加载模型
+
+        返回:
+            CourseNeighborModel or None: 模型文件不存在时返回None
+        """
+        if not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data['course_nos'], data['neighbor_ids'], data['neighbor_sims'], float(data['built_at']))
+
+    def align(self, id_to_course_no):
+        """
+        将模型对齐到当前评分矩阵的课程ID
+
+        模型按课程编号保存，与构建时的课程顺序无关；模型中没有的课程没有邻居，
+        已经不存在的邻居课程相似度置为0。
+
+        参数:
+            id_to_course_no: CourseTable, 课程信息表
+
+        返回:
+            tuple: (neighbor_ids, neighbor_sims)，shape=(当前课程数, K)，邻居为当前课程ID
+        """
+        position_to_id = id_to_course_no.lookup(self.course_nos)
+        num_courses = len(id_to_course_no)
+        top_k = self.neighbor_ids.shape[1]
+
+        aligned_ids = np.zeros((num_courses, top_k), dtype=np.int64)
+        aligned_sims = np.zeros((num_courses, top_k))
+        if len(position_to_id) == 0:
+            return aligned_ids, aligned_sims
+
+        mapped_ids = position_to_id[self.neighbor_ids]
+        mapped_sims = np.where(mapped_ids >= 0, self.neighbor_sims, 0.0)
+        known = position_to_id >= 0
+        aligned_ids[position_to_id[known]] = np.maximum(mapped_ids[known], 0)
+        aligned_sims[position_to_id[known]] = mapped_sims[known]
+        return aligned_ids, aligned_sims
+
+
+def compute_course_similarity(score_matrix, adjusted=False):
+    """
+    计算所有课程两两之间的相似度（向量化）
+
+    分块累加评分矩阵的 Gram 矩阵 RᵀR，再除以列向量范数的外积得到余弦相似度。
+
+    参数:
+        score_matrix: numpy.ndarray 或 CSRScoreMatrix, 学生-课程评分矩阵
+        adjusted: bool, 是否使用调整余弦相似度（先减去每个学生在其评分课程上的平均分）
+
+    返回:
+        numpy.ndarray: shape=(课程数, 课程数)，对角线为0
+    """
+    num_students, num_courses = score_matrix.shape
+    gram = np.zeros((num_courses, num_courses))
+    for start in range(0, num_students, ROW_CHUNK_SIZE):
+        end = min(start + ROW_CHUNK_SIZE, num_students)
+        if isinstance(score_matrix, CSRScoreMatrix):
+            block = score_matrix.row_block(start, end)
+        else:
+            block = np.asarray(score_matrix[start:end], dtype=float)
+        if adjusted:
+            rated = block != 0
+            means = block.sum(axis=1) / np.maximum(rated.sum(axis=1), 1)
+            block = np.where(rated, block - means[:, np.newaxis], 0.0)
+        gram += block.T @ block
+
+    norms = np.sqrt(np.diag(gram))
+    norm_product = np.outer(norms, norms)
+    similarity = np.divide(gram, norm_product, out=np.zeros_like(gram), where=norm_product > 0)
+    np.fill_diagonal(similarity, 0.0)
+    return similarity
+
+
+def build_course_neighbor_model(score_matrix, id_to_course_no, top_k=DEFAULT_TOP_K, adjusted=False):
+    """
+    构建课程相似邻居模型：每门课程保留相似度最高的 top_k 门课程
+
+    参数:
+        score_matrix: numpy.ndarray 或 CSRScoreMatrix, 学生-课程评分矩阵
+        id_to_course_no: dict, 矩阵ID到(课程编号, ...)的映射
+        top_k: int, 每门课程保留的相似课程数量
+        adjusted: bool, 是否使用调整余弦相似度
+
+    返回:
+        CourseNeighborModel: 课程相似邻居模型
+    """
+    num_courses = score_matrix.shape[1]
+    course_nos = [id_to_course_no[idx][0] for idx in range(num_courses)]
+    top_k = max(0, min(top_k, num_courses - 1))
+    if top_k == 0:
+        return CourseNeighborModel(course_nos, np.zeros((num_courses, 0), dtype=np.int32), np.zeros((num_courses, 0)))
+
+    similarity = compute_course_similarity(score_matrix, adjusted)
+    np.fill_diagonal(similarity, -np.inf)  # 排除课程自身
+
+    # 先用 argpartition 取出前K个，再在K个之内排序
+    neighbor_ids = np.argpartition(-similarity, top_k - 1, axis=1)[:, :top_k]
+    neighbor_sims = np.take_along_axis(similarity, neighbor_ids, axis=1)
+    order = np.argsort(-neighbor_sims, axis=1, kind='stable')
+    neighbor_ids = np.take_along_axis(neighbor_ids, order, axis=1)
+    neighbor_sims = np.take_along_axis(neighbor_sims, order, axis=1)
+
+    # 只保留正相似度
+    neighbor_sims = np.where(neighbor_sims > 0, neighbor_sims, 0.0)
+    return CourseNeighborModel(course_nos, neighbor_ids.astype(np.int32), neighbor_sims)
+
+
+def score_courses(neighbor_ids, neighbor_sims, student_vector, course_ids):
+    """
+    基于课程邻居为学生的候选课程打分：对学生评过分的课程查表累加
+
+    参数:
+        neighbor_ids, neighbor_sims: 对齐到当前课程ID的邻居模型（见 CourseNeighborModel.align）
+        student_vector: numpy.ndarray, 学生对所有课程的评分向量
+        course_ids: 候选课程ID序列
+
+    返回:
+        tuple: (加权评分总和, 相似度总和)，均为与course_ids对应的数组
+    """
+    num_courses = len(student_vector)
+    rated = np.nonzero(student_vector > 0)[0]
+    ids = neighbor_ids[rated].ravel()
+    sims = neighbor_sims[rated]
+    weighted = (sims * student_vector[rated][:, np.newaxis]).ravel()
+
+    weighted_sum = np.bincount(ids, weights=weighted, minlength=num_courses)
+    similarity_sum = np.bincount(ids, weights=sims.ravel(), minlength=num_courses)
+    return weighted_sum[course_ids], similarity_sum[course_ids]
+
+
+# 进程内缓存的模型及其文件修改时间（模型文件被重建后自动重新加载）
+_loaded_model = None
+_loaded_model_mtime = None
+
+
+def get_course_neighbor_model(path=DEFAULT_MODEL_PATH):
+    """
+    获取课程相似邻居模型（带缓存）
+
+    返回:
+        CourseNeighborModel or None: 模型文件不存在时返回None
+    """
+    global _loaded_model, _loaded_model_mtime
+    if not os.path.exists(path):
+        return None
+    mtime = os.path.getmtime(path)
+    if _loaded_model is None or _loaded_model_mtime != mtime:
+        _loaded_model = CourseNeighborModel.load(path)
+        _loaded_model_mtime = mtime
+    return _loaded_model
+
+
+if __name__ == '__main__':
+    from utils.dynamic_recommend import DynamicCourseRecommender
+
+    parser = argparse.ArgumentParser(description='构建课程相似邻居模型')
+    parser.add_argument('--top-k', type=int, default=DEFAULT_TOP_K, help='每门课程保留的相似课程数量')
+    parser.add_argument('--adjusted', action='store_true', help='使用调整余弦相似度')
+    parser.add_argument('--output', default=DEFAULT_MODEL_PATH, help='模型文件保存路径')
+    args = parser.parse_args()
+
+    start_time = time.time()
+    snapshot = DynamicCourseRecommender()._get_model_snapshot()
+    model = build_course_neighbor_model(snapshot.score_matrix, snapshot.id_to_course_no, args.top_k, args.adjusted)
+    model.save(args.output)
+    print(f"[课程邻居模型] 已保存到 {args.output}：{len(model.course_nos)} 门课程，"
+          f"每门 {model.neighbor_ids.shape[1]} 个邻居，耗时 {time.time() - start_time:.1f} 秒")
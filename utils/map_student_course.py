@@ -1,5 +1,12 @@
+from itertools import repeat
+
+import numpy as np
+
 from utils.query import query
 
+# get_map_student 的课程映射和 get_matrix 的矩阵列使用同一条SQL，保证两者的课程顺序一致
+COURSE_SQL = "SELECT CO_NAME, CO_NO FROM EDUCATION_PLAN"
+
 def get_map_student():
     map_student = {}
     stuNo2MatNo = {}
@@ -12,8 +19,7 @@ def get_map_student():
         map_student_id = map_student_id + 1
 
     map_course = {}
-    sql="SELECT CO_NAME FROM EDUCATION_PLAN"
-    result = query(sql)
+    result = query(COURSE_SQL)
     map_course_id = 0
     for cur in result:
         map_course[map_course_id] = cur[0]
@@ -24,18 +30,46 @@ def get_map_student():
     return map_student, map_course, stuNo2MatNo
 
 
-def get_matrix(map_student):
-    matrix = []
-    for i in range(30):
-        matrix.append([])
-    for i in range(30):
-        stu_no = map_student[i][1]
-        #print(stu_no)
-        sql="SELECT COMMENT FROM CHOOSE WHERE STU_NO='%s'" % (stu_no)
-        score=query(sql)
-        #print(score)
-        for j in range(118):
-            matrix[i].append(int(score[j][0]))
+def get_map_course_no():
+    """
+    功能: 获取矩阵列号到课程编号的映射，列顺序与 get_map_student 返回的课程映射一致
+    :return: {列号: 课程编号}
+    """
+    return {idx: cur[1] for idx, cur in enumerate(query(COURSE_SQL))}
+
+
+def _comment_value(comment):
+    """COMMENT 转为整数评价，空值或无法解析时视为未评价(0)"""
+    try:
+        return int(comment)
+    except (TypeError, ValueError):
+        return 0
+
+
+def get_matrix(map_student, map_course_no=None):
+    """
+    功能: 一次查询 CHOOSE 表，按学生编号、课程编号透视为 学生数×课程数 的评价矩阵
+          （COMMENT 取整，未选课为0），耗时与选课记录数成正比，适用于任意学生数和课程数
+    :param map_student: get_map_student 返回的学生映射 {行号: [姓名, 学号]}
+    :param map_course_no: 列号到课程编号的映射，默认使用 get_map_course_no()
+    :return: numpy.ndarray, shape=(学生数, 课程数)
+    """
+    if map_course_no is None:
+        map_course_no = get_map_course_no()
+    stu_no_to_row = {values[1]: idx for idx, values in map_student.items()}
+    co_no_to_col = {co_no: idx for idx, co_no in map_course_no.items()}
+    matrix = np.zeros((len(map_student), len(map_course_no)), dtype=int)
+
+    result = query("SELECT STU_NO, CO_NO, COMMENT FROM CHOOSE")
+    if not result:
+        return matrix
+    stu_nos, co_nos, comments = zip(*result)
+    rows = np.fromiter(map(stu_no_to_row.get, stu_nos, repeat(-1)), dtype=np.int64, count=len(stu_nos))
+    cols = np.fromiter(map(co_no_to_col.get, co_nos, repeat(-1)), dtype=np.int64, count=len(co_nos))
+    values = np.fromiter(map(_comment_value, comments), dtype=np.int64, count=len(comments))
 
+    # 丢弃不在学生/课程映射中的记录，其余一次写入矩阵
+    known = (rows >= 0) & (cols >= 0)
+    matrix[rows[known], cols[known]] = values[known]
     return matrix
 
@@ -0,0 +1,230 @@
+"""
+推荐模型后台刷新线程（双缓冲）
+
+后台线程负责加载数据、构建评分矩阵、热度表和相似度结构，构建完成后原子地替换进程内共享的模型快照；
+推荐请求（/getRecommedData）只读取当前快照，不再承担加载和构建开销，也不会看到构建到一半的模型。
+
+刷新时机：
+- 数据变化：本进程内的写入（选课、退课、评分等）通知 utils.data_version 后，
+  线程在短暂合并连续写入后增量更新快照
+- 定时：每隔 config['RECOMMEND_REFRESH_INTERVAL'] 秒从数据库完整重建一次，
+  用于发现其他进程（例如其他 WSGI 工作进程）写入的数据
+- 快照文件：开启 config['RECOMMEND_SNAPSHOT_FILE'] 时，每隔 SNAPSHOT_POLL_SECONDS 秒检查一次快照文件，
+  其他进程写入了新的快照文件后立即映射（见 dynamic_recommend.snapshot_file_changed）；
+  启动时的第一次构建也优先映射快照文件。本进程的增量变化每隔 SNAPSHOT_WRITE_INTERVAL 秒最多写回文件一次，
+  写回不在请求路径上进行
+
+status() 返回最近一次构建的时间、耗时和错误，可用于对过期模型报警。
+
+用法:
+    config['RECOMMEND_BACKGROUND_REFRESH'] = True 时 main.py 启动时自动开启，
+    也可以手动调用 start_model_refresher()
+"""
+import threading
+import time
+import traceback
+
+from config import config
+from utils import dynamic_recommend
+from utils.data_version import get_data_version, wait_for_data_change
+
+# 定时完整重建的间隔（秒）
+REFRESH_INTERVAL_SECONDS = config.get('RECOMMEND_REFRESH_INTERVAL', 300)
+
+# 收到数据变化通知后等待的秒数，把短时间内的连续写入合并成一次更新
+CHANGE_DEBOUNCE_SECONDS = 1.0
+
+# 开启快照文件时检查文件是否被其他进程更新的间隔（秒，每次检查只需一次 stat）
+SNAPSHOT_POLL_SECONDS = 2.0
+
+# 开启快照文件时，把本进程的增量变化写回文件的最短间隔（秒）
+SNAPSHOT_WRITE_INTERVAL = config.get('RECOMMEND_SNAPSHOT_WRITE_INTERVAL', 60)
+
+
+class ModelRefresher(threading.Thread):
+    """
+    推荐模型后台刷新线程
+
+    属性:
+        interval: float, 定时完整重建的间隔（秒）
+        debounce: float, 数据变化后合并写入的等待时间（秒）
+        version: int, 最近一次构建完成的快照的数据版本号
+        last_build_at: float, 最近一次构建完成的时间戳
+        last_build_seconds: float, 最近一次构建的耗时（秒）
+        last_build_kind: str, 最近一次构建的方式（'full' 从数据库完整重建 / 'incremental' 增量更新 / 'file' 映射快照文件）
+        last_error: str, 最近一次构建失败的错误信息（成功后清空）
+        builds: int, 成功构建的次数
+        write_interval: float, 增量变化写回快照文件的最短间隔（秒）
+        last_write_back_at: float, 最近一次尝试写回快照文件的时间戳
+        write_backs: int, 成功写回快照文件的次数
+    """
+
+    def __init__(self, interval=REFRESH_INTERVAL_SECONDS, debounce=CHANGE_DEBOUNCE_SECONDS,
+                 write_interval=SNAPSHOT_WRITE_INTERVAL):
+        super().__init__(name='recommend-model-refresher', daemon=True)
+        self.interval = interval
+        self.debounce = debounce
+        self.recommender = dynamic_recommend.DynamicCourseRecommender()
+        self.version = None
+        self.last_build_at = None
+        self.last_build_seconds = None
+        self.last_build_kind = None
+        self.last_error = None
+        self.builds = 0
+        self.write_interval = write_interval
+        self.last_write_back_at = None
+        self.write_backs = 0
+        self._stop_event = threading.Event()
+
+    def refresh(self, full_reload=False):
+        """
+        构建新快照并替换共享快照；失败时保留旧快照继续服务
+
+        参数:
+            full_reload: bool, 是否从数据库完整重建（否则增量应用本进程内的数据变化，或映射其他进程写入的快照文件）
+
+        返回:
+            bool: 是否构建成功
+        """
+        start_time = time.time()
+        try:
+            snapshot = self.recommender._refresh_model_snapshot(full_reload=full_reload, prepare=True)
+        except Exception as e:
+            self.last_error = f"{type(e).__name__}: {e}"
+            print(f"[推荐模型刷新] 构建失败，继续使用旧快照: {self.last_error}")
+            traceback.print_exc()
+            return False
+
+        self.version = snapshot.version
+        self.last_build_at = time.time()
+        self.last_build_seconds = self.last_build_at - start_time
+        self.last_build_kind = 'full' if snapshot.source == 'database' else snapshot.source
+        self.last_error = None
+        self.builds += 1
+        print(f"[推荐模型刷新] 数据版本 {snapshot.version}，方式 {self.last_build_kind}，"
+              f"耗时 {self.last_build_seconds:.3f} 秒")
+        return True
+
+    def write_back_due(self):
+        """
+        是否需要把当前快照的增量变化写回快照文件（有尚未写回的变化，并且距离上次写回超过 write_interval 秒）
+        """
+        snapshot = dynamic_recommend._model_snapshot
+        if not dynamic_recommend.SNAPSHOT_FILE or snapshot is None or not snapshot.unsaved_changes:
+            return False
+        return self.last_write_back_at is None or time.time() - self.last_write_back_at >= self.write_interval
+
+    def write_back(self):
+        """
+        把当前快照的增量变化写回快照文件（文件已被其他进程更新时放弃，等下一次间隔或完整重建）
+
+        返回:
+            bool: 是否写入了文件
+        """
+        self.last_write_back_at = time.time()
+        try:
+            written = self.recommender._write_back_snapshot_file()
+        except Exception as e:
+            print(f"[推荐模型刷新] 写回快照文件失败: {type(e).__name__}: {e}")
+            return False
+        if written:
+            self.write_backs += 1
+            print(f"[推荐模型刷新] 增量变化已写回快照文件（第 {dynamic_recommend._model_snapshot.file_generation} 代）")
+        return written
+
+    def run(self):
+        # 启动时构建一次（开启快照文件时优先映射文件），之后交替等待数据变化、快照文件变化和定时重建
+        full_reload = False
+        last_full_reload = time.time()
+        poll = SNAPSHOT_POLL_SECONDS if dynamic_recommend.SNAPSHOT_FILE else self.interval
+        while not self._stop_event.is_set():
+            if full_reload:
+                last_full_reload = time.time()
+            self.refresh(full_reload)
+            version = get_data_version() if self.version is None else self.version
+            changed = False
+            while not self._stop_event.is_set():
+                remaining = last_full_reload + self.interval - time.time()
+                if remaining <= 0:
+                    break
+                if self.write_back_due():
+                    self.write_back()
+                changed = wait_for_data_change(version, min(poll, remaining))
+                if changed or dynamic_recommend.snapshot_file_changed():
+                    break
+            if self._stop_event.is_set():
+                break
+            if changed:
+                self._stop_event.wait(self.debounce)
+            full_reload = time.time() - last_full_reload >= self.interval
+
+    def stop(self):
+        """
+        停止线程（当前正在进行的构建会完成，线程在下一次被数据变化或定时唤醒时退出）
+        """
+        self._stop_event.set()
+
+    def status(self):
+        """
+        获取刷新线程状态
+
+        返回:
+            dict: running, version, current_version, last_build_at, last_build_seconds,
+                  last_build_kind, model_age_seconds, last_error, builds, last_write_back_at, write_backs
+        """
+        return {
+            'running': self.is_alive(),
+            'version': self.version,
+            'current_version': get_data_version(),
+            'last_build_at': self.last_build_at,
+            'last_build_seconds': self.last_build_seconds,
+            'last_build_kind': self.last_build_kind,
+            'model_age_seconds': time.time() - self.last_build_at if self.last_build_at is not None else None,
+            'last_error': self.last_error,
+            'builds': self.builds,
+            'last_write_back_at': self.last_write_back_at,
+            'write_backs': self.write_backs,
+        }
+
+
+# 进程内唯一的刷新线程
+_refresher = None
+_refresher_lock = threading.Lock()
+
+
+def start_model_refresher(interval=REFRESH_INTERVAL_SECONDS):
+    """
+    启动后台刷新线程（已经启动时直接返回），并让推荐请求不再自己重建快照
+
+    返回:
+        ModelRefresher: 刷新线程
+    """
+    global _refresher
+    with _refresher_lock:
+        if _refresher is None or not _refresher.is_alive():
+            dynamic_recommend.set_background_refresh(True)
+            _refresher = ModelRefresher(interval)
+            _refresher.start()
+        return _refresher
+
+
+def stop_model_refresher():
+    """
+    停止后台刷新线程，推荐请求恢复为自己按数据版本更新快照
+    """
+    global _refresher
+    with _refresher_lock:
+        if _refresher is not None:
+            _refresher.stop()
+            _refresher = None
+        dynamic_recommend.set_background_refresh(False)
+
+
+def get_model_refresher_status():
+    """
+    获取后台刷新线程状态（未启动时 running 为 False）
+    """
+    refresher = _refresher
+    if refresher is None:
+        return {'running': False, 'current_version': get_data_version()}
+    return refresher.status()
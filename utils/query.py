@@ -1,5 +1,14 @@
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from itertools import islice
+
 import pymysql
 from config import config
+from utils.data_version import publish_choose_change
+from utils.db_pool import ConnectionPool
+from utils.query_stats import query_stats
 
 def _get_connection():
     return pymysql.connect(
@@ -10,64 +19,295 @@ def _get_connection():
         charset='utf8'
     )
 
+# 进程内共享的数据库连接池，query / update / insert 从池中借用连接，不再每条语句新建连接
+_pool = ConnectionPool(
+    _get_connection,
+    min_size=config.get('MYSQL_POOL_MIN_SIZE', 1),
+    max_size=config.get('MYSQL_POOL_MAX_SIZE', 10),
+    timeout=config.get('MYSQL_POOL_TIMEOUT', 10),
+    max_lifetime=config.get('MYSQL_POOL_MAX_LIFETIME', 3600),
+    health_check_idle=config.get('MYSQL_POOL_HEALTH_CHECK_IDLE', 30)
+)
+
+
+def get_pool_stats():
+    """
+    功能: 获取数据库连接池统计（连接数、借出/等待/超时次数等）
+    """
+    return _pool.stats()
+
+
+# bulk_insert / bulk_update 每批的行数
+BULK_CHUNK_SIZE = config.get('MYSQL_BULK_CHUNK_SIZE', 1000)
+
+# stream 每次从服务器读取的行数
+STREAM_BATCH_SIZE = config.get('MYSQL_STREAM_BATCH_SIZE', 5000)
+
+# 当前线程绑定的事务：conn 为事务使用的连接，callbacks 为提交后执行的回调
+_local = threading.local()
+
+
+@contextmanager
+def transaction():
+    """
+    功能: 工作单元。代码块内的 query / update / insert 都使用同一个连接且不单独提交，
+          代码块正常结束时统一提交，抛出异常时回滚；嵌套使用时并入最外层的事务。
+    用法:
+        with transaction():
+            update(sql1)
+            update(sql2)
+    """
+    if getattr(_local, 'conn', None) is not None:
+        _check_not_streaming()
+        yield _local.conn
+        return
+    with _pool.connection() as conn:
+        _local.conn = conn
+        _local.callbacks = []
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            callbacks = _local.callbacks
+            _local.conn = None
+            _local.callbacks = None
+    for callback, args, kwargs in callbacks:
+        callback(*args, **kwargs)
+
+
+def transactional(func):
+    """
+    功能: 装饰器，整个函数在一个事务（transaction）中执行；用于路由函数时，一次请求的所有读写共用一个连接
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with transaction():
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def on_commit(callback, *args, **kwargs):
+    """
+    功能: 当前事务提交后再调用 callback(*args, **kwargs)（事务回滚则不调用）；不在事务中时立即调用。
+          用于发布选课变化等通知，避免推荐系统看到最终被回滚的修改
+    """
+    if getattr(_local, 'conn', None) is not None:
+        _local.callbacks.append((callback, args, kwargs))
+    else:
+        callback(*args, **kwargs)
+
+
+def _check_not_streaming():
+    """
+    事务的连接上有 stream 未读完的结果时不能执行其他语句（否则 pymysql 会报告命令顺序错误）
+    """
+    if getattr(_local, 'streaming', False):
+        raise RuntimeError("事务的连接正在流式读取（query.stream），请先遍历完或关闭生成器再执行其他语句")
+
+
+@contextmanager
+def _borrow_connection():
+    """
+    返回 (连接, 是否自动提交)：在事务中时使用事务的连接，由事务统一提交；否则从连接池借用并逐条提交
+    """
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
+        _check_not_streaming()
+        yield conn, False
+    else:
+        with _pool.connection() as conn:
+            yield conn, True
+
 #251127，insert
 def insert(sql, params):
-    conn =_get_connection()
-    with conn.cursor() as cursor:
-        cursor.execute(sql, params)
-        conn.commit()
-        return cursor.lastrowid # 返回插入的id
-    conn.close()
+    with _borrow_connection() as (conn, autocommit):
+        with conn.cursor() as cursor:
+            started = time.perf_counter()
+            cursor.execute(sql, params)
+            if autocommit:
+                conn.commit()
+            query_stats.record(sql, time.perf_counter() - started, cursor.rowcount)
+            return cursor.lastrowid # 返回插入的id
 ###251217你们他妈别删我代码了
 
 def query(sql, params=None):
     """
-    功能; 使用sql语句查询数据库中学生选课信息.
+    功能; 使用sql语句查询数据库中学生选课信息. 出错时返回空结果；在事务中时抛出异常，由事务回滚。
     参数: sql(string), params(tuple/list, optional)
     """
-    db = _get_connection()
-    cur = db.cursor()
-    result = []
-    try:
-        cur.execute(sql, params)
-        result = cur.fetchall()
-        db.commit()
-
-        #print('query success')
-
-        # print('query success')
-    except:
-        # print('query loss')
-        db.rollback()
-    cur.close()
-    db.close()
+    with _borrow_connection() as (db, autocommit):
+        cur = db.cursor()
+        result = []
+        started = time.perf_counter()
+        try:
+            cur.execute(sql, params)
+            result = cur.fetchall()
+            if autocommit:
+                db.commit()
+
+            #print('query success')
+
+            # print('query success')
+        except Exception as e:
+            # print('query loss')
+            if not autocommit:
+                # 事务中的查询出错时抛出异常，由事务整体回滚；
+                # 否则调用方会把失败的读取当作"没有结果"继续执行并提交
+                cur.close()
+                print(f"数据库查询错误: {str(e)}")
+                print(f"SQL语句: {sql}")
+                raise
+            db.rollback()
+        cur.close()
+        # 慢查询需要 EXPLAIN 时在同一个连接上执行
+        query_stats.record(sql, time.perf_counter() - started, len(result),
+                           explain=lambda: _explain(db, sql, params))
     return result
 
 
-def update(sql, params=None):
+def _explain(db, sql, params):
     """
-    功能; 使用sql语句更新数据库中学生选课信息。
-    参数: sql(string), params(tuple/list, optional)
+    对查询语句执行 EXPLAIN，返回执行计划的行
     """
-    db = _get_connection()
     cur = db.cursor()
     try:
-        cur.execute(sql, params)
-        db.commit()
-        #print('update success')
-        # print('update success')
-    except Exception as e:
-        # print('update loss')
-        print(f"数据库更新错误: {str(e)}")
-        print(f"SQL语句: {sql}")
-        if params:
-            print(f"参数: {params}")
-        db.rollback()
-        raise  # 重新抛出异常，让调用者知道错误
+        cur.execute("EXPLAIN " + sql, params)
+        return cur.fetchall()
     finally:
         cur.close()
-        db.close()
 
+
+def update(sql, params=None):
+    """
+    功能; 使用sql语句更新数据库中学生选课信息。在事务中时不单独提交，出错时由事务回滚。
+    参数: sql(string), params(tuple/list, optional)
+    """
+    with _borrow_connection() as (db, autocommit):
+        cur = db.cursor()
+        started = time.perf_counter()
+        try:
+            cur.execute(sql, params)
+            if autocommit:
+                db.commit()
+            query_stats.record(sql, time.perf_counter() - started, cur.rowcount)
+            #print('update success')
+            # print('update success')
+        except Exception as e:
+            # print('update loss')
+            print(f"数据库更新错误: {str(e)}")
+            print(f"SQL语句: {sql}")
+            if params:
+                print(f"参数: {params}")
+            if autocommit:
+                db.rollback()
+            raise  # 重新抛出异常，让调用者知道错误
+        finally:
+            cur.close()
+
+def stream(sql, params=None, batch_size=None, batches=False):
+    """
+    功能: 流式查询。使用不缓冲的服务器端游标（SSCursor），每次从服务器读取 batch_size 行，
+          内存占用与结果总行数无关；用于全表扫描等大结果集。
+          不在事务中时从连接池借用连接，遍历结束或生成器关闭时归还；
+          在事务中时使用事务的连接（能看到事务中尚未提交的修改，也不会额外占用连接池），
+          遍历结束或关闭生成器之前不能在该事务中执行其他语句，也要在事务结束之前遍历完。
+          遍历过程中出错时抛出异常（与 query 不同，不返回空结果）
+    参数: sql(string), params(tuple/list, optional),
+          batch_size(int, optional, 默认 MYSQL_STREAM_BATCH_SIZE), batches(bool, 为 True 时每次产出一批行的列表)
+    返回: 生成器，逐行产出结果元组；batches=True 时逐批产出
+    用法:
+        for stu_no, name in stream("SELECT STU_NO, NAME FROM STUDENT"):
+            ...
+    """
+    if batch_size is None:
+        batch_size = STREAM_BATCH_SIZE
+    with _borrow_connection() as (db, autocommit):
+        cur = db.cursor(pymysql.cursors.SSCursor)
+        # 只统计数据库耗时（执行和读取），不包括调用方处理每批数据的时间
+        seconds = 0.0
+        total_rows = 0
+        if not autocommit:
+            # 事务的连接上有未读完的结果，期间不能执行其他语句（见 _borrow_connection）
+            _local.streaming = True
+        try:
+            started = time.perf_counter()
+            cur.execute(sql, params)
+            while True:
+                rows = cur.fetchmany(batch_size)
+                seconds += time.perf_counter() - started
+                if not rows:
+                    break
+                total_rows += len(rows)
+                if batches:
+                    yield list(rows)
+                else:
+                    yield from rows
+                started = time.perf_counter()
+            if autocommit:
+                # 结束语句隐式开始的事务，连接归还时不必再回滚（见 db_pool.ConnectionPool.release）
+                db.commit()
+        except Exception as e:
+            print(f"数据库流式查询错误: {str(e)}")
+            print(f"SQL语句: {sql}")
+            raise
+        finally:
+            # 提前结束时 close 会读完并丢弃剩余的行，连接才能继续使用
+            cur.close()
+            if not autocommit:
+                _local.streaming = False
+            query_stats.record(sql, seconds, total_rows)
+
+
+def _execute_many(sql, rows, chunk_size):
+    """
+    在一个事务中分批执行 executemany，返回影响的总行数
+    """
+    if chunk_size is None:
+        chunk_size = BULK_CHUNK_SIZE
+    rows = iter(rows)
+    affected = 0
+    with transaction() as conn:
+        with conn.cursor() as cursor:
+            while True:
+                chunk = list(islice(rows, chunk_size))
+                if not chunk:
+                    break
+                try:
+                    started = time.perf_counter()
+                    count = cursor.executemany(sql, chunk) or 0
+                    query_stats.record(sql, time.perf_counter() - started, count)
+                    affected += count
+                except Exception as e:
+                    print(f"数据库批量写入错误: {str(e)}")
+                    print(f"SQL语句: {sql}")
+                    print(f"本批行数: {len(chunk)}")
+                    raise  # 由事务回滚已写入的所有批次
+    return affected
+
+
+def bulk_insert(sql, rows, chunk_size=None):
+    """
+    功能: 批量插入。sql 为单行的 INSERT / REPLACE ... VALUES (%s, ...) 语句，
+          pymysql 会把每批参数合并成一条多行 INSERT；所有批次在同一个事务中提交
+    参数: sql(string), rows(iterable of tuple), chunk_size(int, optional, 默认 MYSQL_BULK_CHUNK_SIZE)
+    返回: 插入（影响）的总行数
+    """
+    return _execute_many(sql, rows, chunk_size)
+
+
+def bulk_update(sql, rows, chunk_size=None):
+    """
+    功能: 批量执行同一条 UPDATE / DELETE 语句（每行一组参数），共用一个连接，所有批次在同一个事务中提交
+    参数: sql(string), rows(iterable of tuple), chunk_size(int, optional, 默认 MYSQL_BULK_CHUNK_SIZE)
+    返回: 影响的总行数
+    """
+    return _execute_many(sql, rows, chunk_size)
+
+
+@transactional
 def getPlanTreeJson(stu_id):
     """
     功能: 传入学生stu_id,然后利用stu_id从数据库查询得到该学生选课信息，再转换为计划树所需的json格式
@@ -509,6 +749,7 @@ def getPlanTreeJson(stu_id):
     data['children'] = children
     return data
 
+@transactional
 def updateDatabase(stu_id, train_plan):
     """
     功能: 用户在“培养计划”界面点击“提交”按钮后，使用最新“计划树”信息更新数据库
@@ -549,6 +790,7 @@ def updateDatabase(stu_id, train_plan):
     update(sql)
 
 
+@transactional
 def updateScore(stu_id, scores):
     sql="SELECT CO_NO, CO_NAME FROM EDUCATION_PLAN";
     name2no = {}
@@ -556,10 +798,18 @@ def updateScore(stu_id, scores):
     for cur in result:
         name2no[cur[1]] = cur[0]
 
+    # 该学生已有的选课记录及成绩（用于通知推荐系统）
+    sql = "SELECT CO_NO, GRADE FROM CHOOSE WHERE STU_NO='%s'" % stu_id
+    no2grade = {}
+    for cur in query(sql):
+        no2grade[cur[0]] = cur[1]
+
+    # 所有评分用一次批量更新写入
+    sql = "UPDATE CHOOSE SET COMMENT=%s WHERE STU_NO=%s AND CO_NO=%s"
+    bulk_update(sql, [('%d' % scores[cur], stu_id, name2no[cur]) for cur in scores])
     for cur in scores:
-        sql="UPDATE CHOOSE SET COMMENT='%d' WHERE STU_NO='%s' AND CO_NO='%s'" % (scores[cur], stu_id, name2no[cur])
-        #print(sql)
-        update(sql)
+        if name2no[cur] in no2grade:
+            on_commit(publish_choose_change, stu_id, name2no[cur], no2grade[name2no[cur]], '%d' % scores[cur])
 
 
 def get_student_progress(stu_id):
@@ -697,6 +947,7 @@ def get_courses_by_category(category):
     return courses
 
 
+@transactional
 def submit_course_score(stu_id, co_no, score):
     """
     功能: 提交课程评分 (更新 CHOOSE 表中的 COMMENT 字段作为评分字段使用，或者更新 GRADE，这里根据原代码逻辑似乎是 COMMENT 用作评分？原代码有 updateScore 函数是用 COMMENT 存分数的)
@@ -704,7 +955,7 @@ def submit_course_score(stu_id, co_no, score):
     所以这里我们继续使用 COMMENT 字段存储评分 (1-5分)
     """
     # 检查是否选过这门课
-    sql_check = "SELECT * FROM CHOOSE WHERE STU_NO='%s' AND CO_NO='%s'" % (stu_id, co_no)
+    sql_check = "SELECT GRADE FROM CHOOSE WHERE STU_NO='%s' AND CO_NO='%s'" % (stu_id, co_no)
     result = query(sql_check)
     
     if not result:
@@ -718,6 +969,8 @@ def submit_course_score(stu_id, co_no, score):
     sql_update = "UPDATE CHOOSE SET COMMENT='%s' WHERE STU_NO='%s' AND CO_NO='%s'" % (score, stu_id, co_no)
     try:
         update(sql_update)
+        # 通知推荐系统：该选课记录的评价变化
+        on_commit(publish_choose_change, stu_id, co_no, result[0][0], '%s' % score)
         return True, "评分成功"
     except Exception as e:
         return False, str(e)
\ No newline at end of file
@@ -0,0 +1,199 @@
+"""
+数据库查询统计
+
+utils.query 中的每条语句执行后调用 query_stats.record，记录：
+- 按 SQL 指纹（字面量替换为 ?、空白合并后的语句）汇总的执行次数、总耗时、最长耗时、行数和发出语句的路由
+- 当前请求的查询次数和总耗时（main.py 在请求开始、结束时调用 begin_request / end_request，
+  并写入响应头 X-DB-Query-Count / X-DB-Time / Server-Timing），查询次数超过 MYSQL_REQUEST_QUERY_WARN 时打印一行日志，
+  用于发现循环中逐条查询（N+1）的路由
+- 超过 MYSQL_SLOW_QUERY_SECONDS 秒的慢查询：打印到控制台并保留最近若干条，
+  开启 MYSQL_SLOW_QUERY_EXPLAIN 时附带 EXPLAIN 的结果（只记录指纹，不记录语句中的参数值）
+
+统计见 /api/query_stats。
+"""
+import re
+import threading
+from collections import OrderedDict, deque
+from functools import lru_cache
+
+from config import config
+
+# 慢查询阈值（秒）
+SLOW_QUERY_SECONDS = config.get('MYSQL_SLOW_QUERY_SECONDS', 0.5)
+
+# 是否为慢查询（SELECT）附带 EXPLAIN 的结果
+SLOW_QUERY_EXPLAIN = config.get('MYSQL_SLOW_QUERY_EXPLAIN', False)
+
+# 单个请求的查询次数超过该值时打印日志（0 表示每个请求都打印）
+REQUEST_QUERY_WARN = config.get('MYSQL_REQUEST_QUERY_WARN', 50)
+
+# 最多汇总的 SQL 指纹数（超过后淘汰最久未执行的指纹）
+MAX_FINGERPRINTS = 1000
+
+# 保留的最近慢查询条数
+SLOW_QUERY_HISTORY = 100
+
+# 没有请求上下文时（后台线程、脚本）记录的路由
+NO_ROUTE = '-'
+
+_COMMENT = re.compile(r'/\*.*?\*/|--[^\n]*|#[^\n]*', re.S)
+_STRING = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\"", re.S)
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER = re.compile(r'%s|%\(\w+\)s')
+_IN_LIST = re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)', re.I)
+_SPACES = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=4096)
+def fingerprint(sql):
+    """
+    计算 SQL 指纹：字符串替换为 ?，去掉注释，数字和占位符替换为 ?，IN 列表合并，空白合并
+
+    参数:
+        sql: str, SQL 语句
+
+    返回:
+        str: 只与语句结构有关的指纹，例如 "SELECT CO_NO FROM CHOOSE WHERE STU_NO=?"
+    """
+    sql = _STRING.sub('?', sql)
+    sql = _COMMENT.sub(' ', sql)
+    sql = _PLACEHOLDER.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _IN_LIST.sub('IN (?+)', sql)
+    return _SPACES.sub(' ', sql).strip().rstrip(';').rstrip()
+
+
+class QueryStats:
+    """
+    查询统计（线程安全）
+
+    属性:
+        slow_seconds: float, 慢查询阈值（秒）
+        explain_slow: bool, 是否为慢查询附带 EXPLAIN 的结果
+        request_warn: int, 单个请求查询次数的日志阈值
+    """
+
+    def __init__(self, slow_seconds=SLOW_QUERY_SECONDS, explain_slow=SLOW_QUERY_EXPLAIN,
+                 request_warn=REQUEST_QUERY_WARN, max_fingerprints=MAX_FINGERPRINTS):
+        self.slow_seconds = slow_seconds
+        self.explain_slow = explain_slow
+        self.request_warn = request_warn
+        self.max_fingerprints = max_fingerprints
+        self._lock = threading.Lock()
+        # 指纹 -> 汇总信息，按最近执行排序
+        self._fingerprints = OrderedDict()
+        self._slow_queries = deque(maxlen=SLOW_QUERY_HISTORY)
+        self._totals = {'queries': 0, 'seconds': 0.0, 'slow_queries': 0}
+        # 当前线程正在处理的请求：{'route', 'queries', 'seconds'}
+        self._local = threading.local()
+
+    def begin_request(self, route):
+        """
+        开始统计一个请求的查询（在请求开始时调用）
+        """
+        self._local.request = {'route': route, 'queries': 0, 'seconds': 0.0}
+
+    def current_request(self):
+        """
+        返回:
+            dict or None: 当前请求到目前为止的 {'route', 'queries', 'seconds'}，不在请求中时为None
+        """
+        return getattr(self._local, 'request', None)
+
+    def end_request(self):
+        """
+        结束当前请求的统计，查询次数超过阈值时打印一行日志
+
+        返回:
+            dict or None: 请求的 {'route', 'queries', 'seconds'}
+        """
+        request = self.current_request()
+        self._local.request = None
+        if request is not None and request['queries'] > 0 and request['queries'] >= self.request_warn:
+            print(f"[数据库] {request['route']} 查询 {request['queries']} 次，耗时 {request['seconds'] * 1000:.1f} ms")
+        return request
+
+    def record(self, sql, seconds, rows, explain=None):
+        """
+        记录一条语句的执行
+
+        参数:
+            sql: str, 执行的 SQL 语句（参数化语句为模板）
+            seconds: float, 执行耗时（秒）
+            rows: int, 返回或影响的行数
+            explain: callable, 可选，无参数，返回该语句的 EXPLAIN 结果（慢查询且开启 explain_slow 时调用）
+        """
+        fp = fingerprint(sql)
+        request = self.current_request()
+        route = request['route'] if request is not None else NO_ROUTE
+        if request is not None:
+            request['queries'] += 1
+            request['seconds'] += seconds
+
+        slow = seconds >= self.slow_seconds
+        with self._lock:
+            self._totals['queries'] += 1
+            self._totals['seconds'] += seconds
+            entry = self._fingerprints.get(fp)
+            if entry is None:
+                entry = {'count': 0, 'seconds': 0.0, 'max_seconds': 0.0, 'rows': 0, 'slow': 0, 'routes': {}}
+                self._fingerprints[fp] = entry
+                while len(self._fingerprints) > self.max_fingerprints:
+                    self._fingerprints.popitem(last=False)
+            else:
+                self._fingerprints.move_to_end(fp)
+            entry['count'] += 1
+            entry['seconds'] += seconds
+            entry['max_seconds'] = max(entry['max_seconds'], seconds)
+            entry['rows'] += rows
+            entry['routes'][route] = entry['routes'].get(route, 0) + 1
+            if slow:
+                entry['slow'] += 1
+                self._totals['slow_queries'] += 1
+
+        if slow:
+            plan = None
+            if self.explain_slow and explain is not None and fp[:6].upper() == 'SELECT':
+                try:
+                    plan = [list(row) for row in explain()]
+                except Exception as e:
+                    plan = f"EXPLAIN 失败: {str(e)}"
+            print(f"[慢查询] {seconds * 1000:.1f} ms, {rows} 行, 路由 {route}: {fp}")
+            if plan is not None:
+                print(f"[慢查询] EXPLAIN: {plan}")
+            with self._lock:
+                self._slow_queries.append({
+                    'fingerprint': fp, 'seconds': seconds, 'rows': rows, 'route': route, 'explain': plan,
+                })
+
+    def stats(self, top=20):
+        """
+        获取查询统计
+
+        参数:
+            top: int, 返回总耗时最多的前 top 个指纹
+
+        返回:
+            dict: queries, seconds, slow_queries（总计）, fingerprints（按总耗时排序）, recent_slow（最近的慢查询）
+        """
+        with self._lock:
+            fingerprints = sorted(self._fingerprints.items(), key=lambda item: item[1]['seconds'], reverse=True)[:top]
+            return dict(
+                self._totals,
+                slow_seconds=self.slow_seconds,
+                fingerprints=[dict(entry, fingerprint=fp, routes=dict(entry['routes'])) for fp, entry in fingerprints],
+                recent_slow=list(self._slow_queries),
+            )
+
+    def reset(self):
+        """
+        清空统计
+        """
+        with self._lock:
+            self._fingerprints.clear()
+            self._slow_queries.clear()
+            self._totals = {'queries': 0, 'seconds': 0.0, 'slow_queries': 0}
+
+
+# 进程内共享的查询统计
+query_stats = QueryStats()
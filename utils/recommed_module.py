@@ -1,7 +1,19 @@
 # 相似性度量函数， 输入列向量, 归一化 0-1
-from numpy import *
+# 不使用 from numpy import *：numpy 2.0 起它会覆盖内置的 min/max，且不再导出 mat
+from numpy import shape, nonzero, sum
 import numpy as np
 from numpy import linalg as la
+import threading
+import zlib
+
+mat = np.asmatrix
+
+# 截断SVD保留的能量比例（与 svdMethod 中选取k的规则一致）
+SVD_ENERGY = 0.9
+
+# 按矩阵内容缓存的SVD特征：(缓存键, 物品特征矩阵, 用户特征矩阵)
+_svd_feature_cache = None
+_svd_feature_lock = threading.Lock()
 
 def getSigK(Sigma, k):
     '''
@@ -27,7 +39,7 @@ def cosSim(inA, inB):
     '''
     基于余弦相似性度量
     '''
-    sim = float(inA.T* inB) / (la.norm(inA) * la.norm(inB))
+    sim = (inA.T * inB).item() / (la.norm(inA) * la.norm(inB))
     return 0.5 + 0.5 * sim
 
 def svdMethod(svdData, dataMat, simMeas, user, item):
@@ -63,6 +75,115 @@ def svdMethod(svdData, dataMat, simMeas, user, item):
         return 0
     return ratSimTotal / simTotal
 
+def energyRank(Sigma, energy=SVD_ENERGY):
+    '''
+    输入：
+        Sigma: 按降序排列的全部奇异值
+        energy: 需要保留的能量比例
+    输出：
+        k(int): 前k个奇异值之和不小于总和 energy 倍的最小k（与 svdMethod 中的循环结果一致）
+    '''
+    k = 0
+    while sum(Sigma[:k]) < sum(Sigma) * energy:
+        k = k + 1
+    return k
+
+def truncatedSvd(dataMat, energy=SVD_ENERGY):
+    '''
+    输入：
+        dataMat(ndarray)(M,N): 评分矩阵
+        energy: 需要保留的能量比例
+    输出：
+        U_k(M,k), Sigma_k(k,), V_k(N,k): 保留前k个奇异值的截断分解
+    算法流程：
+        只对较小一侧的 Gram 矩阵（N*N 的 AᵀA 或 M*M 的 AAᵀ）做对称特征分解，
+        特征值开方即全部奇异值（用于按能量选取k），再只还原前k个奇异向量，
+        不需要计算完整的 M*M / N*N 奇异向量矩阵。
+    '''
+    rows, cols = dataMat.shape
+    gram = dataMat.T @ dataMat if cols <= rows else dataMat @ dataMat.T
+    eigenvalues, eigenvectors = la.eigh(gram)
+    order = np.argsort(eigenvalues)[::-1]
+    Sigma = np.sqrt(np.maximum(eigenvalues[order], 0.0))
+    k = energyRank(Sigma, energy)
+    Sigma_k = Sigma[:k]
+    vectors = eigenvectors[:, order[:k]]
+    if cols <= rows:
+        V_k = vectors
+        U_k = dataMat @ V_k / Sigma_k
+    else:
+        U_k = vectors
+        V_k = dataMat.T @ U_k / Sigma_k
+    return U_k, Sigma_k, V_k
+
+def getSvdFeatures(dataMat):
+    '''
+    输入：
+        dataMat(ndarray)(M,N): 评分矩阵
+    输出：
+        itemFeature(N,k): 物品特征矩阵，即 dataMat.T * U_k * Sigma_k^-1
+        userFeature(M,k): 用户特征矩阵，即 dataMat * V_k * Sigma_k^-1
+    说明：
+        结果按（矩阵形状, 矩阵内容校验和）缓存，矩阵没有变化时后续请求不再做分解。
+    '''
+    global _svd_feature_cache
+    key = (dataMat.shape, zlib.crc32(np.ascontiguousarray(dataMat).tobytes()))
+    cached = _svd_feature_cache
+    if cached is not None and cached[0] == key:
+        return cached[1], cached[2]
+    with _svd_feature_lock:
+        cached = _svd_feature_cache
+        if cached is not None and cached[0] == key:
+            return cached[1], cached[2]
+        U_k, Sigma_k, V_k = truncatedSvd(dataMat)
+        itemFeature = dataMat.T @ U_k / Sigma_k
+        userFeature = dataMat @ V_k / Sigma_k
+        _svd_feature_cache = (key, itemFeature, userFeature)
+        return itemFeature, userFeature
+
+def _pairwiseSim(featuresA, featuresB, simMeas):
+    '''
+    输入：
+        featuresA(P,k), featuresB(Q,k): 两组特征向量（按行）
+        simMeas: ecludSim 或 cosSim
+    输出：
+        (P,Q)的相似度矩阵，与逐对调用 simMeas 的结果一致
+    '''
+    if simMeas is ecludSim:
+        squared = (np.sum(featuresA ** 2, axis=1)[:, np.newaxis] + np.sum(featuresB ** 2, axis=1)
+                   - 2.0 * featuresA @ featuresB.T)
+        return 1.0 / (1.0 + np.sqrt(np.maximum(squared, 0.0)))
+    if simMeas is cosSim:
+        # 零向量（没有任何评分的学生/课程）的余弦相似度按0处理，避免 nan 打乱排序
+        norms = np.outer(la.norm(featuresA, axis=1), la.norm(featuresB, axis=1))
+        dot = featuresA @ featuresB.T
+        return 0.5 + 0.5 * np.divide(dot, norms, out=np.zeros_like(dot), where=norms > 0)
+    # 其他相似度函数：逐对计算
+    return np.array([[simMeas(mat(a).T, mat(b).T) for b in featuresB] for a in featuresA]).reshape(
+        len(featuresA), len(featuresB))
+
+def scoreUnratedItems(itemFeature, dataMat, user, items, simMeas=ecludSim):
+    '''
+    输入：
+        itemFeature(N,k): 物品特征矩阵
+        dataMat(ndarray)(M,N): 评分矩阵
+        user(int): 用户id
+        items: 需要打分的未评分物品
+        simMeas: 相似度函数
+    输出：
+        ndarray: 每个物品的评分，与逐个调用 svdMethod 的结果一致
+    算法流程：
+        评分 = Σ(用户对已评分物品j的评分 × sim(item, j)) / Σ sim(item, j)，
+        所有未评分物品与所有已评分物品的相似度由一次矩阵运算得到。
+    '''
+    ratedItems = np.nonzero(dataMat[user, :] != 0)[0]
+    if len(ratedItems) == 0:
+        return np.zeros(len(items))
+    sim = _pairwiseSim(itemFeature[items], itemFeature[ratedItems], simMeas)
+    simTotal = sim.sum(axis=1)
+    ratSimTotal = sim @ dataMat[user, ratedItems]
+    return np.where(simTotal == 0, 0.0, ratSimTotal / np.where(simTotal == 0, 1.0, simTotal))
+
 def recommedCoursePerson(dataMat, user, N=7, simMeas=ecludSim, estMethod=svdMethod):
     '''
     输入：
@@ -76,39 +197,34 @@ def recommedCoursePerson(dataMat, user, N=7, simMeas=ecludSim, estMethod=svdMeth
     算法流程：
         1. 找到所有未评分的商品
         2. 若没有未评分商品，退出
-        3. 遍历未评分商品.
-        4. 计算用户可能对该商品的评分
+        3. 取（按矩阵内容缓存的）截断SVD物品、用户特征
+        4. 一次性计算用户对所有未评分商品的评分（自定义 estMethod 时逐个商品调用）
         5. 排序取前N个输出.
     '''
     print(user)
-    dataMat = mat(dataMat)
-    unRatedItems = nonzero(dataMat[user,:].A == 0)[1]
+    dataMat = np.asarray(dataMat, dtype=float)
+    unRatedItems = np.nonzero(dataMat[user, :] == 0)[0]
     if len(unRatedItems) == 0:
         print("没有未评分商品")
         return None
-    U, Sigma, I_t = la.svd(dataMat)
-    item_and_score = []
-    for item in unRatedItems:
-        score = estMethod([U, Sigma, I_t], dataMat, simMeas, user, item)
-        item_and_score.append((item, score))
+    itemFeature, userFeature = getSvdFeatures(dataMat)
 
-    k = 0
-    while sum(Sigma[:k]) < sum(Sigma) * 0.9:
-        k = k+ 1
-    SigK = getSigK(Sigma, k)
-    userFeature  = dataMat * I_t[:,:k] * SigK.I
-    recomedUserVec = userFeature[user,:]
-    user_and_score = []
-    for idx, each in enumerate(userFeature):
-        if user != idx:
-            user_and_score.append((idx, cosSim(recomedUserVec.T, each.T)))
+    if estMethod is svdMethod:
+        scores = scoreUnratedItems(itemFeature, dataMat, user, unRatedItems, simMeas)
+        item_and_score = list(zip(unRatedItems.tolist(), scores.tolist()))
+    else:
+        svdData = la.svd(dataMat)
+        item_and_score = [(item, estMethod(svdData, mat(dataMat), simMeas, user, item)) for item in unRatedItems]
+
+    others = np.array([idx for idx in range(len(userFeature)) if idx != user], dtype=int)
+    userSim = _pairwiseSim(userFeature[[user]], userFeature[others], cosSim)[0]
+    user_and_score = list(zip(others.tolist(), userSim.tolist()))
     recommedCourse = sorted(item_and_score, key=lambda k: k[1], reverse=True)[:min(N, len(item_and_score))]
     recommedPerson = sorted(user_and_score, key=lambda k: k[1], reverse=True)[:min(N, len(user_and_score))]
     print(recommedCourse)
     print(recommedPerson)
     return recommedCourse, recommedPerson
 
-
 def toBarJson(data, dict2id):
     """
     将推荐结果转换为前端图表需要的JSON格式（兼容新系统格式）
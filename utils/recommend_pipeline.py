@@ -0,0 +1,442 @@
+"""
+课程推荐流水线：候选生成 -> 评分 -> 重排
+
+DynamicCourseRecommender.recommend_courses 把一次课程推荐拆成三类可插拔的阶段：
+
+1. 候选生成（CandidateGenerator）：各生成器产出的课程取并集，作为协同过滤评分的候选课程
+   - unrated_electives: 学生未选过的全部"专业选修"课程
+     （只推荐专业选修课程，其他生成器产出的课程也只能是它的子集，所以默认只有这一个生成器）
+2. 评分（Scorer）：按顺序取第一个适用的评分器；协同过滤没有结果或不适用（冷启动）时使用回退评分器
+   - als / item_cf: RECOMMEND_MODE 为 'als' / 'item' 且模型可用时使用
+   - user_cf: 基于学生相似度的协同过滤
+   - popularity: 回退评分器，冷启动和协同过滤失败时按专业热门程度推荐
+3. 重排（Reranker）：对排好序的完整结果过滤，再截取前N门
+   （课程容量与上课时间每个模型快照只加载一次，见 utils/course_schedule.py）
+   - drop_full_courses: 去掉已经满员的课程
+   - drop_time_conflicts: 去掉与学生已选课程上课时间冲突的课程
+
+每个阶段都会计时并记录输入、输出的课程数（stats()），负载高时可以关闭代价较大的阶段
+（config['RECOMMEND_PIPELINE_DISABLED_STAGES'] 或 set_stage_enabled()）。
+"""
+import threading
+import time
+import traceback
+
+import numpy as np
+
+from config import config
+
+# 默认关闭的阶段名称
+DISABLED_STAGES = config.get('RECOMMEND_PIPELINE_DISABLED_STAGES', [])
+
+# 判断冷启动的最小选课数量
+MIN_COURSES_FOR_CF = 3
+
+# 尚未查询学生专业的标记
+_UNSET = object()
+
+
+class RecommendContext:
+    """
+    一次课程推荐请求在各阶段之间传递的状态
+
+    属性:
+        recommender: DynamicCourseRecommender, 推荐器（评分器调用其预测方法）
+        snapshot: RecommendModelSnapshot, 当前模型快照
+        stu_no: str, 学生编号
+        student_id: int, 学生的矩阵ID
+        top_n: int, 推荐课程数量
+        mode: str, 推荐模式（RECOMMEND_MODE）
+        student_vector: numpy.ndarray, 学生的评分向量
+        unrated_electives: numpy.ndarray, 未选的专业选修课程ID
+        fallback_courses: numpy.ndarray, 回退评分使用的课程ID（未选的专业选修课程，没有时为所有未选课程）
+        is_cold_start: bool, 是否为冷启动（选课少于3门，或只有1个学生），此时不使用协同过滤
+        trace: list, 本次请求各阶段的 (阶段名称, 耗时秒数, 输入课程数, 输出课程数)
+    """
+
+    def __init__(self, recommender, snapshot, stu_no, student_id, top_n, mode):
+        self.recommender = recommender
+        self.snapshot = snapshot
+        self.stu_no = stu_no
+        self.student_id = student_id
+        self.top_n = top_n
+        self.mode = mode
+        self.student_vector = recommender._student_vector(snapshot.score_matrix, student_id)
+        self.selected_count = int(np.count_nonzero(self.student_vector > 0))
+
+        # 只考虑"专业选修"类课程：学生可能已经选完了所有必修课程，但还有专业选修课程可选
+        all_unrated = np.where(self.student_vector == 0)[0]
+        self.unrated_electives = all_unrated[snapshot.id_to_course_no.elective_mask[all_unrated]]
+        self.fallback_courses = self.unrated_electives if len(self.unrated_electives) > 0 else all_unrated
+        self.is_cold_start = (
+            recommender._is_cold_start(self.student_vector, min_courses=MIN_COURSES_FOR_CF)
+            or len(snapshot.id_to_stu_no) < 2
+        )
+        self._student_major = _UNSET
+        self.trace = []
+
+    @property
+    def student_major(self):
+        """学生专业（第一次使用时查询，可能为None）"""
+        if self._student_major is _UNSET:
+            self._student_major = self.recommender._get_student_major(self.stu_no)
+        return self._student_major
+
+    @property
+    def course_nos(self):
+        """课程信息表的课程编号数组（按矩阵ID排列）"""
+        return self.snapshot.id_to_course_no.co_nos
+
+
+class PipelineStage:
+    """
+    流水线阶段基类
+
+    属性:
+        name: str, 阶段名称（用于统计和开关）
+        kind: str, 阶段类型：'candidate' / 'scorer' / 'reranker'
+    """
+    name = None
+    kind = None
+
+
+class CandidateGenerator(PipelineStage):
+    """候选生成器：generate(context) 返回候选课程ID数组"""
+    kind = 'candidate'
+
+    def generate(self, context):
+        raise NotImplementedError
+
+
+class Scorer(PipelineStage):
+    """
+    评分器：score(context, candidates) 返回按评分降序排列的 (course_id, score) 列表，不适用时返回None
+
+    fallback 为 True 的评分器只在协同过滤评分器都不适用、或者没有结果时使用
+    """
+    kind = 'scorer'
+    fallback = False
+
+    def score(self, context, candidates):
+        raise NotImplementedError
+
+
+class Reranker(PipelineStage):
+    """重排器：rerank(context, ranked) 返回过滤/调整后的 (course_id, score) 列表"""
+    kind = 'reranker'
+
+    def rerank(self, context, ranked):
+        raise NotImplementedError
+
+
+def _sort_by_score(course_scores):
+    """按评分降序排序（评分相同时保持原有顺序）"""
+    return sorted(course_scores, key=lambda x: x[1], reverse=True)
+
+
+class UnratedElectivesGenerator(CandidateGenerator):
+    """学生未选过的全部专业选修课程"""
+    name = 'unrated_electives'
+
+    def generate(self, context):
+        return context.unrated_electives
+
+
+class AlsScorer(Scorer):
+    """ALS 矩阵分解：学生因子向量与课程因子矩阵的点积（RECOMMEND_MODE 为 'als' 时使用）"""
+    name = 'als'
+
+    def score(self, context, candidates):
+        if context.mode != 'als' or context.is_cold_start or len(candidates) == 0:
+            return None
+        als_factors = context.recommender._get_als_factors(context.snapshot, context.student_id)
+        if als_factors is None:
+            return None
+        return _sort_by_score(context.recommender._predict_course_scores_als(
+            context.student_id, context.snapshot.score_matrix, candidates, als_factors
+        ))
+
+
+class ItemCFScorer(Scorer):
+    """基于课程的协同过滤：对学生评过分的课程查预先计算的邻居表累加（RECOMMEND_MODE 为 'item' 时使用）"""
+    name = 'item_cf'
+
+    def score(self, context, candidates):
+        if context.mode != 'item' or context.is_cold_start or len(candidates) == 0:
+            return None
+        course_neighbors = context.recommender._get_course_neighbors(context.snapshot)
+        if course_neighbors is None:
+            return None
+        return _sort_by_score(context.recommender._predict_course_scores_item_based(
+            context.student_id, context.snapshot.score_matrix, candidates, course_neighbors
+        ))
+
+
+class UserCFScorer(Scorer):
+    """
+    基于学生相似度的协同过滤：一次性计算相似学生的相似度（'exact' 为所有学生，'lsh' 为索引筛选出的候选），
+    再批量预测所有候选课程的评分
+    """
+    name = 'user_cf'
+
+    def score(self, context, candidates):
+        if context.is_cold_start or len(candidates) == 0:
+            return None
+        recommender = context.recommender
+        score_matrix = context.snapshot.score_matrix
+        similarity_row = recommender._get_neighbor_similarity_row(context.snapshot, context.student_id)
+        return _sort_by_score(recommender._predict_course_scores(
+            context.student_id, score_matrix, candidates, similarity_row
+        ))
+
+
+class PopularityScorer(Scorer):
+    """
+    回退评分器：按热门程度推荐 context.fallback_courses 中的课程
+
+    - 有专业信息：冷启动推荐（本专业课程优先，按选课人数排序）
+    - 没有专业信息：按选课人数排序；如果学生本可以使用协同过滤但没有未选的专业选修课程，
+      则只推荐包含"选修"或"任选"的课程
+    """
+    name = 'popularity'
+    fallback = True
+
+    def score(self, context, candidates):
+        recommender = context.recommender
+        snapshot = context.snapshot
+        courses = context.fallback_courses
+        if context.student_major:
+            # 返回完整排序结果，由重排阶段过滤后再截取前N门
+            recommended, _ = recommender._cold_start_recommend(
+                context.stu_no, context.student_major, snapshot.id_to_course_no, snapshot.score_matrix,
+                courses, max(len(courses), 1)
+            )
+            return recommended
+
+        print(f"警告: 无法获取学生 {context.stu_no} 的专业信息，使用通用热门课程推荐")
+        course_popularity = recommender._get_popularity_table(snapshot).popularity
+        if not context.is_cold_start and len(context.unrated_electives) == 0:
+            optional_courses = courses[snapshot.id_to_course_no.optional_mask[courses]]
+            return _sort_by_score(zip(
+                optional_courses.tolist(), (course_popularity[optional_courses] + 1.0).tolist()
+            ))
+        popular_courses = courses[course_popularity[courses] > 0]
+        return _sort_by_score(zip(
+            popular_courses.tolist(), course_popularity[popular_courses].astype(float).tolist()
+        ))
+
+
+def _course_ids_of(ranked):
+    """排序结果中的课程ID数组"""
+    return np.fromiter((course_id for course_id, _ in ranked), dtype=np.int64, count=len(ranked))
+
+
+class FullCourseFilter(Reranker):
+    """
+    去掉已经满员的课程（MAX_STUDENTS 大于0且选课人数已达到上限，与选课时的容量检查一致）
+
+    上限取自快照上的课程容量表，选课人数取自课程热度表，不查询数据库。
+    """
+    name = 'drop_full_courses'
+
+    def rerank(self, context, ranked):
+        if not ranked:
+            return ranked
+        recommender = context.recommender
+        course_schedule = recommender._get_course_schedule(context.snapshot)
+        popularity = recommender._get_popularity_table(context.snapshot).popularity
+        full = course_schedule.full_mask(_course_ids_of(ranked), popularity)
+        return [item for item, is_full in zip(ranked, full.tolist()) if not is_full]
+
+
+class TimeConflictFilter(Reranker):
+    """
+    去掉与学生已选课程上课时间冲突的课程
+
+    与选课统计中的时间冲突检查一致：上课时间（CLASS_TIME）相同视为冲突，
+    另外要求两门课程的起止日期重叠（已经结课的课程不算冲突）。
+    上课时间取自快照上的课程时间表，已选课程取自学生的评分向量，不查询数据库。
+    """
+    name = 'drop_time_conflicts'
+
+    def rerank(self, context, ranked):
+        if not ranked:
+            return ranked
+        course_schedule = context.recommender._get_course_schedule(context.snapshot)
+        chosen_ids = np.nonzero(context.student_vector > 0)[0]
+        conflicts = course_schedule.conflict_mask(_course_ids_of(ranked), chosen_ids)
+        return [item for item, conflict in zip(ranked, conflicts.tolist()) if not conflict]
+
+
+class CourseRecommendPipeline:
+    """
+    课程推荐流水线
+
+    属性:
+        generators: list of CandidateGenerator, 候选生成器
+        scorers: list of Scorer, 评分器（按顺序尝试）
+        rerankers: list of Reranker, 重排器（按顺序执行）
+        disabled: set, 已关闭的阶段名称
+    """
+
+    def __init__(self, generators, scorers, rerankers, disabled=()):
+        self.generators = list(generators)
+        self.scorers = list(scorers)
+        self.rerankers = list(rerankers)
+        self.disabled = set(disabled)
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+
+    @property
+    def stages(self):
+        """全部阶段（按执行顺序）"""
+        return self.generators + self.scorers + self.rerankers
+
+    def set_stage_enabled(self, name, enabled):
+        """
+        开启/关闭某个阶段
+
+        参数:
+            name: str, 阶段名称
+            enabled: bool, 是否开启
+
+        返回:
+            bool: 阶段是否存在
+        """
+        if name not in {stage.name for stage in self.stages}:
+            return False
+        if enabled:
+            self.disabled.discard(name)
+        else:
+            self.disabled.add(name)
+        return True
+
+    def _run_stage(self, context, stage, method, *args):
+        """
+        执行一个阶段，记录耗时和输入、输出课程数
+        """
+        num_in = len(args[-1]) if args else 0
+        start = time.perf_counter()
+        result = method(context, *args)
+        seconds = time.perf_counter() - start
+        num_out = len(result) if result is not None else 0
+        context.trace.append((stage.name, seconds, num_in, num_out))
+        with self._stats_lock:
+            stats = self._stats.setdefault(stage.name, {'calls': 0, 'seconds': 0.0, 'in': 0, 'out': 0})
+            stats['calls'] += 1
+            stats['seconds'] += seconds
+            stats['in'] += num_in
+            stats['out'] += num_out
+        return result
+
+    def run(self, context):
+        """
+        执行流水线
+
+        参数:
+            context: RecommendContext, 推荐请求状态
+
+        返回:
+            list: 前 top_n 门推荐课程的 (course_id, score) 元组
+        """
+        # 阶段1: 候选生成（各生成器结果的并集，按课程ID排序）
+        candidates = np.zeros(0, dtype=np.int64)
+        for generator in self.generators:
+            if generator.name in self.disabled:
+                continue
+            generated = self._run_stage(context, generator, generator.generate)
+            candidates = np.union1d(candidates, np.asarray(generated, dtype=np.int64))
+
+        # 阶段2: 评分。第一个适用的协同过滤评分器的结果为空时，改用回退评分器
+        ranked = []
+        cf_applied = False
+        for scorer in self.scorers:
+            if scorer.name in self.disabled or (cf_applied and not scorer.fallback):
+                continue
+            result = self._run_stage(context, scorer, scorer.score, candidates)
+            if result is None:
+                continue
+            if result:
+                ranked = result
+                break
+            if not scorer.fallback:
+                cf_applied = True
+                print(f"警告: 无法为学生 {context.stu_no} 生成协同过滤推荐，切换到回退推荐")
+
+        # 阶段3: 重排（失败时跳过该阶段，不影响推荐结果）
+        for reranker in self.rerankers:
+            if reranker.name in self.disabled:
+                continue
+            try:
+                ranked = self._run_stage(context, reranker, reranker.rerank, ranked)
+            except Exception as e:
+                print(f"警告: 重排阶段 {reranker.name} 失败，已跳过: {e}")
+                traceback.print_exc()
+
+        print("[推荐流水线] " + ", ".join(
+            f"{name} {seconds * 1000:.1f}ms {num_in}->{num_out}" for name, seconds, num_in, num_out in context.trace
+        ))
+        return ranked[:context.top_n]
+
+    def reset_stats(self):
+        """
+        清空各阶段的累计统计
+        """
+        with self._stats_lock:
+            self._stats = {}
+
+    def stats(self):
+        """
+        获取各阶段的累计统计
+
+        返回:
+            dict: 阶段名称 -> {kind, enabled, calls, avg_ms, avg_in, avg_out}
+        """
+        with self._stats_lock:
+            stats = {name: dict(values) for name, values in self._stats.items()}
+        result = {}
+        for stage in self.stages:
+            values = stats.get(stage.name, {'calls': 0, 'seconds': 0.0, 'in': 0, 'out': 0})
+            calls = max(values['calls'], 1)
+            result[stage.name] = {
+                'kind': stage.kind,
+                'enabled': stage.name not in self.disabled,
+                'calls': values['calls'],
+                'avg_ms': values['seconds'] * 1000 / calls,
+                'avg_in': values['in'] / calls,
+                'avg_out': values['out'] / calls,
+            }
+        return result
+
+
+def build_default_pipeline():
+    """
+    创建默认的课程推荐流水线
+    """
+    return CourseRecommendPipeline(
+        generators=[UnratedElectivesGenerator()],
+        scorers=[AlsScorer(), ItemCFScorer(), UserCFScorer(), PopularityScorer()],
+        rerankers=[FullCourseFilter(), TimeConflictFilter()],
+        disabled=DISABLED_STAGES,
+    )
+
+
+# 进程内共享的课程推荐流水线
+course_pipeline = build_default_pipeline()
+
+
+def set_stage_enabled(name, enabled):
+    """
+    开启/关闭共享流水线的某个阶段（例如负载高时关闭代价较大的阶段）
+
+    返回:
+        bool: 阶段是否存在
+    """
+    return course_pipeline.set_stage_enabled(name, enabled)
+
+
+def get_pipeline_stats():
+    """
+    获取共享流水线各阶段的累计耗时和候选课程数
+    """
+    return course_pipeline.stats()
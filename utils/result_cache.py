@@ -0,0 +1,166 @@
+"""
+推荐结果缓存（按学生，LRU + 过期时间）
+
+学生反复刷新推荐页面时，推荐结果很少变化，不必每次重新计算。
+本模块按学生编号缓存 /getRecommedData 序列化好的响应内容，结果是否仍然有效按该学生自己的状态判断，
+其他学生选课导致的模型版本变化不会使所有学生的结果失效：
+
+- 学生自己的选课记录变化（选课、退课、评分）时删除该学生的结果，并记下变化的数据版本，
+  之后只接受用已经包含这次变化的模型（模型数据版本不小于该版本）计算的结果：
+  开启后台刷新时模型要等刷新线程更新后才包含这次变化，这期间不能缓存用旧模型算出的结果
+- 无法按学生区分的变化（学生、课程信息修改等）或事件日志不完整时清空全部结果，
+  之后只接受用不早于该变化的模型计算的结果
+- 其他学生的选课变化只会轻微影响协同过滤的结果，结果超过 ttl 秒后过期，用于兜底这些变化和其他进程写入的数据
+
+每条结果带有 ETag（响应内容的摘要）和 Last-Modified（计算时间），
+路由据此响应条件请求，结果没有变化时返回 304，不再传输响应内容。
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from config import config
+from utils.data_version import get_choose_changes_since, get_data_version
+
+# 缓存的最大学生数（超过后淘汰最久未使用的结果）
+RESULT_CACHE_SIZE = config.get('RECOMMEND_RESULT_CACHE_SIZE', 10000)
+
+# 结果的最长有效期（秒）
+RESULT_CACHE_TTL = config.get('RECOMMEND_RESULT_CACHE_TTL', 600)
+
+# 一条缓存的推荐结果
+# model_version: int, 计算结果时使用的模型数据版本；body: bytes, 序列化好的JSON响应内容；
+# etag: str, 响应内容摘要；created_at: float, 计算完成的时间戳
+CachedResult = namedtuple('CachedResult', ['model_version', 'body', 'etag', 'created_at'])
+
+
+class RecommendResultCache:
+    """
+    按学生缓存推荐结果（线程安全）
+
+    属性:
+        max_entries: int, 最多缓存的学生数
+        ttl: float, 结果的最长有效期（秒）
+        hits, misses: int, 命中、未命中次数
+    """
+
+    def __init__(self, max_entries=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # 学生编号 -> CachedResult，按最近使用排序
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # 已经处理过的选课变化事件的数据版本
+        self._seen_version = get_data_version()
+        # 结果需要的最低模型数据版本：所有学生（最近一次无法按学生区分的变化）
+        self._min_version = 0
+        # 学生编号 -> 该学生最近一次选课变化的数据版本（有效的结果保存之后删除）
+        self._student_versions = {}
+
+    def _evict_changed_students(self):
+        """
+        删除上次检查之后选课记录发生变化的学生的结果，并记下变化的数据版本（需持有锁）
+
+        事件日志不完整、或者有无法按学生区分的变化（学生、课程信息修改等）时清空全部结果。
+        """
+        current_version, events = get_choose_changes_since(self._seen_version)
+        if current_version == self._seen_version:
+            return
+        if events is None:
+            self._entries.clear()
+            self._student_versions.clear()
+            self._min_version = current_version
+        else:
+            # 事件连续，第 i 条事件的数据版本为 _seen_version + i + 1
+            for event_version, event in enumerate(events, self._seen_version + 1):
+                self._entries.pop(event.stu_no, None)
+                self._student_versions[event.stu_no] = event_version
+        self._seen_version = current_version
+
+    def _required_version(self, stu_no):
+        """
+        学生的结果需要的最低模型数据版本（需持有锁）
+        """
+        return max(self._min_version, self._student_versions.get(stu_no, 0))
+
+    def get(self, stu_no):
+        """
+        查找学生仍然有效的推荐结果
+
+        参数:
+            stu_no: str, 学生编号
+
+        返回:
+            CachedResult or None: 没有结果、计算结果的模型不包含该学生最近的变化、或者已经过期时返回None
+        """
+        with self._lock:
+            self._evict_changed_students()
+            entry = self._entries.get(stu_no)
+            if (entry is None or entry.model_version < self._required_version(stu_no)
+                    or time.time() - entry.created_at > self.ttl):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(stu_no)
+            self.hits += 1
+            return entry
+
+    def put(self, stu_no, model_version, body):
+        """
+        保存学生的推荐结果（模型还不包含该学生最近一次选课变化时不保存）
+
+        参数:
+            stu_no: str, 学生编号
+            model_version: int, 计算结果时使用的模型数据版本
+            body: bytes, 序列化好的JSON响应内容
+
+        返回:
+            CachedResult: 保存的结果
+        """
+        entry = CachedResult(model_version, body, hashlib.md5(body).hexdigest(), time.time())
+        with self._lock:
+            self._evict_changed_students()
+            if model_version < self._required_version(stu_no):
+                return entry
+            self._student_versions.pop(stu_no, None)
+            self._entries[stu_no] = entry
+            self._entries.move_to_end(stu_no)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def evict(self, stu_no):
+        """
+        删除某个学生的结果
+        """
+        with self._lock:
+            self._entries.pop(stu_no, None)
+
+    def clear(self):
+        """
+        清空全部结果
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        获取缓存统计信息
+
+        返回:
+            dict: entries, max_entries, ttl, hits, misses
+        """
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+# 进程内共享的推荐结果缓存
+recommend_result_cache = RecommendResultCache()
@@ -0,0 +1,362 @@
+"""
+推荐模型快照文件（内存映射，多个 WSGI 工作进程共享）
+
+多个 gunicorn 工作进程各自从 MySQL 加载评分矩阵时，每个进程都持有一份完整的副本。
+本模块把模型快照（评分矩阵、学生/课程信息数组、相似学生索引）写入一个带格式版本号的二进制文件，
+工作进程用 mmap 只读映射该文件：数组直接指向文件内容，物理内存由操作系统页缓存在进程之间共享，
+进程启动或重建快照时只需映射文件，不再查询数据库。
+
+文件格式（小端）:
+    魔数(8字节) | 格式版本(uint32) | 头部长度(uint64) | JSON头部 | 各数组的原始数据（按64字节对齐）
+JSON头部记录快照从数据库加载的时间、文件写入时间、文件代数和基准代数、写入进程的模型数据版本、评分矩阵的存储方式和形状、
+相似学生索引的参数，以及每个数组的 dtype、形状和偏移。
+
+文件先写入同目录下的临时文件再原子替换：已经映射旧文件的进程继续使用旧内容，不会读到写了一半的文件。
+
+文件代数（generation）在每次写入时加1，是各工作进程共同的快照版本：
+- 工作进程记下自己的快照对应的文件代数，文件代数变大说明其他进程写入了更新的快照（snapshot_generation 按文件的
+  stat 信息缓存，每次检查只需一次 stat）
+- 增量更新后的快照只有在文件代数仍等于其基础快照的代数时才写回（expected_generation），
+  否则说明两个进程各自应用了不同的变化，调用方放弃这次写回（变化留在调用方进程内，等下次完整重建）
+- 基准代数（root_generation）是这一串增量写回所基于的、从数据库加载后写入的文件代数。基准代数相同、
+  代数不小于某个进程上次写回的代数时，文件一定包含该进程写回过的变化（load_fresh_snapshot 的 descends_from）
+- 写入过程持有同目录下的锁文件（fcntl.flock，Windows 上没有多进程共享快照文件的部署方式，不加锁）
+
+用法:
+    python -m utils.snapshot_store            # 从数据库构建快照并写入文件（部署或定时任务中预热）
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+import tempfile
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from utils.id_maps import StudentTable, CourseTable
+from utils.sparse_matrix import CSRScoreMatrix
+from utils.student_index import StudentLSHIndex
+
+# 快照文件默认保存位置（项目根目录下的 model 目录）
+DEFAULT_SNAPSHOT_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'model', 'recommend_snapshot.bin'
+)
+
+# 文件格式版本：格式不兼容的修改需要递增，旧版本文件会被忽略
+FORMAT_VERSION = 2
+MAGIC = b'RCMSNAP\x00'
+# 魔数、格式版本、头部长度
+PREAMBLE = struct.Struct('<8sIQ')
+# 数组数据的对齐字节数
+ALIGNMENT = 64
+
+# 从文件加载的快照内容
+# data 为 RecommendModelSnapshot 构造参数 (id_to_stu_no, id_to_course_no, score_matrix, stu_no_to_id, stu_no_to_major)
+SnapshotFile = namedtuple('SnapshotFile', ['built_at', 'generation', 'root_generation', 'data', 'student_index'])
+
+# snapshot_generation 的缓存：文件路径 -> ((st_ino, st_mtime_ns, st_size), 文件代数)
+_generation_cache = {}
+
+
+def _snapshot_arrays(snapshot):
+    """
+    收集快照中需要写入文件的数组和头部信息
+
+    返回:
+        tuple: (数组dict, 头部dict)
+    """
+    students = snapshot.id_to_stu_no
+    courses = snapshot.id_to_course_no
+
+    # 学生、课程信息表本身就是数组，直接写入；取值很少的类别列表写在头部
+    arrays = {}
+    for name, array in students.to_arrays().items():
+        arrays['student_' + name] = array
+    for name, array in courses.to_arrays().items():
+        arrays['course_' + name] = array
+
+    score_matrix = snapshot.score_matrix
+    if isinstance(score_matrix, CSRScoreMatrix):
+        matrix_format = 'csr'
+        for name, array in score_matrix.to_arrays().items():
+            arrays['matrix_' + name] = array
+    else:
+        matrix_format = 'dense'
+        arrays['matrix_dense'] = np.asarray(score_matrix, dtype=np.float64)
+
+    index_params = None
+    index = snapshot.student_index
+    if index is not None:
+        index_params = {'num_tables': index.num_tables, 'num_bits': index.num_bits, 'probes': index.probes}
+        for name in ('planes', 'sorted_codes', 'sorted_ids', 'extra_ids'):
+            arrays['index_' + name] = getattr(index, name)
+
+    header = {
+        'built_at': snapshot.built_at,
+        'data_version': snapshot.version,
+        'matrix_format': matrix_format,
+        'shape': list(score_matrix.shape),
+        'student_index': index_params,
+        'student_majors': students.majors,
+        'course_classifications': courses.classifications,
+        'course_majors': courses.majors,
+    }
+    return arrays, header
+
+
+@contextmanager
+def _write_lock(path):
+    """
+    写入快照文件期间持有的进程间排他锁（锁文件为 path + '.lock'）
+    """
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.lock', 'a') as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def save_snapshot(snapshot, path=DEFAULT_SNAPSHOT_PATH, expected_generation=None):
+    """
+    将模型快照写入文件（先写临时文件再原子替换），文件代数加1
+
+    参数:
+        snapshot: RecommendModelSnapshot, 模型快照
+        path: str, 文件路径
+        expected_generation: int, 可选，只有文件当前的代数等于该值时才写入（用于写回增量更新的快照）
+
+    返回:
+        int or None: 写入的文件代数；文件代数与 expected_generation 不一致时不写入，返回None。
+            指定 expected_generation 时沿用文件原来的基准代数，否则本次写入的代数成为新的基准代数
+    """
+    with _write_lock(path):
+        current = read_snapshot_header(path)
+        current_generation = current.get('generation', 0) if current is not None else 0
+        if expected_generation is not None and current_generation != expected_generation:
+            return None
+        generation = current_generation + 1
+        root_generation = generation
+        if expected_generation is not None:
+            root_generation = current.get('root_generation', generation) if current is not None else generation
+        _write_snapshot(snapshot, path, generation, root_generation)
+    return generation
+
+
+def _write_snapshot(snapshot, path, generation, root_generation):
+    """
+    写入快照文件（需持有写入锁）
+    """
+    arrays, header = _snapshot_arrays(snapshot)
+    header['generation'] = generation
+    header['root_generation'] = root_generation
+    header['saved_at'] = time.time()
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+
+    # 步骤1: 计算每个数组的偏移（相对于数据区起点，按 ALIGNMENT 对齐）
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        offset = -(-offset // ALIGNMENT) * ALIGNMENT
+        layout[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset += array.nbytes
+    header['arrays'] = layout
+    header_bytes = json.dumps(header).encode('utf-8')
+    data_start = -(-(PREAMBLE.size + len(header_bytes)) // ALIGNMENT) * ALIGNMENT
+
+    # 步骤2: 写入临时文件
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.recommend_snapshot_')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header_bytes)))
+            f.write(header_bytes)
+            for name, array in arrays.items():
+                f.seek(data_start + layout[name]['offset'])
+                f.write(array.tobytes())
+            f.truncate(data_start + offset)
+        # mkstemp 创建的文件只有所有者可读，其他用户运行的工作进程也需要映射
+        os.chmod(tmp_path, 0o644)
+        # 步骤3: 原子替换
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def read_snapshot_header(path=DEFAULT_SNAPSHOT_PATH):
+    """
+    读取快照文件的头部
+
+    返回:
+        dict or None: 头部信息（另含数据区起点 'data_start'）；文件不存在或格式版本不一致时返回None
+    """
+    try:
+        with open(path, 'rb') as f:
+            return _read_header(f)
+    except OSError:
+        return None
+
+
+def _read_header(f):
+    """
+    从打开的快照文件开头读取头部，格式不正确时返回None
+    """
+    try:
+        magic, format_version, header_length = PREAMBLE.unpack(f.read(PREAMBLE.size))
+        if magic != MAGIC or format_version != FORMAT_VERSION:
+            return None
+        header = json.loads(f.read(header_length).decode('utf-8'))
+    except (struct.error, ValueError):
+        return None
+    header['data_start'] = -(-(PREAMBLE.size + header_length) // ALIGNMENT) * ALIGNMENT
+    return header
+
+
+def load_snapshot(path=DEFAULT_SNAPSHOT_PATH):
+    """
+    以只读内存映射方式打开快照文件
+
+    评分矩阵、学生/课程信息表和索引数组都直接指向映射的文件内容（只读，不复制）。
+
+    返回:
+        SnapshotFile or None: 文件不存在或格式版本不一致时返回None
+    """
+    try:
+        f = open(path, 'rb')
+    except OSError:
+        return None
+    # 头部和数据从同一个打开的文件读取（文件可能随时被其他进程原子替换）；
+    # 映射在文件关闭（或被原子替换）之后仍然有效，由数组引用保持
+    with f:
+        header = _read_header(f)
+        if header is None:
+            return None
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    arrays = {}
+    for name, info in header['arrays'].items():
+        dtype = np.dtype(info['dtype'])
+        count = int(np.prod(info['shape']))
+        arrays[name] = np.frombuffer(
+            buffer, dtype=dtype, count=count, offset=header['data_start'] + info['offset']
+        ).reshape(info['shape'])
+
+    # 学生、课程信息
+    id_to_stu_no = StudentTable.from_arrays(
+        {name: arrays['student_' + name] for name in StudentTable.ARRAY_NAMES}, header['student_majors']
+    )
+    id_to_course_no = CourseTable.from_arrays(
+        {name: arrays['course_' + name] for name in CourseTable.ARRAY_NAMES},
+        header['course_classifications'], header['course_majors']
+    )
+
+    # 评分矩阵
+    shape = tuple(header['shape'])
+    if header['matrix_format'] == 'csr':
+        score_matrix = CSRScoreMatrix.from_arrays(
+            shape, {name: arrays['matrix_' + name] for name in CSRScoreMatrix.ARRAY_NAMES}
+        )
+    else:
+        score_matrix = arrays['matrix_dense']
+
+    # 相似学生索引
+    student_index = None
+    index_params = header['student_index']
+    if index_params is not None:
+        student_index = StudentLSHIndex.from_arrays(
+            index_params['num_tables'], index_params['num_bits'], index_params['probes'],
+            arrays['index_planes'], arrays['index_sorted_codes'], arrays['index_sorted_ids'],
+            arrays['index_extra_ids']
+        )
+
+    data = (id_to_stu_no, id_to_course_no, score_matrix, id_to_stu_no.by_stu_no, id_to_stu_no.major_by_stu_no)
+    return SnapshotFile(
+        header['built_at'], header.get('generation', 0), header.get('root_generation'), data, student_index
+    )
+
+
+def snapshot_generation(path=DEFAULT_SNAPSHOT_PATH):
+    """
+    快照文件当前的代数（文件没有变化时只需一次 stat，不读取头部）
+
+    返回:
+        int or None: 文件不存在或格式版本不一致时返回None
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    cached = _generation_cache.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    header = read_snapshot_header(path)
+    generation = header.get('generation', 0) if header is not None else None
+    _generation_cache[path] = (key, generation)
+    return generation
+
+
+def load_fresh_snapshot(path=DEFAULT_SNAPSHOT_PATH, max_age=None, not_before=0.0, descends_from=None):
+    """
+    快照文件足够新时加载，否则返回None
+
+    文件中的快照需要包含调用方已经做过的数据变化：从数据库加载的时间不早于 not_before，
+    或者是调用方上次写回的文件之后的增量写回（descends_from）。
+
+    参数:
+        path: str, 文件路径
+        max_age: float, 文件中快照的最长有效期（秒，从快照从数据库加载时算起，增量写回不延长），None 表示不限
+        not_before: float, 快照必须在该时间之后从数据库加载（例如本进程最近一次写入数据的时间）
+        descends_from: tuple, 可选 (基准代数, 代数)，文件的基准代数相同且代数不小于该代数时，不检查 not_before
+
+    返回:
+        SnapshotFile or None
+    """
+    def is_fresh(built_at, generation, root_generation):
+        if max_age is not None and time.time() - built_at > max_age:
+            return False
+        if built_at >= not_before:
+            return True
+        return (descends_from is not None and root_generation == descends_from[0]
+                and generation >= descends_from[1])
+
+    header = read_snapshot_header(path)
+    if header is None or not is_fresh(header['built_at'], header.get('generation', 0), header.get('root_generation')):
+        return None
+    # 读取头部之后文件可能又被替换，按实际映射的文件再检查一次
+    snapshot_file = load_snapshot(path)
+    if snapshot_file is None or not is_fresh(*snapshot_file[:3]):
+        return None
+    return snapshot_file
+
+
+if __name__ == '__main__':
+    from utils.data_version import get_data_version
+    from utils.dynamic_recommend import DynamicCourseRecommender, RecommendModelSnapshot
+
+    parser = argparse.ArgumentParser(description='从数据库构建推荐模型快照并写入内存映射文件')
+    parser.add_argument('--output', default=DEFAULT_SNAPSHOT_PATH, help='快照文件保存路径')
+    args = parser.parse_args()
+
+    start_time = time.time()
+    recommender = DynamicCourseRecommender()
+    snapshot = RecommendModelSnapshot(get_data_version(), *recommender._load_student_course_data())
+    recommender._prepare_snapshot(snapshot)
+    save_snapshot(snapshot, args.output)
+    print(f"[模型快照] 已保存到 {args.output}：{snapshot.score_matrix.shape[0]} 个学生，"
+          f"{snapshot.score_matrix.shape[1]} 门课程，耗时 {time.time() - start_time:.1f} 秒")
@@ -0,0 +1,196 @@
+"""
+稀疏评分矩阵
+为推荐系统提供基于 numpy 的压缩稀疏行/列(CSR/CSC)评分矩阵，不依赖 scipy。
+
+学生-课程评分矩阵中绝大部分元素为0（未选课），稠密矩阵的内存占用为 学生数×课程数，
+而稀疏矩阵只保存非零元素，内存与CHOOSE表的行数成正比。
+矩阵同时保存按行(CSR)和按列(CSC)压缩的两份索引：
+- 按行读取：取某个学生的评分向量
+- 按列读取：取选过某些课程的学生及其评分（相似度计算、评分预测、热度统计）
+
+矩阵是只读的；需要修改单元格时使用 with_cells() 生成新矩阵，
+正在使用旧矩阵的请求不受影响。
+"""
+import numpy as np
+
+
+class CSRScoreMatrix:
+    """
+    CSR/CSC 双索引的稀疏评分矩阵
+
+    属性:
+        shape: tuple, (学生数, 课程数)
+        indptr, indices, data: 按行压缩的索引（行指针、列号、评分）
+        col_indptr, col_indices, col_data: 按列压缩的索引（列指针、行号、评分）
+    """
+
+    # 构成矩阵的全部数组（用于序列化、在进程之间共享）
+    ARRAY_NAMES = ('indptr', 'indices', 'data', 'col_indptr', 'col_indices', 'col_data')
+
+    def __init__(self, shape, rows, cols, values):
+        """
+        由按行主序排列、没有重复单元格、不含0的三元组构建矩阵（请使用 from_coo 构建）
+        """
+        num_rows, num_cols = shape
+        self.shape = (int(num_rows), int(num_cols))
+
+        # 按行压缩
+        self.indptr = np.zeros(num_rows + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=num_rows), out=self.indptr[1:])
+        self.indices = cols.astype(np.int32)
+        self.data = values.astype(np.float64)
+
+        # 按列压缩（稳定排序保证同一列内行号有序）
+        order = np.argsort(cols, kind='stable')
+        self.col_indptr = np.zeros(num_cols + 1, dtype=np.int64)
+        np.cumsum(np.bincount(cols, minlength=num_cols), out=self.col_indptr[1:])
+        self.col_indices = rows[order].astype(np.int32)
+        self.col_data = self.data[order]
+
+    @classmethod
+    def from_coo(cls, rows, cols, values, shape):
+        """
+        由 (行号, 列号, 评分) 三元组构建稀疏矩阵
+
+        同一单元格出现多次时以最后一次为准（与逐个写入稠密矩阵的结果一致），
+        评分为0的单元格视为未评分，不保存。
+
+        参数:
+            rows: 行号序列
+            cols: 列号序列
+            values: 评分序列
+            shape: tuple, (行数, 列数)
+
+        返回:
+            CSRScoreMatrix: 稀疏矩阵
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64)
+
+        # 去重：按单元格编号排序，保留每个单元格最后一次出现的评分
+        keys = rows * shape[1] + cols
+        _, last_reversed = np.unique(keys[::-1], return_index=True)
+        keep = len(keys) - 1 - last_reversed
+        rows, cols, values = rows[keep], cols[keep], values[keep]
+
+        nonzero = values != 0
+        return cls(shape, rows[nonzero], cols[nonzero], values[nonzero])
+
+    @classmethod
+    def from_arrays(cls, shape, arrays):
+        """
+        直接由已构建好的索引数组创建矩阵（不复制数组，可以传入内存映射的只读数组）
+
+        参数:
+            shape: tuple, (行数, 列数)
+            arrays: dict, ARRAY_NAMES 中每个名称对应的数组
+        """
+        matrix = cls.__new__(cls)
+        matrix.shape = (int(shape[0]), int(shape[1]))
+        for name in cls.ARRAY_NAMES:
+            setattr(matrix, name, arrays[name])
+        return matrix
+
+    def to_arrays(self):
+        """
+        返回构成矩阵的全部数组，dict: 名称 -> 数组
+        """
+        return {name: getattr(self, name) for name in self.ARRAY_NAMES}
+
+    @property
+    def nnz(self):
+        """非零元素个数"""
+        return len(self.data)
+
+    @property
+    def nbytes(self):
+        """矩阵占用的字节数（两份索引合计）"""
+        return sum(array.nbytes for array in self.to_arrays().values())
+
+    def _row_ids(self):
+        """每个非零元素（按行压缩顺序）所在的行号"""
+        return np.repeat(np.arange(self.shape[0]), np.diff(self.indptr))
+
+    def row(self, row_id):
+        """
+        获取一行（某个学生对所有课程的评分）的稠密向量
+        """
+        vector = np.zeros(self.shape[1])
+        start, end = self.indptr[row_id], self.indptr[row_id + 1]
+        vector[self.indices[start:end]] = self.data[start:end]
+        return vector
+
+    def row_block(self, start, end):
+        """
+        获取连续若干行（学生）的稠密子矩阵，shape=(end-start, 列数)
+        """
+        block = np.zeros((end - start, self.shape[1]))
+        block_rows = np.repeat(np.arange(end - start), np.diff(self.indptr[start:end + 1]))
+        entry_start, entry_end = self.indptr[start], self.indptr[end]
+        block[block_rows, self.indices[entry_start:entry_end]] = self.data[entry_start:entry_end]
+        return block
+
+    def column(self, col_id):
+        """
+        获取一列（所有学生对某门课程的评分）的稠密向量
+        """
+        vector = np.zeros(self.shape[0])
+        start, end = self.col_indptr[col_id], self.col_indptr[col_id + 1]
+        vector[self.col_indices[start:end]] = self.col_data[start:end]
+        return vector
+
+    def column_entries(self, col_ids):
+        """
+        批量获取若干列中的所有非零元素
+
+        参数:
+            col_ids: 列号序列
+
+        返回:
+            tuple: (行号数组, 列在col_ids中的位置数组, 评分数组)
+        """
+        col_ids = np.asarray(col_ids, dtype=np.int64)
+        starts = self.col_indptr[col_ids]
+        lengths = self.col_indptr[col_ids + 1] - starts
+        total = int(lengths.sum())
+        # 每个元素在按列压缩数组中的位置 = 所在列的起点 + 列内偏移
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        positions = offsets + np.arange(total)
+        local = np.repeat(np.arange(len(col_ids)), lengths)
+        return self.col_indices[positions].astype(np.int64), local, self.col_data[positions]
+
+    def positive_count(self, axis=0):
+        """
+        统计每列（axis=0，每门课程的选课人数）或每行（axis=1，每个学生的选课数）的正评分个数
+
+        与稠密矩阵的 np.sum(matrix > 0, axis=axis) 结果一致。
+        """
+        positive = self.data > 0
+        if axis == 0:
+            return np.bincount(self.indices, weights=positive, minlength=self.shape[1]).astype(np.int64)
+        return np.bincount(self._row_ids(), weights=positive, minlength=self.shape[0]).astype(np.int64)
+
+    def with_cells(self, cells):
+        """
+        生成修改了若干单元格的新矩阵（原矩阵不变）
+
+        参数:
+            cells: list of (行号, 列号, 评分)，评分为0表示删除该单元格
+
+        返回:
+            CSRScoreMatrix: 新矩阵
+        """
+        if not cells:
+            return self
+        update_rows, update_cols, update_values = zip(*cells)
+        rows = np.concatenate([self._row_ids(), np.asarray(update_rows, dtype=np.int64)])
+        cols = np.concatenate([self.indices.astype(np.int64), np.asarray(update_cols, dtype=np.int64)])
+        values = np.concatenate([self.data, np.asarray(update_values, dtype=np.float64)])
+        return CSRScoreMatrix.from_coo(rows, cols, values, self.shape)
+
+    def to_dense(self):
+        """转换为稠密 numpy 矩阵"""
+        dense = np.zeros(self.shape)
+        dense[self._row_ids(), self.indices] = self.data
+        return dense
@@ -0,0 +1,145 @@
+"""
+相似学生近似最近邻索引（随机投影局部敏感哈希 LSH）
+
+相似学生推荐需要找出与目标学生皮尔逊相关系数最高的学生，精确计算要和所有学生逐一比较。
+本索引把每个学生的中心化评分向量（评过分的课程减去该学生的平均分，未评分为0）
+用随机超平面投影成若干段二进制签名，余弦相似度高的学生大概率落入同一个哈希桶。
+查询时只取出与目标学生同桶的学生作为候选，再由推荐器在候选上精确计算皮尔逊相关系数并排序。
+
+召回率与耗时的权衡：
+- num_tables（哈希表数量）越多，候选越多，召回率越高，查询越慢
+- num_bits（每张表的签名位数）越多，桶越小，候选越少，查询越快，召回率越低
+- probes（多探针数）：额外查询签名中最不确定的若干位取反后的相邻桶，用较少的表获得较高的召回率
+
+索引在每个模型快照上构建一次；增量更新的快照沿用旧索引，
+评分发生变化的学生作为固定候选，保证它们总会被精确计算。
+"""
+import numpy as np
+
+from utils.sparse_matrix import CSRScoreMatrix
+
+# 构建索引时每次处理的学生数（控制临时稠密子矩阵的内存）
+ROW_CHUNK_SIZE = 2048
+
+
+def _centered_rows(score_matrix, start, end):
+    """
+    第 start 到 end 个学生的中心化评分向量：评过分的课程减去该学生评分的平均值，未评分为0
+    """
+    if isinstance(score_matrix, CSRScoreMatrix):
+        block = score_matrix.row_block(start, end)
+    else:
+        block = np.asarray(score_matrix[start:end], dtype=float)
+    rated = block != 0
+    means = block.sum(axis=1) / np.maximum(rated.sum(axis=1), 1)
+    return np.where(rated, block - means[:, np.newaxis], 0.0)
+
+
+class StudentLSHIndex:
+    """
+    学生评分向量的随机投影 LSH 索引
+
+    属性:
+        num_tables: int, 哈希表数量
+        num_bits: int, 每张表的签名位数
+        probes: int, 每张表额外探查的相邻桶数量
+        planes: numpy.ndarray, shape=(课程数, num_tables * num_bits)，随机超平面
+        sorted_codes: numpy.ndarray, shape=(num_tables, 学生数)，每张表排序后的签名
+        sorted_ids: numpy.ndarray, shape=(num_tables, 学生数)，与 sorted_codes 对应的学生ID
+        extra_ids: numpy.ndarray, 构建索引之后评分发生变化、每次查询都作为候选的学生ID
+    """
+
+    def __init__(self, score_matrix, num_tables=16, num_bits=9, probes=3, seed=0):
+        num_students, num_courses = score_matrix.shape
+        self.num_tables = num_tables
+        self.num_bits = num_bits
+        self.probes = probes
+        self.num_students = num_students
+        rng = np.random.default_rng(seed)
+        self.planes = rng.standard_normal((num_courses, num_tables * num_bits))
+        self.extra_ids = np.zeros(0, dtype=np.int64)
+
+        # 步骤1: 分块计算所有学生的签名
+        codes = np.zeros((num_tables, num_students), dtype=np.int64)
+        for start in range(0, num_students, ROW_CHUNK_SIZE):
+            end = min(start + ROW_CHUNK_SIZE, num_students)
+            projections = _centered_rows(score_matrix, start, end) @ self.planes
+            codes[:, start:end] = self._pack(projections > 0).T
+
+        # 步骤2: 每张表按签名排序，同一个桶的学生在排序后连续存放，查询时二分查找
+        order = np.argsort(codes, axis=1, kind='stable')
+        self.sorted_codes = np.take_along_axis(codes, order, axis=1)
+        self.sorted_ids = order
+
+    @classmethod
+    def from_arrays(cls, num_tables, num_bits, probes, planes, sorted_codes, sorted_ids, extra_ids):
+        """
+        直接由已构建好的数组创建索引（不复制数组，可以传入内存映射的只读数组）
+        """
+        index = cls.__new__(cls)
+        index.num_tables = num_tables
+        index.num_bits = num_bits
+        index.probes = probes
+        index.num_students = sorted_ids.shape[1]
+        index.planes = planes
+        index.sorted_codes = sorted_codes
+        index.sorted_ids = sorted_ids
+        index.extra_ids = extra_ids
+        return index
+
+    def _pack(self, bits):
+        """
+        将符号位打包为每张表一个整数签名
+
+        参数:
+            bits: numpy.ndarray, shape=(n, num_tables * num_bits) 的布尔数组
+
+        返回:
+            numpy.ndarray: shape=(n, num_tables)
+        """
+        bits = bits.reshape(len(bits), self.num_tables, self.num_bits).astype(np.int64)
+        weights = np.int64(1) << np.arange(self.num_bits, dtype=np.int64)
+        return bits @ weights
+
+    def with_extra_candidates(self, student_ids):
+        """
+        返回共享同一组哈希表、但增加了固定候选学生的索引（用于增量更新的快照）
+        """
+        index = StudentLSHIndex.__new__(StudentLSHIndex)
+        index.__dict__.update(self.__dict__)
+        index.extra_ids = np.union1d(self.extra_ids, np.asarray(list(student_ids), dtype=np.int64))
+        return index
+
+    def query(self, score_matrix, student_id):
+        """
+        查询与目标学生可能相似的候选学生
+
+        参数:
+            score_matrix: numpy.ndarray 或 CSRScoreMatrix, 当前评分矩阵（用于计算目标学生的签名）
+            student_id: int, 目标学生的矩阵ID
+
+        返回:
+            numpy.ndarray: 候选学生ID（去重、升序，不包含目标学生本人）
+        """
+        projection = (_centered_rows(score_matrix, student_id, student_id + 1) @ self.planes)[0]
+        projection = projection.reshape(self.num_tables, self.num_bits)
+        weights = np.int64(1) << np.arange(self.num_bits, dtype=np.int64)
+        codes = (projection > 0).astype(np.int64) @ weights
+
+        # 多探针：翻转每张表中投影绝对值最小（最不确定）的若干位
+        probe_codes = [codes]
+        if self.probes > 0:
+            uncertain_bits = np.argsort(np.abs(projection), axis=1)[:, :self.probes]
+            for probe in range(uncertain_bits.shape[1]):
+                probe_codes.append(codes ^ weights[uncertain_bits[:, probe]])
+
+        candidates = [self.extra_ids]
+        for table in range(self.num_tables):
+            table_codes = self.sorted_codes[table]
+            for probe in probe_codes:
+                left = np.searchsorted(table_codes, probe[table], side='left')
+                right = np.searchsorted(table_codes, probe[table], side='right')
+                candidates.append(self.sorted_ids[table, left:right])
+
+        candidates = np.unique(np.concatenate(candidates))
+        return candidates[candidates != student_id]